@@ -0,0 +1,181 @@
+import json
+
+import pytest
+
+import vk.apidump as apidump
+
+_TEXT_DUMP = '''\
+Thread 0, Frame 0, Time 100 us:
+vkBeginCommandBuffer(commandBuffer, pBeginInfo) returns VkResult VK_SUCCESS (0):
+    commandBuffer:                  VkCommandBuffer = 0xb400007a00000001
+    pBeginInfo:                     const VkCommandBufferBeginInfo* = 0x7fc0001000:
+        sType:                      VkStructureType = VK_STRUCTURE_TYPE_COMMAND_BUFFER_BEGIN_INFO (42)
+
+Thread 0, Frame 0, Time 130 us:
+vkCmdBindPipeline(commandBuffer, pipelineBindPoint, pipeline) returns void:
+    commandBuffer:                  VkCommandBuffer = 0xb400007a00000001
+    pipelineBindPoint:              VkPipelineBindPoint = VK_PIPELINE_BIND_POINT_GRAPHICS (0)
+    pipeline:                       VkPipeline = 0x20
+
+Thread 0, Frame 0, Time 150 us:
+vkCmdBindDescriptorSets(commandBuffer, pipelineBindPoint, layout, firstSet, descriptorSetCount, pDescriptorSets, dynamicOffsetCount, pDynamicOffsets) returns void:
+    commandBuffer:                  VkCommandBuffer = 0xb400007a00000001
+    pipelineBindPoint:              VkPipelineBindPoint = VK_PIPELINE_BIND_POINT_GRAPHICS (0)
+    layout:                         VkPipelineLayout = 0x30
+    firstSet:                       uint32_t = 0
+    descriptorSetCount:             uint32_t = 2
+    pDescriptorSets:                const VkDescriptorSet* = 0x7fc0002000
+        pDescriptorSets[0]:         const VkDescriptorSet = 0x40
+        pDescriptorSets[1]:         const VkDescriptorSet = 0x41
+
+Thread 0, Frame 0, Time 160 us:
+vkCmdDraw(commandBuffer, vertexCount, instanceCount, firstVertex, firstInstance) returns void:
+    commandBuffer:                  VkCommandBuffer = 0xb400007a00000001
+
+Thread 0, Frame 0, Time 170 us:
+vkCmdBindPipeline(commandBuffer, pipelineBindPoint, pipeline) returns void:
+    commandBuffer:                  VkCommandBuffer = 0xb400007a00000001
+    pipelineBindPoint:              VkPipelineBindPoint = VK_PIPELINE_BIND_POINT_GRAPHICS (0)
+    pipeline:                       VkPipeline = 0x20
+
+Thread 0, Frame 1, Time 400 us:
+vkCmdDispatch(commandBuffer, groupCountX, groupCountY, groupCountZ) returns void:
+    commandBuffer:                  VkCommandBuffer = 0xb400007a00000001
+'''
+
+_HTML_DUMP = '''\
+<!doctype html><html><body>
+<details class='tim'><summary>Thread 0, Frame 3, Time 100 us:</summary>
+<details class='fn'><summary><div class='var'>vkCmdBindPipeline(commandBuffer, pipelineBindPoint, pipeline)</div><div class='type'>returns void</div></summary>
+<details class='data'><summary><span class='var'>commandBuffer</span> <span class='type'>VkCommandBuffer</span> = <span class='val'>0x10</span></summary></details>
+<details class='data'><summary><span class='var'>pipeline</span> <span class='type'>VkPipeline</span> = <span class='val'>0x20</span></summary></details>
+</details></details>
+<details class='tim'><summary>Thread 1, Frame 3, Time 110 us:</summary>
+<details class='fn'><summary><div class='var'>vkCmdDrawIndexed(commandBuffer, indexCount)</div><div class='type'>returns void</div></summary>
+</details></details>
+</body></html>
+'''
+
+_JSON_DUMP = '''\
+[
+{
+  "thread" : "Thread 2",
+  "frame" : 7,
+  "time" : "100",
+  "function" : {
+    "name" : "vkCmdBindPipeline",
+    "returnType" : "void",
+    "args" : [
+      {
+        "name" : "commandBuffer",
+        "type" : "VkCommandBuffer",
+        "value" : "0x10"
+      },
+      {
+        "name" : "pipeline",
+        "type" : "VkPipeline",
+        "value" : "0x20"
+      }
+    ]
+  }
+},
+{
+  "thread" : "Thread 2",
+  "frame" : 8,
+  "time" : "200",
+  "function" : {
+    "name" : "vkQueuePresentKHR",
+    "returnType" : "VkResult",
+    "args" : [
+    ]
+  }
+}
+]
+'''
+
+
+def test_parse_text_dump(tmp_path):
+    filepath = tmp_path / 'dump.txt'
+    filepath.write_text(_TEXT_DUMP)
+    calls = list(apidump.iter_calls(str(filepath)))
+
+    assert [x.name for x in calls] == ['vkBeginCommandBuffer', 'vkCmdBindPipeline', 'vkCmdBindDescriptorSets',
+                                       'vkCmdDraw', 'vkCmdBindPipeline', 'vkCmdDispatch']
+    assert [(x.index, x.thread, x.frame, x.time) for x in calls[-2:]] == [(4, 0, 0, 170), (5, 0, 1, 400)]
+    assert apidump.get_handle(calls[1], 'pipeline') == '0x20'
+    assert apidump.get_handle_array(calls[2], 'pDescriptorSets') == ['0x40', '0x41']
+    # Pointers to structs are not handles.
+    assert apidump.get_handle(calls[0], 'pBeginInfo') is None
+
+
+@pytest.mark.parametrize('filename, content', [('dump.html', _HTML_DUMP), ('dump.json', _JSON_DUMP)])
+def test_parse_html_and_json_dump(tmp_path, filename, content):
+    filepath = tmp_path / filename
+    filepath.write_text(content)
+    calls = list(apidump.iter_calls(str(filepath)))
+
+    assert len(calls) == 2
+    assert calls[0].name == 'vkCmdBindPipeline'
+    assert apidump.get_handle(calls[0], 'commandBuffer') == '0x10'
+    assert apidump.get_handle(calls[0], 'pipeline') == '0x20'
+    assert calls[0].time == 100
+    assert calls[1].thread != calls[0].thread or calls[1].frame != calls[0].frame
+
+
+def test_call_statistics(tmp_path):
+    filepath = tmp_path / 'dump.txt'
+    filepath.write_text(_TEXT_DUMP)
+
+    statistics = apidump.CallStatistics()
+    for call in apidump.iter_calls(str(filepath)):
+        statistics.add(call)
+    report = statistics.get_report(top_n=1)
+
+    assert report['call_count'] == 6
+    assert report['frame_count'] == 2
+    assert report['draw_count'] == 1
+    assert report['dispatch_count'] == 1
+    assert report['top_calls'] == [('vkCmdBindPipeline', 2)]
+    assert report['pipeline_churn'] == {'bind_count': 2, 'redundant_bind_count': 1}
+    assert report['descriptor_set_churn'] == {'bind_count': 1, 'redundant_bind_count': 0}
+    assert report['frames'][0] == {'frame': 0, 'call_count': 5, 'draw_count': 1, 'dispatch_count': 0,
+                                   'unique_pipeline_count': 1, 'unique_descriptor_set_count': 2}
+    json.dumps(report)
+
+
+def test_export_to_sqlite(tmp_path):
+    filepath = tmp_path / 'dump.txt'
+    filepath.write_text(_TEXT_DUMP)
+    db_filepath = str(tmp_path / 'dump.sqlite')
+
+    assert apidump.export_to_sqlite(str(filepath), db_filepath, batch_size=4) == 6
+
+    calls = apidump.query_calls(db_filepath, function='vkCmdBindPipeline', frame_range=(0, 0))
+    assert [x.index for x in calls] == [1, 4]
+    assert calls[0].lines[0].startswith('vkCmdBindPipeline(')
+    assert ('pipeline', 'VkPipeline', '0x20') in calls[0].handles
+
+    assert [x.name for x in apidump.query_calls(db_filepath, frame_range=(1, 1))] == ['vkCmdDispatch']
+    assert [x.index for x in apidump.query_calls(db_filepath, handle='0x41')] == [2]
+    assert len(apidump.query_calls(db_filepath, limit=2)) == 2
+
+
+def test_cpu_profile(tmp_path):
+    filepath = tmp_path / 'dump.txt'
+    filepath.write_text(_TEXT_DUMP)
+
+    cpu_profile = apidump.CpuProfile(top_n=2)
+    for call in apidump.iter_calls(str(filepath)):
+        cpu_profile.add(call)
+    report = cpu_profile.get_report()
+
+    # Durations: begin 30, bind 20, bind sets 10, draw 10, bind 230. The last call is not timed.
+    assert report['timed_call_count'] == 5
+    assert report['functions'][0] == {'name': 'vkCmdBindPipeline', 'count': 2, 'total_us': 250,
+                                      'mean_us': 125.0, 'max_us': 230}
+    assert report['slowest_frames'] == [{'frame': 0, 'total_us': 300}]
+    assert [(x['index'], x['duration_us']) for x in report['slowest_calls']] == [(4, 230), (0, 30)]
+
+    folded_filepath = tmp_path / 'cpu.folded'
+    cpu_profile.write_folded_stacks(str(folded_filepath))
+    assert 'Thread 0;Command recording;vkCmdBindPipeline 250' in folded_filepath.read_text().splitlines()
@@ -0,0 +1,78 @@
+import json
+
+import click
+import pytest
+
+from click.testing import CliRunner
+
+import vk.commands.batch as batch
+
+
+def test_load_manifest(tmp_path):
+    filepath = tmp_path / 'nightly.json'
+    filepath.write_text(json.dumps({
+        'defaults': {'measure_frame_range': '10-110', 'runs': 3},
+        'traces': ['com.foo.bar-test1.gfxr', {'trace': 'com.foo.bar-test2.gfxr', 'runs': 1, 'screenshots': 'all'}],
+    }))
+
+    entries = batch.load_manifest(str(filepath))
+    assert [(x['trace'], x['runs'], x['measure_frame_range'], x['screenshots']) for x in entries] == [
+        ('com.foo.bar-test1.gfxr', 3, '10-110', None),
+        ('com.foo.bar-test2.gfxr', 1, '10-110', 'all'),
+    ]
+    assert entries[0]['screenshot_format'] == 'png'
+
+    filepath.write_text(json.dumps(['com.foo.bar-test1.gfxr']))
+    assert batch.load_manifest(str(filepath))[0]['runs'] == 1
+
+    filepath.write_text(json.dumps([{'trace': 'com.foo.bar-test1.gfxr', 'run': 2}]))
+    with pytest.raises(click.BadParameter):
+        batch.load_manifest(str(filepath))
+
+    filepath.write_text(json.dumps({'traces': []}))
+    with pytest.raises(click.BadParameter):
+        batch.load_manifest(str(filepath))
+
+
+def test_checkpoint_resume(tmp_path):
+    filepath = str(tmp_path / 'nightly.json.checkpoint')
+    entries = [{'trace': 'com.foo.bar-test1.gfxr', 'runs': 2}, {'trace': 'com.foo.bar-test1.gfxr', 'runs': 1}]
+    job_keys = [batch.get_job_keys(idx, x) for idx, x in enumerate(entries)]
+    # The same trace listed twice has distinct keys.
+    assert job_keys == [['0:com.foo.bar-test1.gfxr#1', '0:com.foo.bar-test1.gfxr#2'], ['1:com.foo.bar-test1.gfxr#1']]
+
+    checkpoint = batch.Checkpoint(filepath)
+    checkpoint.save()
+    checkpoint.mark_done(job_keys[0][0])
+
+    resumed_checkpoint = batch.Checkpoint(filepath)
+    assert resumed_checkpoint.time_str == checkpoint.time_str
+    assert [x for keys in job_keys for x in keys if not resumed_checkpoint.is_done(x)] == \
+        [job_keys[0][1], job_keys[1][0]]
+
+    restarted_checkpoint = batch.Checkpoint(filepath, restart=True)
+    assert not restarted_checkpoint.is_done(job_keys[0][0])
+
+
+def test_finished_batch_starts_fresh(tmp_path, monkeypatch):
+    manifest_path = tmp_path / 'nightly.json'
+    manifest_path.write_text(json.dumps({'defaults': {'runs': 2}, 'traces': ['com.foo.bar-test1.gfxr']}))
+    replayed_args = []
+    monkeypatch.setattr(batch, 'resolve_trace', lambda name: ('com.foo.bar', name, f'/sdcard/{name}', None))
+    monkeypatch.setattr(batch, 'check_trace_frame_ranges', lambda *args, **kwargs: None)
+    monkeypatch.setattr(batch, 'start_replayer', lambda args: replayed_args.append(args) or True)
+    monkeypatch.setattr(batch.utils, 'wait_for_thermal_cooldown', lambda *args: None)
+    monkeypatch.setattr(batch.utils, 'wait_until_app_exit', lambda app_name: None)
+
+    args = [str(manifest_path), '-d', str(tmp_path / 'output')]
+    for _ in range(2):
+        result = CliRunner().invoke(batch.batch, args)
+        assert result.exit_code == 0, result.output
+        assert '2/2 runs are done' in result.output
+        assert not (tmp_path / 'nightly.json.checkpoint').exists()
+    assert len(replayed_args) == 4
+
+    # Checkpoint of failed batch is kept to resume it.
+    monkeypatch.setattr(batch, 'start_replayer', lambda args: False)
+    CliRunner().invoke(batch.batch, args)
+    assert (tmp_path / 'nightly.json.checkpoint').exists()
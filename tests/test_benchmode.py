@@ -0,0 +1,24 @@
+import vk.benchmode as benchmode
+import vk.session as session
+
+
+def test_frequency_states():
+    output = ('cpu /sys/devices/system/cpu/cpufreq/policy0 300000 1800000 1000000 \n'
+              'cpu /sys/devices/system/cpu/cpufreq/policy4\n'
+              'gpu /sys/class/devfreq/3d00000.qcom,kgsl-3d0 900000000\n')
+    domains = benchmode.parse_frequency_domains(output)
+    assert domains == [
+        benchmode.FrequencyDomain('cpu', '/sys/devices/system/cpu/cpufreq/policy0', [300000, 1000000, 1800000]),
+        benchmode.FrequencyDomain('gpu', '/sys/class/devfreq/3d00000.qcom,kgsl-3d0', [900000000]),
+    ]
+
+    states = benchmode.get_frequency_states(domains[:1], 'mid')
+    policy_path = '/sys/devices/system/cpu/cpufreq/policy0'
+    assert list(states.items()) == [
+        ((session.SYSFS, f'{policy_path}/scaling_governor'), 'performance'),
+        ((session.SYSFS, f'{policy_path}/scaling_max_freq'), '1000000'),
+        ((session.SYSFS, f'{policy_path}/scaling_min_freq'), '1000000'),
+    ]
+    states = benchmode.get_frequency_states(domains[:1], 'max')
+    assert states[(session.SYSFS, f'{policy_path}/scaling_min_freq')] == '1800000'
+    assert benchmode.format_frequency('gpu', 900000000) == '900 MHz'
@@ -0,0 +1,27 @@
+import vk.capture as capture
+
+
+def test_parse_sample():
+    assert capture.parse_sample('1048576 /dev/fuse 115247656 2097152 113150504 2% /storage/emulated\n') == \
+        (1048576, 113150504 * 1024)
+    assert capture.parse_sample('0 \n') == (0, None)
+    assert capture.parse_sample('stat: permission denied') is None
+
+
+def test_capture_limits(monkeypatch):
+    stopped_apps = []
+    monkeypatch.setattr(capture.utils, 'stop_app', stopped_apps.append)
+
+    monitor = capture.CaptureMonitor('com.foo.bar', '/sdcard', 'com.foo.bar-test', 'test.csv',
+                                     max_size=3 << 20, min_free=1 << 30, stop_on_limit=True)
+    assert monitor.add_sample(0.0, 0, 4 << 30) == 0.0
+    assert monitor.add_sample(1.0, 2 << 20, 4 << 30) == 2.0
+    assert monitor.get_crossed_limits() == []
+
+    assert monitor.add_sample(2.0, 4 << 20, 4 << 30) == 2.0
+    monitor._check_limits()
+    monitor.add_sample(3.0, 8 << 20, 512 << 20)
+    assert monitor.get_crossed_limits() == ['min_free']
+    assert stopped_apps == ['com.foo.bar']
+    assert monitor.peak_rate == 8 / 3  # Rate of recent samples.
+    assert monitor.min_free_size == 512 << 20
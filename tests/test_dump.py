@@ -0,0 +1,79 @@
+import re
+
+import vk.commands.dump as dump
+
+
+class _FakeDeviceFile:
+    """Device file written at layer's own offset, truncation leaves a hole of zeros."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.write_offset = 0
+
+    def write(self, data):
+        end = self.write_offset + len(data)
+        if len(self.data) < end:
+            self.data += b'\0' * (end - len(self.data))
+        self.data[self.write_offset:end] = data
+        self.write_offset = end
+
+    def exec_out(self, cmd):
+        start, count = map(int, re.match(r'tail -c \+(\d+) .* head -c (\d+)', cmd).groups())
+        return bytes(self.data[start - 1:start - 1 + count])
+
+    def exec(self, cmd):
+        if cmd.startswith('shell stat -c %s'):
+            return str(len(self.data))
+        assert cmd.startswith('shell truncate -s 0')
+        self.data = bytearray()
+
+
+def test_stream_with_truncation(tmp_path, monkeypatch):
+    device_file = _FakeDeviceFile()
+    monkeypatch.setattr(dump.utils, 'adb_exec_out', device_file.exec_out)
+    monkeypatch.setattr(dump.utils, 'adb_exec', device_file.exec)
+    monkeypatch.setattr(dump, '_LIVE_CHUNK_SIZE', 16)
+    monkeypatch.setattr(dump, '_LIVE_TRUNCATE_THRESHOLD', 32)
+
+    local_filepath = tmp_path / 'dump.txt'
+    streamer = dump._ApiDumpStreamer('/sdcard/dump.txt', str(local_filepath), truncate=True)
+
+    device_file.write(b'Thread 0, Frame 0:\nvkQueuePresentKHR\n')
+    while streamer.pull():
+        pass
+    assert streamer.last_frame == 0
+    assert not device_file.data  # Truncated after 32 bytes are pulled.
+
+    device_file.write(b'lost\n')  # Written right before truncation.
+    device_file.data = bytearray(b'\0' * len(device_file.data))
+    device_file.write(b'Thread 0, Frame 1:\n')
+    while streamer.pull():
+        pass
+    streamer.close()
+
+    assert streamer.last_frame == 1
+    assert streamer.lost_byte_count == len(b'lost\n')
+    assert local_filepath.read_bytes() == b'Thread 0, Frame 0:\nvkQueuePresentKHR\nThread 0, Frame 1:\n'
+
+
+def test_stream_waits_for_app_launch(tmp_path, monkeypatch):
+    device_file = _FakeDeviceFile()
+    calls = []
+
+    def fake_wait_until_app_launch(app_name):
+        calls.append('launch')
+        device_file.write(b'Thread 0, Frame 0:\n')
+
+    def fake_is_app_running(app_name):
+        calls.append('running')
+        return calls.count('running') > 1
+
+    monkeypatch.setattr(dump.utils, 'adb_exec_out', device_file.exec_out)
+    monkeypatch.setattr(dump.utils, 'wait_until_app_launch', fake_wait_until_app_launch)
+    monkeypatch.setattr(dump.utils, 'is_app_running', fake_is_app_running)
+
+    local_filepath = tmp_path / 'dump.txt'
+    dump._stream_api_dump('com.foo.bar', '/sdcard/dump.txt', str(local_filepath), truncate=False)
+
+    assert calls == ['launch', 'running']
+    assert local_filepath.read_bytes() == b'Thread 0, Frame 0:\n'
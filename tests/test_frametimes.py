@@ -0,0 +1,51 @@
+import pytest
+
+import vk.frametimes as frametimes
+
+np = pytest.importorskip('numpy')
+
+_REFRESH_PERIOD = 16666666
+
+
+def _make_latency_output(timestamps):
+    lines = [str(_REFRESH_PERIOD)]
+    lines += ['0\t0\t0'] * (frametimes._RING_BUFFER_SIZE - len(timestamps))
+    lines += [f'{x - 1000}\t{x}\t{x - 2000}' for x in timestamps]
+    return '\n'.join(lines) + '\n'
+
+
+def test_parse_latency_output():
+    output = _make_latency_output([100, 200]) + f'1\t{frametimes._PENDING_TIMESTAMP}\t1\n'
+    refresh_period, timestamps = frametimes.parse_latency_output(output)
+    assert refresh_period == _REFRESH_PERIOD
+    assert timestamps == [100, 200]
+    assert frametimes.parse_latency_output('') == (None, [])
+
+
+def test_collector_deduplicates_frames(tmp_path):
+    collector = frametimes.FrameTimeCollector('com.foo.bar', str(tmp_path))
+    collector.add_latency_output(_make_latency_output([100, 200, 300]))
+    collector.add_latency_output(_make_latency_output([200, 300, 400, 500]))
+    assert collector.timestamps == [100, 200, 300, 400, 500]
+    assert collector.overflow_count == 0
+
+    # A full ring buffer without any known frame means frames are missed in between.
+    collector.add_latency_output(_make_latency_output(list(range(1000, 1000 + frametimes._RING_BUFFER_SIZE))))
+    assert collector.overflow_count == 1
+
+
+def test_analyze_frame_times():
+    # 98 frames at 60Hz, one frame spans 3 refresh periods, one spans 6.
+    frame_times = [_REFRESH_PERIOD] * 98 + [3 * _REFRESH_PERIOD, 6 * _REFRESH_PERIOD]
+    timestamps = np.cumsum([0] + frame_times).tolist()
+
+    summary = frametimes.analyze_frame_times(timestamps, _REFRESH_PERIOD)
+    assert summary['frame_count'] == 100
+    assert summary['jank_count'] == 2
+    assert summary['stutter_histogram'] == {'1': 98, '2': 0, '3': 1, '4': 0, '5+': 1}
+    assert summary['frame_time_ms']['p50'] == pytest.approx(16.666666)
+    assert summary['frame_time_ms']['max'] == pytest.approx(100.0, rel=1e-6)
+    assert summary['one_percent_low_fps'] == pytest.approx(10.0, rel=1e-6)
+
+    with pytest.raises(ValueError):
+        frametimes.analyze_frame_times([100], _REFRESH_PERIOD)
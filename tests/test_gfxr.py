@@ -0,0 +1,151 @@
+import struct
+import zlib
+
+import vk.gfxr as gfxr
+
+import pytest
+
+_DRAW_CALL_ID = 0x00011050
+_SUBMIT_CALL_ID = 0x00011020
+
+
+def _block(block_type, payload):
+    return struct.pack('<QI', len(payload), block_type) + payload
+
+
+def _function_call(call_id, params=b'\x00' * 16, thread_id=1):
+    return _block(gfxr.BlockType.FunctionCall, struct.pack('<IQ', call_id, thread_id) + params)
+
+
+def _frame_end(frame_number):
+    return _block(gfxr.BlockType.FrameMarker, struct.pack('<IQ', gfxr.MarkerType.End, frame_number))
+
+
+def _write_trace(path, frame_count, calls_per_frame=3, compression=gfxr.CompressionType.NONE):
+    data = bytearray(struct.pack('<4sHHI', b'GFXR', 0, 1, 1))
+    data += struct.pack('<II', gfxr.FileOption.CompressionType, compression)
+    for frame in range(frame_count):
+        for call in range(calls_per_frame):
+            data += _function_call(_DRAW_CALL_ID, params=bytes([call]) * (16 + frame))
+        data += _function_call(_SUBMIT_CALL_ID)
+        data += _frame_end(frame)
+
+    path.write_bytes(bytes(data))
+    return path
+
+
+def test_summarize_trace(tmp_path):
+    filepath = _write_trace(tmp_path / 'com.foo.bar-test.gfxr', frame_count=5)
+    summary = gfxr.summarize_trace(str(filepath))
+
+    assert summary.version == '0.1'
+    assert summary.compression == gfxr.CompressionType.NONE
+    assert summary.frame_count == 5
+    assert summary.block_count == 5 * 5
+    assert summary.api_call_counts[_DRAW_CALL_ID] == 15
+    assert summary.api_call_counts[_SUBMIT_CALL_ID] == 5
+    assert summary.compressed_payload_size == 0
+    assert not summary.truncated
+
+
+def test_summarize_truncated_trace(tmp_path):
+    filepath = _write_trace(tmp_path / 'com.foo.bar-test.gfxr', frame_count=2)
+    filepath.write_bytes(filepath.read_bytes()[:-4])
+    summary = gfxr.summarize_trace(str(filepath))
+
+    assert summary.frame_count == 1
+    assert summary.truncated
+
+
+def test_invalid_trace(tmp_path):
+    filepath = tmp_path / 'invalid.gfxr'
+    filepath.write_bytes(b'not a trace file')
+    with pytest.raises(gfxr.GfxrFormatError):
+        gfxr.summarize_trace(str(filepath))
+
+
+def test_frame_index(tmp_path):
+    filepath = str(_write_trace(tmp_path / 'com.foo.bar-test.gfxr', frame_count=4))
+    index = gfxr.get_frame_index(filepath)
+
+    assert index.frame_count == 4
+    assert list(index.block_counts) == [5, 5, 5, 5]
+    with gfxr.GfxrReader(filepath) as reader:
+        assert index.get_frame_offset(0) == reader.data_offset
+        blocks = list(reader.blocks(index.get_frame_offset(2)))
+        assert len(blocks) == 10
+        assert reader.read_marker(blocks[4]) == (gfxr.MarkerType.End, 2)
+
+    loaded = gfxr.FrameIndex.load(gfxr.get_frame_index_filepath(filepath))
+    assert list(loaded.offsets) == list(index.offsets)
+    assert loaded.source_size == index.source_size
+
+
+def test_stale_frame_index(tmp_path):
+    filepath = _write_trace(tmp_path / 'com.foo.bar-test.gfxr', frame_count=2)
+    assert gfxr.get_frame_index(str(filepath)).frame_count == 2
+
+    _write_trace(filepath, frame_count=3)
+    assert gfxr.get_frame_index(str(filepath)).frame_count == 3
+
+
+@pytest.mark.parametrize('compression', [gfxr.CompressionType.ZLIB, gfxr.CompressionType.LZ4,
+                                         gfxr.CompressionType.ZSTD])
+def test_recompress_trace(tmp_path, compression):
+    if compression == gfxr.CompressionType.LZ4:
+        pytest.importorskip('lz4')
+    elif compression == gfxr.CompressionType.ZSTD:
+        pytest.importorskip('zstandard')
+
+    src_filepath = str(_write_trace(tmp_path / 'com.foo.bar-test.gfxr', frame_count=20, calls_per_frame=50))
+    compressed_filepath = str(tmp_path / 'com.foo.bar-test.compressed.gfxr')
+    restored_filepath = str(tmp_path / 'com.foo.bar-test.restored.gfxr')
+
+    block_count = gfxr.recompress_trace(src_filepath, compressed_filepath, compression, jobs=2, chunk_size=4096)
+    summary = gfxr.summarize_trace(compressed_filepath)
+    assert block_count == 20 * 52
+    assert summary.compression == compression
+    assert summary.compressed_block_count > 0
+    assert summary.frame_count == 20
+
+    gfxr.recompress_trace(compressed_filepath, restored_filepath, gfxr.CompressionType.NONE, jobs=2)
+    with open(src_filepath, 'rb') as src, open(restored_filepath, 'rb') as restored:
+        src_data = src.read()
+        restored_data = restored.read()
+    # Only compression option in file header is changed.
+    assert src_data[:16] == restored_data[:16]
+    assert src_data[20:] == restored_data[20:]
+
+
+def _init_buffer(data, compressed=False):
+    block_type = gfxr.BlockType.CompressedMetaData if compressed else gfxr.BlockType.MetaData
+    payload = struct.pack('<IQQQQ', gfxr.MetaDataType.InitBufferCommand, 1, 2, 3, len(data))
+    return _block(block_type, payload + (zlib.compress(data) if compressed else data))
+
+
+def _init_image(level_data):
+    data = b''.join(level_data)
+    payload = struct.pack('<IQQQQIII', gfxr.MetaDataType.InitImageCommand, 1, 2, 4, len(data), 1, 7, len(level_data))
+    payload += b''.join(struct.pack('<Q', len(x)) for x in level_data)
+    return _block(gfxr.BlockType.MetaData, payload + data)
+
+
+def test_recompress_init_commands(tmp_path):
+    buffer_data = b'\x01\x02\x03\x04' * 256
+    image_level_data = [b'\xaa' * 512, b'\x55' * 128]
+    header = struct.pack('<4sHHI', b'GFXR', 0, 1, 1)
+
+    src_filepath = tmp_path / 'com.foo.bar-test_frames_1_through_2.gfxr'
+    src_filepath.write_bytes(header + struct.pack('<II', gfxr.FileOption.CompressionType, gfxr.CompressionType.ZLIB) +
+                             _init_buffer(buffer_data, compressed=True) + _init_image(image_level_data) + _frame_end(1))
+
+    restored_filepath = str(tmp_path / 'restored.gfxr')
+    gfxr.recompress_trace(str(src_filepath), restored_filepath, gfxr.CompressionType.NONE, jobs=1)
+    expected_data = header + struct.pack('<II', gfxr.FileOption.CompressionType, gfxr.CompressionType.NONE) + \
+        _init_buffer(buffer_data) + _init_image(image_level_data) + _frame_end(1)
+    with open(restored_filepath, 'rb') as f:
+        assert f.read() == expected_data
+
+    compressed_filepath = str(tmp_path / 'compressed.gfxr')
+    gfxr.recompress_trace(restored_filepath, compressed_filepath, gfxr.CompressionType.ZLIB, jobs=1)
+    assert gfxr.summarize_trace(compressed_filepath).compressed_block_count == 2
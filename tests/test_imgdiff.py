@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import vk.imgdiff as imgdiff
+
+np = pytest.importorskip('numpy')
+
+
+def _make_image(width=32, height=24, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def test_bmp_round_trip(tmp_path):
+    image = _make_image(width=13, height=7)
+    filepath = str(tmp_path / 'image.bmp')
+    imgdiff.write_bmp(filepath, image)
+    assert np.array_equal(imgdiff.read_bmp(filepath), image)
+
+
+def test_read_bmp_top_down_32bit(tmp_path):
+    # 2x2 BGRA pixels stored top-down (negative height).
+    pixels = bytes([0, 0, 255, 255, 0, 255, 0, 255, 255, 0, 0, 255, 255, 255, 255, 255])
+    header = b'BM' + (54 + len(pixels)).to_bytes(4, 'little') + bytes(4) + (54).to_bytes(4, 'little')
+    dib = (40).to_bytes(4, 'little') + (2).to_bytes(4, 'little') + (-2).to_bytes(4, 'little', signed=True) + \
+        (1).to_bytes(2, 'little') + (32).to_bytes(2, 'little') + bytes(24)
+    filepath = tmp_path / 'image.bmp'
+    filepath.write_bytes(header + dib + pixels)
+
+    image = imgdiff.read_bmp(str(filepath))
+    assert image.tolist() == [[[255, 0, 0], [0, 255, 0]], [[0, 0, 255], [255, 255, 255]]]
+
+
+def test_compute_metrics():
+    image = _make_image()
+    metrics = imgdiff.compute_metrics(image, image)
+    assert metrics['max_error'] == metrics['rmse'] == 0.0
+    assert metrics['psnr'] == imgdiff.MAX_PSNR
+    assert metrics['ssim'] == pytest.approx(1.0)
+
+    changed = image.copy()
+    changed[0, 0, 0] ^= 0x80
+    metrics = imgdiff.compute_metrics(changed, image)
+    assert metrics['max_error'] == 128
+    assert 0 < metrics['rmse'] < 128
+    assert metrics['ssim'] < 1.0
+
+
+def test_compare_folders(tmp_path):
+    image_folder, golden_folder, diff_folder = tmp_path / 'snap', tmp_path / 'golden', tmp_path / 'diff'
+    image_folder.mkdir()
+    golden_folder.mkdir()
+
+    image = _make_image()
+    imgdiff.write_bmp(str(image_folder / 'frame_1.bmp'), image)
+    imgdiff.write_bmp(str(golden_folder / 'frame_1.bmp'), image)
+    imgdiff.write_bmp(str(image_folder / 'frame_2.bmp'), 255 - image)
+    imgdiff.write_bmp(str(golden_folder / 'frame_2.bmp'), image)
+    imgdiff.write_bmp(str(image_folder / 'frame_3.bmp'), image)
+
+    results = imgdiff.compare_folders(str(image_folder), str(golden_folder), diff_folder=str(diff_folder),
+                                      max_workers=2)
+    assert [(x['name'], x['passed']) for x in results] == [('frame_1', True), ('frame_2', False), ('frame_3', False)]
+    assert results[2]['error'] == 'Golden image is missing'
+    assert imgdiff.read_bmp(results[1]['diff']).shape == image.shape
+    assert not (diff_folder / 'frame_1.diff.bmp').exists()
+    json.dumps(results)
@@ -0,0 +1,71 @@
+import io
+import os
+
+import vk.logcat as logcat
+
+
+class _FakeProcess:
+
+    def __init__(self, output):
+        self.stdout = io.BytesIO(output.encode())
+
+
+_LOG_LINES = [
+    '--------- beginning of main',
+    '05-30 12:34:56.789  1234  1250 E VALIDATION: Validation Error: [ VUID-vkCmdDraw-None-02859 ]',
+    '05-30 12:34:56.790   567   567 I ActivityManager: Start proc 1234',
+    '05-30 12:34:56.791  1234  1251 D FooApp  : Frame 1',
+    '05-30 12:34:56.792   890   890 I gfxrecon: Recording graphics API capture',
+]
+
+
+def test_logcat_stream_filters_lines(tmp_path):
+    filepath = str(tmp_path / 'logcat.txt')
+    stream = logcat.LogcatStream(filepath)
+    stream._pids.add('1234')
+
+    received_lines = []
+    stream.add_callback(received_lines.append)
+    stream._proc = _FakeProcess('\n'.join(_LOG_LINES) + '\n')
+    stream._file = logcat.RotatingFile(filepath)
+    stream._read_lines()
+    stream._write_lines()
+    stream._file.close()
+
+    expected_lines = [_LOG_LINES[1], _LOG_LINES[3], _LOG_LINES[4]]
+    assert received_lines == expected_lines
+    assert stream.line_count == 3
+    with open(filepath) as f:
+        assert f.read().splitlines() == expected_lines
+
+
+def test_rotating_file(tmp_path):
+    filepath = str(tmp_path / 'log.txt')
+    rotating_file = logcat.RotatingFile(filepath, max_bytes=10, backup_count=2)
+    for idx in range(4):
+        rotating_file.write(f'line {idx:03}\n')
+    rotating_file.close()
+
+    with open(filepath) as f:
+        assert f.read() == 'line 003\n'
+    with open(f'{filepath}.1') as f:
+        assert f.read() == 'line 002\n'
+    with open(f'{filepath}.2') as f:
+        assert f.read() == 'line 001\n'
+    assert not os.path.exists(f'{filepath}.3')
+
+
+def test_logcat_stream_holds_lines_until_watch(monkeypatch):
+    stream = logcat.LogcatStream(hold_until_watch=True)
+    stream._proc = _FakeProcess('\n'.join(_LOG_LINES[:3]) + '\n')
+    stream._read_lines()
+    # Held lines are released by tags at the end of stream if app is never watched.
+    assert stream._queue.get_nowait() == _LOG_LINES[1]
+    assert stream._queue.get_nowait() is None
+
+    stream = logcat.LogcatStream(hold_until_watch=True)
+    stream._held_lines += _LOG_LINES
+    monkeypatch.setattr(logcat.utils, 'get_app_pids', lambda app_name: ['1234'])
+    stream.watch_app('com.foo.bar')
+    assert [stream._queue.get_nowait() for _ in range(3)] == [_LOG_LINES[1], _LOG_LINES[3], _LOG_LINES[4]]
+    assert stream._queue.empty()
@@ -0,0 +1,87 @@
+import shutil
+
+import vk.pipeline as pipeline
+import vk.utils as utils
+
+
+def test_artifact_pipeline(tmp_path, monkeypatch):
+    device_folder = tmp_path / 'device'
+    device_folder.mkdir()
+    (device_folder / 'a.json').write_text('{}')
+    (device_folder / 'b.json').write_text('{}')
+
+    removed_paths = []
+    monkeypatch.setattr(utils, 'adb_pull', lambda src, dst: shutil.copyfile(src, dst))
+    monkeypatch.setattr(utils, 'adb_exec', lambda cmd: removed_paths.append(cmd.split()[-1]))
+
+    def fail_step(path):
+        raise RuntimeError('corrupted')
+
+    processed_paths = []
+    with pipeline.ArtifactPipeline() as p:
+        future_a = p.submit(str(device_folder / 'a.json'), str(tmp_path / 'out' / 'a.json'),
+                            steps=[processed_paths.append])
+        future_b = p.submit(str(device_folder / 'b.json'), str(tmp_path / 'out' / 'b.json'), steps=[fail_step],
+                            remove=False)
+        future_c = p.submit(str(device_folder / 'c.json'), str(tmp_path / 'out' / 'c.json'))
+
+        group_results = []
+        pipeline.add_group_callback([future_a, future_b], lambda futures: group_results.append(len(futures)))
+
+    assert future_a.result() == str(tmp_path / 'out' / 'a.json')
+    assert processed_paths == [future_a.result()]
+    assert isinstance(future_b.exception(), RuntimeError)
+    assert isinstance(future_c.exception(), OSError)
+    assert removed_paths == [str(device_folder / 'a.json')]
+    assert group_results == [2]
+
+
+def test_folder_streamer():
+    assert pipeline.parse_listing_line('1024 /sdcard/snap/screenshot_frame_1.png\r\n') == \
+        ('/sdcard/snap/screenshot_frame_1.png', 1024)
+    assert pipeline.parse_listing_line('--\n') is None
+
+    class FakePipeline:
+        def __init__(self):
+            self.submitted = []
+
+        def submit(self, path_on_device, local_path, steps=(), size=None):
+            self.submitted.append((path_on_device, local_path, size))
+
+    fake_pipeline = FakePipeline()
+    streamer = pipeline.FolderStreamer(fake_pipeline, '/sdcard/snap', 'out')
+    assert streamer.add_listing({'/sdcard/snap/1.png': 0}) == []
+    assert streamer.add_listing({'/sdcard/snap/1.png': 512, '/sdcard/snap/2.png': 0}) == []
+    assert streamer.add_listing({'/sdcard/snap/1.png': 512, '/sdcard/snap/2.png': 256}) == ['/sdcard/snap/1.png']
+    assert streamer.add_listing({'/sdcard/snap/1.png': 512, '/sdcard/snap/2.png': 300}) == []
+    # The newest file might be stalled mid-write, it waits for a newer file.
+    assert streamer.add_listing({'/sdcard/snap/2.png': 300}) == []
+    # Files still on device are finished once writer exits.
+    assert streamer.add_listing({'/sdcard/snap/2.png': 400}, is_final=True) == ['/sdcard/snap/2.png']
+    assert fake_pipeline.submitted == [('/sdcard/snap/1.png', 'out/1.png', 512), ('/sdcard/snap/2.png', 'out/2.png', 400)]
+
+
+def test_pull_size_mismatch(tmp_path, monkeypatch):
+    device_filepath = tmp_path / 'screenshot.png'
+    device_filepath.write_bytes(b'png')
+
+    removed_paths = []
+    monkeypatch.setattr(utils, 'adb_pull', lambda src, dst: shutil.copyfile(src, dst))
+    monkeypatch.setattr(utils, 'adb_exec', removed_paths.append)
+
+    with pipeline.ArtifactPipeline() as p:
+        future = p.submit(str(device_filepath), str(tmp_path / 'out' / 'screenshot.png'), size=1024)
+
+    assert isinstance(future.exception(), RuntimeError)
+    assert removed_paths == []
+
+
+def test_pull_unexpected_error(tmp_path, monkeypatch):
+    def adb_pull(src_path, dst_path):
+        b'\xff'.decode('utf-8')
+
+    monkeypatch.setattr(utils, 'adb_pull', adb_pull)
+    with pipeline.ArtifactPipeline() as p:
+        future = p.submit('/sdcard/gfxr_fps.json', str(tmp_path / 'gfxr_fps.json'))
+
+    assert isinstance(future.exception(timeout=1), UnicodeDecodeError)
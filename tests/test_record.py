@@ -0,0 +1,77 @@
+import click
+import click.testing
+import pytest
+
+import vk.commands.record as record
+import vk.config as config
+
+
+def test_list_capture_files(monkeypatch):
+    listing = ('com.foo.bar-test.gfxr\ncom.foo.bar-test_frames_100_through_150.gfxr\n'
+               'com.foo.bar-test_frame_10.gfxr\ncom.foo.bar-other.gfxr\ncom.foo.bar-test2.gfxr\ncom.foo.bar-test.gfxr.log')
+    monkeypatch.setattr(record.utils, 'list_dir', lambda folder_path: listing)
+
+    settings = config.GfxrConfigSettings('com.foo.bar')
+    assert record.list_capture_files(settings, 'test.gfxr') == [
+        'com.foo.bar-test.gfxr',
+        'com.foo.bar-test_frame_10.gfxr',
+        'com.foo.bar-test_frames_100_through_150.gfxr',
+    ]
+
+
+def test_remove_old_segments(monkeypatch):
+    listing = 'com.foo.bar-test.gfxr\ncom.foo.bar-test_frames_100_through_150.gfxr\ncom.foo.bar-other.gfxr'
+    monkeypatch.setattr(record.utils, 'list_dir', lambda folder_path: listing)
+    commands = []
+    monkeypatch.setattr(record.utils, 'adb_exec', commands.append)
+    settings = config.GfxrConfigSettings('com.foo.bar')
+
+    monkeypatch.setattr(record.click, 'confirm', lambda msg: False)
+    with pytest.raises(click.Abort):
+        record.remove_old_segments(settings, 'test.gfxr')
+    assert commands == []
+
+    monkeypatch.setattr(record.click, 'confirm', lambda msg: True)
+    record.remove_old_segments(settings, 'test.gfxr')
+    assert commands == [f'shell rm -f {settings.get_trace_folder_on_device()}/com.foo.bar-test_frames_100_through_150.gfxr']
+
+    commands.clear()
+    record.remove_old_segments(settings, 'other.gfxr')
+    assert commands == []
+
+
+def test_frame_ranges_pattern():
+    assert record._FRAME_RANGES_PATTERN.match('100-150')
+    assert record._FRAME_RANGES_PATTERN.match('10,100-150')
+    assert not record._FRAME_RANGES_PATTERN.match('100-')
+    assert not record._FRAME_RANGES_PATTERN.match('a-b')
+
+
+def test_frames_exceeding_prop_value_limit(monkeypatch):
+    monkeypatch.setattr(record.config, 'get_valid_app_name', pytest.fail)
+    frames = ','.join(str(x) for x in range(100, 140))
+    assert record._FRAME_RANGES_PATTERN.match(frames)
+
+    result = click.testing.CliRunner().invoke(record.record, ['--frames', frames, 'com.foo.bar'])
+    assert result.exit_code == 2
+    assert 'exceeds 91 bytes limit' in result.output
+
+
+def test_capture_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'resource_filename', lambda package, name: str(tmp_path / name))
+
+    settings = config.Settings()
+    settings.set_capture_profile('lz4', {'capture_compression_type': 'LZ4'})
+    assert config.Settings().get_capture_profile('lz4') == {'capture_compression_type': 'LZ4'}
+    assert config.Settings().get_capture_profile('fast')['capture_file_flush'] == 'false'
+
+    with pytest.raises(click.BadParameter):
+        settings.set_capture_profile('bad', {'capture_compression_type': 'LZ5'})
+    with pytest.raises(click.BadParameter):
+        settings.set_capture_profile('bad', {'capture_frames': '100-150'})
+    # Property values are limited to 91 bytes.
+    config.check_capture_options({'capture_trigger_frames': '1' * 91})
+    with pytest.raises(click.BadParameter):
+        config.check_capture_options({'capture_trigger_frames': '1' * 92})
+    with pytest.raises(click.BadParameter):
+        config.Settings().get_capture_profile('bad')
@@ -0,0 +1,40 @@
+import csv
+import io
+
+import vk.sampler as sampler
+
+
+class _FakeProcess:
+
+    def __init__(self, output):
+        self.stdout = io.BytesIO(output.encode())
+
+
+def test_read_samples(tmp_path):
+    device_sampler = sampler.DeviceSampler(str(tmp_path), 0.5)
+    device_sampler.nodes = [
+        ('temp', '/sys/class/thermal/thermal_zone0/temp', 'temp:cpu'),
+        ('gpu_max_freq', '/sys/class/devfreq/gpu/max_freq', 'gpu_max_freq:gpu'),
+        ('battery_current', '/sys/class/power_supply/battery/current_now', 'battery_current'),
+    ]
+    device_sampler.column_stats = {name: sampler._ColumnStats(kind) for kind, _, name in device_sampler.nodes}
+    device_sampler._proc = _FakeProcess('41500\n900000000\n-350000\n---\n'
+                                        '45000\n700000000\n\n---\n'
+                                        '44000\n900000000\n-300000\n---\n'
+                                        '43000\n600000000\n-300000\n---\n'
+                                        '42000\n')  # Incomplete sample is dropped.
+    device_sampler._read_samples()
+
+    with open(device_sampler.csv_filepath) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['time', 'temp:cpu', 'gpu_max_freq:gpu', 'battery_current']
+    assert len(rows) == 5
+    assert rows[1][1:] == ['41.5', '900', '-350']
+    assert rows[2][3] == ''
+
+    summary = device_sampler.get_summary()
+    assert summary['sample_count'] == 4
+    assert summary['columns']['temp:cpu']['max'] == 45.0
+    assert summary['columns']['gpu_max_freq:gpu']['throttle_events'] == 2
+    assert summary['columns']['gpu_max_freq:gpu']['throttled_samples'] == 2
+    assert summary['columns']['battery_current']['min'] == -350.0
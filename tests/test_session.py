@@ -0,0 +1,103 @@
+import re
+import shlex
+
+import pytest
+
+import vk.session as session
+
+
+class _FakeDevice:
+    """Evaluate state read/write scripts of session against dict of states."""
+
+    def __init__(self, states):
+        self.states = dict(states)
+        self.writes = []
+        self.script_count = 0
+
+    def _read(self, command):
+        tokens = shlex.split(command)
+        key = (session.PROP, tokens[1]) if tokens[0] == 'getprop' else (session.SETTING, tokens[3])
+        return self.states.get(key, 'null' if key[0] == session.SETTING else '')
+
+    def _write(self, command):
+        tokens = shlex.split(command)
+        if tokens[0] == 'setprop':
+            key, value = (session.PROP, tokens[1]), tokens[2]
+        elif tokens[1] == 'put':
+            key, value = (session.SETTING, tokens[3]), tokens[4]
+        else:
+            key, value = (session.SETTING, tokens[3]), None
+            self.states.pop(key, None)
+        if value is not None:
+            self.states[key] = value
+        self.writes.append(key)
+
+    def run_script(self, script, root=False):
+        self.script_count += 1
+        output = []
+        for command in script.split('; '):
+            if command == 'true':
+                continue
+            match_obj = re.match(r'echo "(\d+):\$\((.*)\)"$', command)
+            if match_obj:
+                output.append(f'{match_obj.group(1)}:{self._read(match_obj.group(2))}')
+                continue
+
+            match_obj = re.match(r'\[ "\$\((.*)\)" = (.*) \] \|\| (.*)$', command)
+            if match_obj:
+                if self._read(match_obj.group(1)) != shlex.split(match_obj.group(2))[0]:
+                    self._write(match_obj.group(3))
+                continue
+            self._write(command)
+        return '\n'.join(output)
+
+
+@pytest.fixture
+def device(tmp_path, monkeypatch):
+    device = _FakeDevice({
+        session.ENABLE_GPU_DEBUG_LAYERS: '0',
+        session.GPU_DEBUG_LAYERS: 'VK_LAYER_foo',
+        session.DEBUG_VULKAN_LAYERS: 'VK_LAYER_bar',
+    })
+    monkeypatch.setattr(session, '_run_script', device.run_script)
+    monkeypatch.setattr(session, 'get_device_serial', lambda: 'serial')
+    monkeypatch.setattr(session, 'get_journal_folder', lambda: str(tmp_path))
+    return device
+
+
+def test_session_restores_changed_states(device, tmp_path):
+    original_states = dict(device.states)
+    vvl_key = (session.PROP, 'debug.vvl.enables')
+
+    with session.LayerSession(extra_keys=[vvl_key]) as s:
+        assert (tmp_path / 'serial.layers.json').exists()
+        assert s.get_original_app_name() is None
+        assert s.get_original_layers(session.DEBUG_VULKAN_LAYERS) == ['VK_LAYER_bar']
+
+        s.enable_layers('com.foo.bar', ['VK_LAYER_KHRONOS_validation'])
+        assert device.states[session.GPU_DEBUG_APP] == 'com.foo.bar'
+        assert device.states[session.DEBUG_VULKAN_LAYERS] == ''
+        device.writes.clear()
+        device.script_count = 0
+
+    # One round trip restores only the states differing from the original ones.
+    assert device.script_count == 1
+    assert sorted(device.writes) == sorted(session.LAYER_STATE_KEYS)
+    assert device.states == original_states
+    assert not (tmp_path / 'serial.layers.json').exists()
+
+
+def test_recover_from_journal(device, tmp_path):
+    original_states = dict(device.states)
+
+    s = session.LayerSession()
+    s.__enter__()
+    s.enable_layers(global_layers=['VK_LAYER_LUNARG_api_dump'])
+    # Session is killed without exit, the journal is left behind.
+
+    journals = session.recover()
+    assert len(journals) == 1
+    assert journals[0]['states'][session.GPU_DEBUG_LAYERS] == 'VK_LAYER_foo'
+    assert device.states == original_states
+    assert not (tmp_path / 'serial.layers.json').exists()
+    assert session.recover() == []
@@ -0,0 +1,96 @@
+import json
+import math
+import pytest
+
+from click.testing import CliRunner
+
+import vk.stats as stats
+
+from vk.commands.compare import compare
+
+
+def test_percentile():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert stats.percentile(values, 0) == 1.0
+    assert stats.percentile(values, 50) == 3.0
+    assert stats.percentile(values, 95) == 4.8
+    assert stats.percentile(values, 100) == 5.0
+
+
+def test_summarize():
+    summary = stats.summarize([60.0, 58.0, 62.0, 59.0, 61.0])
+    assert summary['count'] == 5
+    assert summary['mean'] == 60.0
+    assert summary['median'] == 60.0
+    assert math.isclose(summary['stdev'], math.sqrt(2.5))
+    margin = 2.776 * math.sqrt(2.5) / math.sqrt(5)
+    assert math.isclose(summary['ci95_low'], 60.0 - margin)
+    assert math.isclose(summary['ci95_high'], 60.0 + margin)
+
+
+def test_to_json_value():
+    summary = stats.summarize([])
+    assert json.loads(json.dumps(stats.to_json_value({'fps': summary}), allow_nan=False))['fps']['mean'] is None
+    assert stats.to_json_value([1.0, math.inf, (2, -math.inf)]) == [1.0, None, [2, None]]
+
+
+def test_load_fps_measurement(tmp_path):
+    filepath = tmp_path / 'gfxr_fps.json'
+    filepath.write_text(json.dumps({'frame_range': {'start_frame': 5, 'end_frame': 55, 'frame_count': 50,
+                                                    'duration': 0.8, 'fps': 62.5}}))
+    measurement = stats.load_fps_measurement(str(filepath))
+    assert measurement['fps'] == 62.5
+    assert math.isclose(measurement['frame_time_ms'], 16.0)
+
+
+def test_mann_whitney_u():
+    u, p = stats.mann_whitney_u([1.0, 2.0, 3.0, 4.0, 5.0], [6.0, 7.0, 8.0, 9.0, 10.0])
+    assert u == 0.0
+    assert p < 0.05
+
+    _, p = stats.mann_whitney_u([1.0, 3.0, 5.0, 7.0], [2.0, 4.0, 6.0, 8.0])
+    assert p > 0.5
+
+
+def _write_measurements(folder, trace, fps_list):
+    trace_folder = folder / 'com.foo.bar' / trace
+    trace_folder.mkdir(parents=True)
+    for idx, fps in enumerate(fps_list):
+        data = {'frame_range': {'frame_count': 100, 'duration': 100 / fps, 'fps': fps}}
+        (trace_folder / f'gfxr_fps_{idx:03}.json').write_text(json.dumps(data))
+
+
+def test_compare(tmp_path):
+    baseline = tmp_path / 'baseline'
+    candidate = tmp_path / 'candidate'
+    _write_measurements(baseline, 'com.foo.bar-a.gfxr', [60, 61, 59, 60, 62, 61])
+    _write_measurements(baseline, 'com.foo.bar-b.gfxr', [30, 31, 29, 30, 30, 31])
+    _write_measurements(candidate, 'com.foo.bar-a.gfxr', [60, 59, 61, 62, 60, 61])
+    _write_measurements(candidate, 'com.foo.bar-b.gfxr', [25, 26, 24, 25, 25, 26])
+
+    runner = CliRunner()
+    result = runner.invoke(compare, [str(baseline), str(candidate), '-o', str(tmp_path / 'report.json')])
+    assert result.exit_code == 1
+    assert '1 regressions in 2 traces' in result.output
+
+    report = json.loads((tmp_path / 'report.json').read_text())
+    assert not report['traces']['com.foo.bar-a.gfxr']['regression']
+    assert report['traces']['com.foo.bar-b.gfxr']['regression']
+
+    result = runner.invoke(compare, [str(baseline), str(baseline)])
+    assert result.exit_code == 0
+
+
+def test_compare_report_is_strict_json(tmp_path):
+    baseline = tmp_path / 'baseline'
+    candidate = tmp_path / 'candidate'
+    _write_measurements(candidate, 'com.foo.bar-a.gfxr', [60, 59, 61])
+    trace_folder = baseline / 'com.foo.bar' / 'com.foo.bar-a.gfxr'
+    trace_folder.mkdir(parents=True)
+    for idx in range(3):
+        (trace_folder / f'gfxr_fps_{idx:03}.json').write_text(json.dumps({'frame_range': {'fps': 0}}))
+
+    report_filepath = tmp_path / 'report.json'
+    CliRunner().invoke(compare, [str(baseline), str(candidate), '-o', str(report_filepath)])
+    report = json.loads(report_filepath.read_text(), parse_constant=pytest.fail)
+    assert report['traces']['com.foo.bar-a.gfxr']['change'] is None
@@ -0,0 +1,71 @@
+import hashlib
+import shutil
+
+import vk.store as store
+import vk.utils as utils
+
+
+def test_add_file(tmp_path):
+    blob_store = store.BlobStore(str(tmp_path / 'store'))
+    filepath_a = tmp_path / 'a' / 'com.foo.bar-test.gfxr'
+    filepath_b = tmp_path / 'b' / 'com.foo.bar-test.gfxr'
+    for filepath in (filepath_a, filepath_b):
+        filepath.parent.mkdir()
+        filepath.write_bytes(b'GFXR' * 100)
+
+    digest_a = blob_store.add_file(str(filepath_a))
+    digest_b = blob_store.add_file(str(filepath_b))
+
+    assert digest_a == digest_b == hashlib.sha256(b'GFXR' * 100).hexdigest()
+    assert len(list(blob_store.iter_blob_paths())) == 1
+    assert filepath_a.read_bytes() == filepath_b.read_bytes() == b'GFXR' * 100
+
+
+def test_pull_skips_known_file(tmp_path, monkeypatch):
+    blob_store = store.BlobStore(str(tmp_path / 'store'))
+    device_filepath = tmp_path / 'device.gfxr'
+    device_filepath.write_bytes(b'trace data')
+    digest = hashlib.sha256(b'trace data').hexdigest()
+
+    pull_count = 0
+    def adb_pull(src_path, dst_path):
+        nonlocal pull_count
+        pull_count += 1
+        shutil.copyfile(src_path, dst_path)
+
+    monkeypatch.setattr(utils, 'adb_pull', adb_pull)
+    monkeypatch.setattr(utils, 'get_device_file_hash', lambda path: digest)
+
+    dst_a = str(tmp_path / 'a' / 'trace.gfxr')
+    dst_b = str(tmp_path / 'b' / 'trace.gfxr')
+    assert blob_store.pull(str(device_filepath), dst_a) == (digest, True)
+    assert blob_store.pull(str(device_filepath), dst_b) == (digest, False)
+    assert pull_count == 1
+    assert open(dst_b, 'rb').read() == b'trace data'
+
+
+def test_prune(tmp_path):
+    blob_store = store.BlobStore(str(tmp_path / 'store'))
+    filepath = tmp_path / 'trace.gfxr'
+    filepath.write_bytes(b'trace data')
+    blob_store.add_file(str(filepath))
+
+    assert blob_store.prune() == (0, 0)
+    store.remove_file(str(filepath))
+    assert blob_store.prune() == (1, len(b'trace data'))
+    assert not list(blob_store.iter_blob_paths())
+
+
+def test_prune_keeps_copied_blobs(tmp_path, monkeypatch):
+    def fail_link(src, dst):
+        raise OSError('cross-device link')
+
+    monkeypatch.setattr(store.os, 'link', fail_link)
+    blob_store = store.BlobStore(str(tmp_path / 'store'))
+    filepath = tmp_path / 'trace.gfxr'
+    filepath.write_bytes(b'trace data')
+    blob_store.add_file(str(filepath))
+
+    assert filepath.read_bytes() == b'trace data'
+    assert blob_store.prune() == (0, 0)
+    assert len(list(blob_store.iter_blob_paths())) == 1
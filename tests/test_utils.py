@@ -8,4 +8,52 @@ def test_extract_package_name():
 def test_extract_trace_name():
     name = 'com.khronos.vulkan_samples-test1-tag.gfxr'
     trace_name = utils.extract_trace_capture_tag(name)
-    assert trace_name == 'test1-tag.gfxr'
\ No newline at end of file
+    assert trace_name == 'test1-tag.gfxr'
+
+
+def test_unlock_device_screen_once(monkeypatch):
+    scripts = []
+
+    class _FakeProcess:
+        returncode = 0
+
+        def communicate(self):
+            return b'mWakefulness=Asleep mDreamingLockscreen=true\nmWakefulness=Awake mDreamingLockscreen=false\n', b''
+
+    def fake_popen(args, stdin=None):
+        scripts.append(args[1])
+        return _FakeProcess()
+
+    monkeypatch.setattr(utils, 'adb_popen', fake_popen)
+    monkeypatch.setattr(utils, '_screen_state', None)
+
+    assert utils.unlock_device_screen() == utils.ScreenState('Awake', False)
+    # Cached state is ready, no more adb calls.
+    assert utils.unlock_device_screen().is_ready
+    assert not utils.is_device_screen_locked()
+    assert len(scripts) == 1
+
+    assert utils.parse_screen_state('mWakefulness=Dozing mDreamingLockscreen=true') == ('Dozing', True)
+    assert not utils.parse_screen_state('').is_ready
+
+
+def test_unknown_screen_state_is_not_cached(monkeypatch):
+    scripts = []
+
+    class _FakeProcess:
+        returncode = 0
+
+        def communicate(self):
+            return b'mWakefulness=Awake\n', b''
+
+    def fake_popen(args, stdin=None):
+        scripts.append(args[1])
+        return _FakeProcess()
+
+    monkeypatch.setattr(utils, 'adb_popen', fake_popen)
+    monkeypatch.setattr(utils, '_screen_state', None)
+
+    assert utils.unlock_device_screen() == utils.ScreenState('Awake', None)
+    utils.unlock_device_screen()
+    assert len(scripts) == 2
+    assert utils._screen_state is None
@@ -0,0 +1,81 @@
+import json
+
+import vk.vvl as vvl
+
+
+def _make_line(time, message, tag='VALIDATION'):
+    return f'05-30 12:34:{time}  1234  1250 E {tag}: {message}'
+
+
+_DRAW_ERROR = ('Validation Error: [ VUID-vkCmdDraw-None-02859 ] Object 0: handle = {:#x}, '
+               'type = VK_OBJECT_TYPE_COMMAND_BUFFER; | MessageID = 0x1b2c3d4e | vkCmdDraw(): set {} is not bound.')
+_BP_WARNING = ('Validation Performance Warning: [ UNASSIGNED-BestPractices-vkCmdClearAttachments-clear-after-load ] '
+               '| MessageID = 0x4f2d3e | vkCmdClearAttachments(): issued on command buffer with no prior draws.')
+
+
+def test_aggregate_messages(tmp_path):
+    aggregator = vvl.MessageAggregator()
+    for idx in range(100):
+        aggregator.add_line(_make_line(f'{idx % 60:02}.000', _DRAW_ERROR.format(0x7a000 + idx, idx % 2)))
+    aggregator.add_line(_make_line('59.000', _BP_WARNING))
+    aggregator.add_line(_make_line('59.500', 'Validation Error: unrelated', tag='FooApp'))
+    aggregator.add_line('--------- beginning of main')
+
+    assert aggregator.message_count == 101
+    entries = aggregator.get_sorted_entries()
+    assert len(entries) == 2
+    assert entries[0].vuid == 'VUID-vkCmdDraw-None-02859'
+    assert entries[0].count == 100
+    assert entries[0].first_time == '05-30 12:34:00.000'
+    assert entries[0].last_time == '05-30 12:34:39.000'
+    assert entries[0].example.endswith('set 0 is not bound.')
+    assert entries[1].severity == 'Performance Warning'
+
+    filepath = tmp_path / 'report.json'
+    aggregator.write_report(str(filepath))
+    report = json.loads(filepath.read_text())
+    assert report['severity_counts'] == {'Error': 100, 'Performance Warning': 1}
+
+    aggregator.write_report(str(tmp_path / 'report.html'))
+    assert 'VUID-vkCmdDraw-None-02859' in (tmp_path / 'report.html').read_text()
+
+
+def test_templates_per_vuid_are_bounded():
+    aggregator = vvl.MessageAggregator()
+    for idx in range(100):
+        aggregator.add_message(f'Validation Warning: [ VUID-foo ] pipeline "name_{chr(65 + idx % 26)}{idx}x" is slow')
+
+    assert aggregator.message_count == 100
+    assert len(aggregator.entries) == vvl._MAX_TEMPLATES_PER_VUID + 1
+    assert aggregator.entries[('VUID-foo', vvl.OTHER_TEMPLATE)].count == 100 - vvl._MAX_TEMPLATES_PER_VUID
+
+
+def test_baseline_classification(tmp_path):
+    filepath = tmp_path / 'baseline.json'
+    filepath.write_text(json.dumps({
+        'vuids': ['VUID-vkCmdDraw-None-02859', 'VUID-vkQueueSubmit-fixed'],
+        'patterns': [r'BestPractices-vkCmdClearAttachments', r'never\s+seen'],
+    }))
+    baseline = vvl.Baseline.load(str(filepath))
+    aggregator = vvl.MessageAggregator(baseline)
+
+    aggregator.add_message(_DRAW_ERROR.format(0x7a000, 0))
+    aggregator.add_message(_BP_WARNING)
+    new_entry = aggregator.add_message('Validation Error: [ VUID-vkCmdDispatch-None-08600 ] descriptor is not valid')
+
+    assert {x.vuid: x.status for x in aggregator.entries.values()} == {
+        'VUID-vkCmdDraw-None-02859': 'known',
+        'UNASSIGNED-BestPractices-vkCmdClearAttachments-clear-after-load': 'known',
+        'VUID-vkCmdDispatch-None-08600': 'new',
+    }
+    assert aggregator.get_new_entries('Error') == [new_entry]
+    assert aggregator.get_report()['baseline'] == {
+        'new_count': 1,
+        'known_count': 2,
+        'fixed': {'vuids': ['VUID-vkQueueSubmit-fixed'], 'patterns': [r'never\s+seen']},
+    }
+
+    baseline.save(str(filepath), [x.vuid for x in aggregator.entries.values()])
+    saved_baseline = vvl.Baseline.load(str(filepath))
+    assert 'VUID-vkCmdDispatch-None-08600' in saved_baseline.vuids
+    assert saved_baseline.patterns == baseline.patterns
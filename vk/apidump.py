@@ -0,0 +1,538 @@
+"""Streaming parser of VK_LAYER_LUNARG_api_dump output files.
+
+Files are parsed line by line in one pass, only the lines of the current call are kept in memory.
+Text, HTML and JSON outputs are supported. They share the same information, so each format only
+needs its own patterns of frame headers, function names and handle parameters.
+"""
+
+import collections
+import heapq
+import html
+import os
+import re
+import sqlite3
+import zlib
+
+ApiCall = collections.namedtuple('ApiCall', ['index', 'thread', 'frame', 'time', 'name', 'handles', 'lines'])
+ApiCall.__doc__ = """Function call in API dump.
+
+    index: 0-based call index in file.
+    thread, frame: Thread and frame number.
+    time: Timestamp in microseconds if the dump is made with timestamps, otherwise None.
+    name: Function name. Ex. 'vkCmdDraw'.
+    handles: List of (parameter name, handle type, handle value) of parameters and their array elements.
+    lines: Raw lines of the call.
+"""
+
+DUMP_FORMATS = ('text', 'html', 'json')
+
+# Ex. "Thread 0, Frame 12, Time 1234 us:" of text and html output.
+_HEADER_PATTERN = re.compile(r'Thread (\d+), Frame (\d+)(?:, Time (\d+) us)?')
+_TEXT_CALL_PATTERN = re.compile(r'^(vk[A-Z]\w*)\(')
+# Ex. "    pipeline:   VkPipeline = 0x7b00000040" and "        pDescriptorSets[0]:  const VkDescriptorSet = 0x..."
+_TEXT_HANDLE_PATTERN = re.compile(r'^ {4}(?: {4})?(\w+(?:\[\d+\])?):\s+(?:const )?(Vk\w+)\s*=\s*(0x[0-9a-fA-F]+)\s*$')
+_HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+_HTML_HANDLE_PATTERN = re.compile(r'^(\w+(?:\[\d+\])?)\s+(?:const )?(Vk\w+)\s*=?\s*(0x[0-9a-fA-F]+)$')
+_JSON_FIELD_PATTERN = re.compile(r'^\s*"(\w+)"\s*:\s*"?([^",]*)"?,?\s*$')
+
+
+def detect_format(filepath):
+    """Return dump format of filepath by its extension or first character."""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in ('.html', '.htm'):
+        return 'html'
+    if ext == '.json':
+        return 'json'
+
+    with open(filepath, 'rb') as f:
+        head = f.read(256).lstrip()
+    if head.startswith(b'<'):
+        return 'html'
+    if head.startswith((b'[', b'{')):
+        return 'json'
+    return 'text'
+
+
+class _CallBuilder:
+
+    def __init__(self):
+        self.index = 0
+        self.thread = None
+        self.frame = None
+        self.time = None
+        self.name = None
+        self.call_fields = None
+        self.handles = []
+        self.lines = []
+
+    def start(self, name):
+        """Start a new call, return the previous call if there is one."""
+        call = self.finish()
+        self.name = name
+        self.call_fields = (self.thread, self.frame, self.time)
+        return call
+
+    def finish(self):
+        if self.name is None:
+            self.lines = []
+            return None
+
+        call = ApiCall(self.index, *self.call_fields, self.name, self.handles, self.lines)
+        self.index += 1
+        self.name = None
+        self.handles = []
+        self.lines = []
+        return call
+
+
+def _iter_text_calls(f):
+    builder = _CallBuilder()
+    for line in f:
+        line = line.rstrip('\r\n')
+        match_obj = _HEADER_PATTERN.match(line)
+        if match_obj:
+            call = builder.finish()
+            if call:
+                yield call
+            thread, frame, time = match_obj.groups()
+            builder.thread, builder.frame = int(thread), int(frame)
+            builder.time = int(time) if time else None
+            continue
+
+        match_obj = _TEXT_CALL_PATTERN.match(line)
+        if match_obj:
+            call = builder.start(match_obj.group(1))
+            if call:
+                yield call
+        elif builder.name is not None:
+            match_obj = _TEXT_HANDLE_PATTERN.match(line)
+            if match_obj:
+                builder.handles.append(match_obj.groups())
+        builder.lines.append(line)
+
+    call = builder.finish()
+    if call:
+        yield call
+
+
+def _iter_html_calls(f):
+    builder = _CallBuilder()
+    for line in f:
+        line = line.rstrip('\r\n')
+        text = ' '.join(html.unescape(_HTML_TAG_PATTERN.sub(' ', line)).split())
+        if not text:
+            continue
+
+        match_obj = _HEADER_PATTERN.match(text)
+        if match_obj:
+            call = builder.finish()
+            if call:
+                yield call
+            thread, frame, time = match_obj.groups()
+            builder.thread, builder.frame = int(thread), int(frame)
+            builder.time = int(time) if time else None
+            continue
+
+        match_obj = _TEXT_CALL_PATTERN.match(text)
+        if match_obj:
+            call = builder.start(match_obj.group(1))
+            if call:
+                yield call
+        elif builder.name is not None:
+            match_obj = _HTML_HANDLE_PATTERN.match(text)
+            if match_obj:
+                builder.handles.append(match_obj.groups())
+        builder.lines.append(line)
+
+    call = builder.finish()
+    if call:
+        yield call
+
+
+def _iter_json_calls(f):
+    builder = _CallBuilder()
+    arg_name = None
+    arg_type = None
+
+    for line in f:
+        line = line.rstrip('\r\n')
+        match_obj = _JSON_FIELD_PATTERN.match(line)
+        if not match_obj:
+            builder.lines.append(line)
+            continue
+
+        key, value = match_obj.groups()
+        if key in ('thread', 'threadNumber'):
+            builder.thread = int(re.sub(r'\D', '', value) or 0)
+            continue
+        if key in ('frame', 'frameNumber'):
+            builder.frame = int(re.sub(r'\D', '', value) or 0)
+            continue
+        if key in ('time', 'timestamp'):
+            builder.time = int(re.sub(r'\D', '', value) or 0)
+            continue
+
+        if key == 'name' and re.match(r'vk[A-Z]', value):
+            call = builder.start(value)
+            if call:
+                yield call
+            arg_name = arg_type = None
+        elif key == 'name':
+            arg_name = value
+        elif key == 'type':
+            arg_type = value
+        elif key in ('value', 'address') and builder.name is not None:
+            if arg_type and re.match(r'^(?:const )?Vk\w+$', arg_type) and value.startswith('0x'):
+                builder.handles.append((arg_name, arg_type.replace('const ', ''), value))
+            arg_name = arg_type = None
+        builder.lines.append(line)
+
+    call = builder.finish()
+    if call:
+        yield call
+
+
+def iter_calls(filepath, dump_format=None):
+    """Iterate ApiCall of API dump file in one streaming pass.
+
+    Args:
+        filepath: API dump file.
+        dump_format: 'text', 'html' or 'json'. Default is detected from filepath.
+    """
+    dump_format = dump_format or detect_format(filepath)
+    parsers = {
+        'text': _iter_text_calls,
+        'html': _iter_html_calls,
+        'json': _iter_json_calls,
+    }
+
+    with open(filepath, encoding='utf-8', errors='replace') as f:
+        yield from parsers[dump_format](f)
+
+
+def get_handle(call, name):
+    """Return value of handle parameter name of call, or None."""
+    for handle_name, _, value in call.handles:
+        if handle_name == name:
+            return value
+    return None
+
+
+def get_handle_array(call, name):
+    """Return list of handle values of array parameter name of call."""
+    prefix = f'{name}['
+    return [value for handle_name, _, value in call.handles if handle_name.startswith(prefix)]
+
+
+class CallStatistics:
+    """Per-frame call statistics of API dump.
+
+    Memory is bounded by the number of frames, functions and command buffers instead of calls.
+    """
+
+    def __init__(self):
+        self.call_count = 0
+        self.function_counts = collections.Counter()
+        self.frame_call_counts = collections.Counter()
+        self.frame_draw_counts = collections.Counter()
+        self.frame_dispatch_counts = collections.Counter()
+        self.pipeline_bind_count = 0
+        self.redundant_pipeline_bind_count = 0
+        self.descriptor_set_bind_count = 0
+        self.redundant_descriptor_set_bind_count = 0
+        self.frame_pipelines = collections.defaultdict(set)
+        self.frame_descriptor_sets = collections.defaultdict(set)
+        self._bound_pipelines = {}
+        self._bound_descriptor_sets = {}
+
+    def add(self, call):
+        self.call_count += 1
+        self.function_counts[call.name] += 1
+        self.frame_call_counts[call.frame] += 1
+
+        if call.name.startswith('vkCmdDraw'):
+            self.frame_draw_counts[call.frame] += 1
+        elif call.name.startswith('vkCmdDispatch'):
+            self.frame_dispatch_counts[call.frame] += 1
+        elif call.name == 'vkCmdBindPipeline':
+            self._add_pipeline_bind(call)
+        elif call.name == 'vkCmdBindDescriptorSets':
+            self._add_descriptor_set_bind(call)
+        elif call.name == 'vkBeginCommandBuffer':
+            # Bound states are reset at the beginning of command buffer.
+            command_buffer = get_handle(call, 'commandBuffer')
+            self._bound_pipelines.pop(command_buffer, None)
+            self._bound_descriptor_sets.pop(command_buffer, None)
+
+    def _add_pipeline_bind(self, call):
+        command_buffer = get_handle(call, 'commandBuffer')
+        pipeline = get_handle(call, 'pipeline')
+        self.pipeline_bind_count += 1
+        self.frame_pipelines[call.frame].add(pipeline)
+
+        bind_point = re.search(r'VK_PIPELINE_BIND_POINT_\w+', '\n'.join(call.lines))
+        key = (command_buffer, bind_point.group(0) if bind_point else None)
+        if self._bound_pipelines.get(key) == pipeline:
+            self.redundant_pipeline_bind_count += 1
+        self._bound_pipelines[key] = pipeline
+
+    def _add_descriptor_set_bind(self, call):
+        command_buffer = get_handle(call, 'commandBuffer')
+        descriptor_sets = tuple(get_handle_array(call, 'pDescriptorSets'))
+        self.descriptor_set_bind_count += 1
+        self.frame_descriptor_sets[call.frame].update(descriptor_sets)
+
+        if self._bound_descriptor_sets.get(command_buffer) == descriptor_sets:
+            self.redundant_descriptor_set_bind_count += 1
+        self._bound_descriptor_sets[command_buffer] = descriptor_sets
+
+    def get_report(self, top_n=20):
+        frames = sorted(x for x in self.frame_call_counts if x is not None)
+        return {
+            'call_count': self.call_count,
+            'frame_count': len(frames),
+            'draw_count': sum(self.frame_draw_counts.values()),
+            'dispatch_count': sum(self.frame_dispatch_counts.values()),
+            'top_calls': self.function_counts.most_common(top_n),
+            'pipeline_churn': {
+                'bind_count': self.pipeline_bind_count,
+                'redundant_bind_count': self.redundant_pipeline_bind_count,
+            },
+            'descriptor_set_churn': {
+                'bind_count': self.descriptor_set_bind_count,
+                'redundant_bind_count': self.redundant_descriptor_set_bind_count,
+            },
+            'frames': [{
+                'frame': frame,
+                'call_count': self.frame_call_counts[frame],
+                'draw_count': self.frame_draw_counts[frame],
+                'dispatch_count': self.frame_dispatch_counts[frame],
+                'unique_pipeline_count': len(self.frame_pipelines[frame]),
+                'unique_descriptor_set_count': len(self.frame_descriptor_sets[frame]),
+            } for frame in frames],
+        }
+
+
+def _get_call_category(name):
+    """Return category of function name for aggregated flame stacks."""
+    if name.startswith('vkCmd'):
+        return 'Command recording'
+    if name.startswith(('vkQueue', 'vkAcquireNextImage')):
+        return 'Submission'
+    if name.startswith(('vkCreate', 'vkDestroy', 'vkAllocate', 'vkFree', 'vkReset')):
+        return 'Object management'
+    if name.startswith(('vkMapMemory', 'vkUnmapMemory', 'vkFlush', 'vkInvalidate', 'vkBind')):
+        return 'Memory'
+    if name.startswith(('vkWait', 'vkGetFenceStatus', 'vkGetQueryPoolResults', 'vkDeviceWaitIdle')):
+        return 'Synchronization'
+    return 'Other'
+
+
+class CpuProfile:
+    """CPU time profile from timestamps of API dump made with `vk dump-api -t`.
+
+    CPU time of a call is the time from its entry to the entry of the next call on the same thread,
+    so it also includes application work in between. The last call of each thread is not counted.
+    """
+
+    def __init__(self, top_n=20):
+        self.top_n = top_n
+        self.function_times = {}
+        self.frame_times = collections.Counter()
+        self.folded_times = collections.Counter()
+        self.slowest_calls = []
+        self.timed_call_count = 0
+        self.untimed_call_count = 0
+        self._last_calls = {}
+
+    def add(self, call):
+        if call.time is None:
+            self.untimed_call_count += 1
+            return
+
+        last_call = self._last_calls.get(call.thread)
+        self._last_calls[call.thread] = call
+        if last_call is None:
+            return
+
+        duration = call.time - last_call.time
+        if duration < 0:
+            return
+        self.timed_call_count += 1
+
+        count, total, max_duration = self.function_times.get(last_call.name, (0, 0, 0))
+        self.function_times[last_call.name] = (count + 1, total + duration, max(max_duration, duration))
+        self.frame_times[last_call.frame] += duration
+        self.folded_times[(last_call.thread, _get_call_category(last_call.name), last_call.name)] += duration
+
+        item = (duration, last_call.index, last_call.name, last_call.frame, last_call.thread)
+        if len(self.slowest_calls) < self.top_n:
+            heapq.heappush(self.slowest_calls, item)
+        elif item > self.slowest_calls[0]:
+            heapq.heapreplace(self.slowest_calls, item)
+
+    def get_report(self):
+        functions = sorted(self.function_times.items(), key=lambda x: -x[1][1])
+        return {
+            'timed_call_count': self.timed_call_count,
+            'untimed_call_count': self.untimed_call_count,
+            'functions': [{
+                'name': name,
+                'count': count,
+                'total_us': total,
+                'mean_us': total / count,
+                'max_us': max_duration,
+            } for name, (count, total, max_duration) in functions[:self.top_n]],
+            'slowest_frames': [{'frame': frame, 'total_us': total}
+                               for frame, total in self.frame_times.most_common(self.top_n)],
+            'slowest_calls': [{
+                'index': index,
+                'name': name,
+                'frame': frame,
+                'thread': thread,
+                'duration_us': duration,
+            } for duration, index, name, frame, thread in sorted(self.slowest_calls, reverse=True)],
+        }
+
+    def write_folded_stacks(self, filepath):
+        """Write folded stacks "Thread N;category;function total_us", which is the input of flamegraph.pl."""
+        with open(filepath, 'w') as f:
+            for (thread, category, name), total in sorted(self.folded_times.items()):
+                f.write(f'Thread {thread};{category};{name} {total}\n')
+
+
+_SQLITE_SCHEMA = '''
+CREATE TABLE functions (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE calls (
+    id INTEGER PRIMARY KEY,
+    frame INTEGER,
+    thread INTEGER,
+    time INTEGER,
+    function_id INTEGER NOT NULL REFERENCES functions(id),
+    command_buffer TEXT,
+    params BLOB
+);
+CREATE TABLE handles (call_id INTEGER NOT NULL, name TEXT, type TEXT, value TEXT);
+CREATE VIEW call_view AS
+    SELECT calls.id, frame, thread, time, functions.name AS function, command_buffer, params
+    FROM calls JOIN functions ON calls.function_id = functions.id;
+'''
+
+# Indexes are created after all rows are inserted, which is much faster than updating them per row.
+_SQLITE_INDEXES = '''
+CREATE INDEX calls_function_frame ON calls (function_id, frame);
+CREATE INDEX calls_frame ON calls (frame);
+CREATE INDEX calls_command_buffer ON calls (command_buffer);
+CREATE INDEX handles_value ON handles (value);
+CREATE INDEX handles_call_id ON handles (call_id);
+'''
+
+
+def export_to_sqlite(filepath, db_filepath, dump_format=None, batch_size=10000, progress=None):
+    """Export API dump to SQLite database with one row per call.
+
+    Parameters of each call are stored as zlib-compressed raw lines in calls.params, and handle
+    parameters are stored in table handles for lookups by handle value.
+
+    Args:
+        filepath: API dump file.
+        db_filepath: Output database file, it's replaced if it exists.
+        dump_format: 'text', 'html' or 'json'. Default is detected from filepath.
+        batch_size: Number of calls inserted per transaction.
+        progress: Optional callable invoked with the number of exported calls of each batch.
+
+    Returns:
+        Number of exported calls.
+    """
+    tmp_filepath = f'{db_filepath}.tmp'
+    if os.path.exists(tmp_filepath):
+        os.remove(tmp_filepath)
+
+    conn = sqlite3.connect(tmp_filepath)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.executescript(_SQLITE_SCHEMA)
+
+        function_ids = {}
+        call_rows = []
+        handle_rows = []
+        call_count = 0
+
+        def flush():
+            conn.executemany('INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?)', call_rows)
+            conn.executemany('INSERT INTO handles VALUES (?, ?, ?, ?)', handle_rows)
+            conn.commit()
+            if progress:
+                progress(len(call_rows))
+            call_rows.clear()
+            handle_rows.clear()
+
+        for call in iter_calls(filepath, dump_format):
+            function_id = function_ids.get(call.name)
+            if function_id is None:
+                function_id = len(function_ids) + 1
+                function_ids[call.name] = function_id
+                conn.execute('INSERT INTO functions VALUES (?, ?)', (function_id, call.name))
+
+            params = zlib.compress('\n'.join(call.lines).encode('utf-8'))
+            call_rows.append((call.index, call.frame, call.thread, call.time, function_id,
+                              get_handle(call, 'commandBuffer'), params))
+            handle_rows += [(call.index, *x) for x in call.handles]
+            call_count += 1
+
+            if len(call_rows) >= batch_size:
+                flush()
+
+        flush()
+        conn.executescript(_SQLITE_INDEXES)
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_filepath, db_filepath)
+    return call_count
+
+
+def query_calls(db_filepath, function=None, frame_range=None, handle=None, limit=None):
+    """Query calls exported by export_to_sqlite().
+
+    Args:
+        db_filepath: Database file.
+        function: Function name. Ex. 'vkQueueSubmit'.
+        frame_range: Tuple of (first frame, last frame), both are inclusive.
+        handle: Handle value used by calls. Ex. '0x7b00000040'.
+        limit: Maximum number of calls.
+
+    Returns:
+        List of ApiCall, whose lines are decompressed parameters.
+    """
+    conditions = []
+    args = []
+    if function:
+        conditions.append('function = ?')
+        args.append(function)
+    if frame_range:
+        conditions.append('frame BETWEEN ? AND ?')
+        args += list(frame_range)
+    if handle:
+        conditions.append('id IN (SELECT call_id FROM handles WHERE value = ?)')
+        args.append(handle)
+
+    sql = 'SELECT id, thread, frame, time, function, params FROM call_view'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY id'
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+
+    conn = sqlite3.connect(db_filepath)
+    try:
+        calls = []
+        for call_id, thread, frame, time, name, params in conn.execute(sql, args):
+            handles = conn.execute('SELECT name, type, value FROM handles WHERE call_id = ?', (call_id,)).fetchall()
+            lines = zlib.decompress(params).decode('utf-8').split('\n')
+            calls.append(ApiCall(call_id, thread, frame, time, name, handles, lines))
+        return calls
+    finally:
+        conn.close()
@@ -0,0 +1,138 @@
+"""Benchmark mode of device for stable performance measurements.
+
+Benchmark mode disables animations and keeps screen awake while device is plugged in. With root
+access, it also switches CPU/GPU frequency domains to performance governor and pins them at a fixed
+frequency. All states are restored by the session manager of vk.session.
+"""
+
+import click
+import collections
+import shlex
+
+import vk.session as session
+import vk.utils as utils
+
+BENCH_SETTINGS = {
+    (session.SETTING, 'window_animation_scale'): '0',
+    (session.SETTING, 'transition_animation_scale'): '0',
+    (session.SETTING, 'animator_duration_scale'): '0',
+    # Bit flags of AC, USB and wireless chargers.
+    (session.SETTING, 'stay_on_while_plugged_in'): '7',
+}
+FREQ_LEVELS = ('mid', 'max')
+
+# Each line is "<kind> <node folder> <frequencies...>", max frequency is used if available frequencies are unknown.
+_FREQ_PROBE_SCRIPT = '''
+for p in /sys/devices/system/cpu/cpufreq/policy*; do
+    [ -w $p/scaling_governor ] && echo "cpu $p $(cat $p/scaling_available_frequencies 2>/dev/null || cat $p/cpuinfo_max_freq)"
+done
+for d in /sys/class/devfreq/*; do
+    case ${d##*/} in *gpu*|*mali*|*kgsl*)
+        [ -w $d/governor ] && echo "gpu $d $(cat $d/available_frequencies 2>/dev/null || cat $d/max_freq)";;
+    esac
+done
+'''
+# Node names of governor, max and min frequency. Max is written before min to raise the limits in order.
+_FREQ_NODE_NAMES = {
+    'cpu': ('scaling_governor', 'scaling_max_freq', 'scaling_min_freq'),
+    'gpu': ('governor', 'max_freq', 'min_freq'),
+}
+
+FrequencyDomain = collections.namedtuple('FrequencyDomain', ['kind', 'path', 'frequencies'])
+
+
+def parse_frequency_domains(output):
+    """Parse output of _FREQ_PROBE_SCRIPT to list of FrequencyDomain with sorted frequencies."""
+    domains = []
+    for line in output.splitlines():
+        tokens = line.split()
+        if len(tokens) < 3 or tokens[0] not in _FREQ_NODE_NAMES:
+            continue
+
+        frequencies = sorted(set(int(x) for x in tokens[2:] if x.isdigit()))
+        if frequencies:
+            domains.append(FrequencyDomain(tokens[0], tokens[1], frequencies))
+    return domains
+
+
+def probe_frequency_domains():
+    """Return list of FrequencyDomain writable with root access."""
+    proc = utils.adb_popen(['shell', f'su 0 sh -c {shlex.quote(_FREQ_PROBE_SCRIPT)}'])
+    output, _ = proc.communicate()
+    return parse_frequency_domains(output.decode('utf-8', errors='replace'))
+
+
+def format_frequency(kind, frequency):
+    # cpufreq nodes are in kHz and devfreq nodes are in Hz.
+    return f'{frequency // 1000 if kind == "cpu" else frequency // 1000000} MHz'
+
+
+def select_frequency(frequencies, level):
+    """Select frequency of level from sorted frequencies.
+
+    The middle frequency is sustainable on most devices, while the max one is throttled soon.
+    """
+    return frequencies[-1] if level == 'max' else frequencies[len(frequencies) // 2]
+
+
+def get_frequency_states(domains, level):
+    """Return dict of sysfs state key to value which pins domains at frequency of level."""
+    states = {}
+    for domain in domains:
+        frequency = str(select_frequency(domain.frequencies, level))
+        governor_name, max_name, min_name = _FREQ_NODE_NAMES[domain.kind]
+        states[(session.SYSFS, f'{domain.path}/{governor_name}')] = 'performance'
+        states[(session.SYSFS, f'{domain.path}/{max_name}')] = frequency
+        states[(session.SYSFS, f'{domain.path}/{min_name}')] = frequency
+    return states
+
+
+class BenchModeSession(session.StateSession):
+    """Put device into benchmark mode, and wait until device cools down to max_temp if it's given.
+
+    If device is already in benchmark mode kept by `vk prepare --bench`, device states are left
+    unchanged.
+    """
+
+    name = 'bench'
+
+    def __init__(self, freq_level='mid', max_temp=None, zone_pattern=None, cooldown_timeout=600):
+        super().__init__(BENCH_SETTINGS.keys())
+        self.freq_level = freq_level
+        self.max_temp = max_temp
+        self.zone_pattern = zone_pattern
+        self.cooldown_timeout = cooldown_timeout
+
+    def __enter__(self):
+        journal = session.load_journal(session.get_device_serial(), self.name)
+        if journal and journal.get('persistent'):
+            click.echo('Device is already in benchmark mode.')
+        else:
+            self._enter_bench_mode()
+
+        utils.unlock_device_screen()
+        if self.max_temp is not None:
+            utils.wait_for_thermal_cooldown(self.max_temp, self.zone_pattern, self.cooldown_timeout)
+        return self
+
+    def _enter_bench_mode(self):
+        self.root = utils.has_root_access()
+        domains = probe_frequency_domains() if self.root else []
+        if not self.root:
+            utils.log_warning('CPU/GPU frequencies are not pinned without root access.')
+
+        freq_states = get_frequency_states(domains, self.freq_level)
+        self.keys = list(BENCH_SETTINGS) + list(freq_states)
+        super().__enter__()
+        self.set_states({**BENCH_SETTINGS, **freq_states})
+
+        # Vendor drivers may reject governors or frequencies, check them back.
+        current_states = session.read_states(freq_states, self.root)
+        for key, value in freq_states.items():
+            if current_states.get(key) != value:
+                utils.log_warning(f'Failed to set {key[1]} to {value} (current: {current_states.get(key)})')
+
+        for domain in domains:
+            frequency = select_frequency(domain.frequencies, self.freq_level)
+            click.echo(f'Pin {domain.kind.upper()} {domain.path.rsplit("/", 1)[-1]} at '
+                       f'{format_frequency(domain.kind, frequency)}')
@@ -0,0 +1,188 @@
+"""Live monitor of trace size and free storage space while recording.
+
+One persistent device shell sums sizes of trace files and reads free space of the trace folder at a
+fixed interval. Samples are streamed to a CSV file for later analysis of capture overhead.
+"""
+
+import click
+import collections
+import csv
+import os
+import subprocess as sp
+import threading
+import time
+
+import vk.utils as utils
+
+_RATE_WINDOW = 5
+
+
+def parse_sample(line):
+    """Parse line of '<trace bytes> <df -k output line>'.
+
+    Returns:
+        Tuple of (trace bytes, free bytes), free bytes is None if it's unavailable.
+    """
+    tokens = line.split()
+    if not tokens or not tokens[0].isdigit():
+        return None
+
+    # Columns of df are "Filesystem 1K-blocks Used Available Use% Mounted-on".
+    free_size = int(tokens[-3]) * 1024 if len(tokens) >= 7 and tokens[-3].isdigit() else None
+    return int(tokens[0]), free_size
+
+
+class CaptureMonitor:
+    """Monitor total size of trace file <trace_folder>/<trace_prefix>.gfxr during recording.
+
+    If include_segments is set, trimmed traces <trace_prefix>_*.gfxr are summed instead.
+
+    If max_size (bytes) is exceeded or free space drops below min_free (bytes), a warning is shown,
+    or the app is stopped if stop_on_limit is set.
+
+    Usage:
+        with CaptureMonitor(app_name, trace_folder, 'com.foo.bar-test', './output/test.capture.csv'):
+            utils.wait_until_app_exit(app_name)
+    """
+
+    def __init__(self, app_name, trace_folder, trace_prefix, csv_filepath, interval=1.0, max_size=None,
+                 min_free=None, stop_on_limit=False, include_segments=False, show_progress=True):
+        self.app_name = app_name
+        self.trace_folder = trace_folder
+        self.trace_prefix = trace_prefix
+        self.csv_filepath = csv_filepath
+        self.interval = interval
+        self.max_size = max_size
+        self.min_free = min_free
+        self.stop_on_limit = stop_on_limit
+        self.include_segments = include_segments
+        self.show_progress = show_progress
+
+        self.sample_count = 0
+        self.size = 0
+        self.free_size = None
+        self.min_free_size = None
+        self.peak_rate = 0.0
+        self.duration = 0.0
+        self.is_app_stopped = False
+        self._crossed_limits = set()
+        self._samples = collections.deque(maxlen=_RATE_WINDOW + 1)
+        self._proc = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+        if exc_type is None:
+            self.show_summary()
+
+    def start(self):
+        folder, prefix = self.trace_folder, self.trace_prefix
+        pattern = f'{folder}/{prefix}_*.gfxr' if self.include_segments else f'{folder}/{prefix}.gfxr'
+        script = (f'while true; do s=0; for f in {pattern}; do '
+                  f'[ -f "$f" ] && s=$((s + $(stat -c %s "$f"))); done; '
+                  f'echo "$s $(df -k {folder} 2>/dev/null | tail -n 1)"; sleep {self.interval}; done')
+
+        folder_path = os.path.dirname(self.csv_filepath)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+
+        self._proc = utils.adb_popen(['shell', script], stdin=sp.DEVNULL)
+        self._thread = threading.Thread(target=self._read_samples, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._proc:
+            return
+
+        self._proc.terminate()
+        self._proc.wait()
+        self._thread.join()
+        self._proc = None
+        if self.show_progress and self.sample_count:
+            click.echo('')
+
+    def _read_samples(self):
+        start_time = time.monotonic()
+        with open(self.csv_filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'trace_bytes', 'free_bytes', 'mb_per_second'])
+
+            for line in self._proc.stdout:
+                sample = parse_sample(line.decode('utf-8', errors='replace'))
+                if sample is None:
+                    continue
+
+                elapsed_time = time.monotonic() - start_time
+                rate = self.add_sample(elapsed_time, *sample)
+                writer.writerow([f'{elapsed_time:.3f}', sample[0], '' if sample[1] is None else sample[1], f'{rate:.3f}'])
+                f.flush()
+
+                if self.show_progress:
+                    click.echo(f'\r{self.get_progress_text(rate)}', nl=False)
+                self._check_limits()
+
+    def add_sample(self, elapsed_time, size, free_size):
+        """Add sample and return write rate in MB/s over recent samples."""
+        self._samples.append((elapsed_time, size))
+        self.sample_count += 1
+        self.size = size
+        self.duration = elapsed_time
+        self.free_size = free_size
+        if free_size is not None:
+            self.min_free_size = free_size if self.min_free_size is None else min(self.min_free_size, free_size)
+
+        rate = 0.0
+        (start_time, start_size), (end_time, end_size) = self._samples[0], self._samples[-1]
+        if end_time > start_time:
+            rate = max(end_size - start_size, 0) / (end_time - start_time) / (1 << 20)
+        self.peak_rate = max(self.peak_rate, rate)
+        return rate
+
+    def get_progress_text(self, rate):
+        text = f'Trace: {utils.format_size(self.size)} at {rate:.1f} MB/s (~{utils.format_size(rate * 60 * (1 << 20))}/min)'
+        if self.free_size is not None:
+            text += f', free: {utils.format_size(self.free_size)}'
+            if rate > 0:
+                text += f' (full in {self.free_size / (rate * (1 << 20)) / 60:.1f} min)'
+        return text
+
+    def get_crossed_limits(self):
+        """Return list of limit names newly crossed since last call."""
+        limits = []
+        if self.max_size and self.size > self.max_size:
+            limits.append('max_size')
+        if self.min_free and self.free_size is not None and self.free_size < self.min_free:
+            limits.append('min_free')
+
+        new_limits = [x for x in limits if x not in self._crossed_limits]
+        self._crossed_limits.update(new_limits)
+        return new_limits
+
+    def _check_limits(self):
+        for limit in self.get_crossed_limits():
+            if limit == 'max_size':
+                msg = f'Trace size {utils.format_size(self.size)} exceeds {utils.format_size(self.max_size)}'
+            else:
+                msg = f'Free space {utils.format_size(self.free_size)} is below {utils.format_size(self.min_free)}'
+
+            if self.stop_on_limit and not self.is_app_stopped:
+                utils.log_warning(f'\n{msg}, stop {self.app_name}.')
+                utils.stop_app(self.app_name)
+                self.is_app_stopped = True
+            else:
+                utils.log_warning(f'\n{msg}.')
+
+    def show_summary(self):
+        if not self.sample_count:
+            return
+
+        mean_rate = self.size / self.duration / (1 << 20) if self.duration else 0.0
+        click.echo(f'Trace size: {utils.format_size(self.size)} in {self.duration:.0f}s, '
+                   f'mean {mean_rate:.1f} MB/s, peak {self.peak_rate:.1f} MB/s')
+        if self.min_free_size is not None:
+            click.echo(f'  Min free space: {utils.format_size(self.min_free_size)}')
+        click.echo(f'Capture samples ({self.sample_count}) are written to {self.csv_filepath}')
@@ -2,14 +2,24 @@ import click
 
 import vk.utils as utils
 
+from .commands.analyze import analyze_dump, export_dump, query_dump
+from .commands.batch import batch
+from .commands.bench import bench
+from .commands.compare import compare
 from .commands.dump import dump_api, dump_img
+from .commands.frametimes import frametimes
+from .commands.imgdiff import imgdiff
 from .commands.install import install
 from .commands.layer import layer, layerset
+from .commands.prepare import prepare
 from .commands.pull import pull
 from .commands.push import push
 from .commands.query import query
-from .commands.record import record
+from .commands.record import capture_profile, record
+from .commands.recover import recover
 from .commands.replay import replay
+from .commands.store import store
+from .commands.trace import trace
 from .commands.validate import validate
 
 
@@ -19,16 +29,29 @@ def cli(verbose):
     """VKCLI - Command line interface for Vulkan layer operations on Android."""
     utils.set_verbosity(verbose)
 
+cli.add_command(analyze_dump)
+cli.add_command(batch)
+cli.add_command(bench)
+cli.add_command(capture_profile)
+cli.add_command(compare)
 cli.add_command(dump_api)
 cli.add_command(dump_img)
+cli.add_command(export_dump)
+cli.add_command(frametimes)
+cli.add_command(imgdiff)
 cli.add_command(install)
 cli.add_command(layer)
 cli.add_command(layerset)
+cli.add_command(prepare)
 cli.add_command(pull)
 cli.add_command(push)
 cli.add_command(query)
+cli.add_command(query_dump)
 cli.add_command(record)
+cli.add_command(recover)
 cli.add_command(replay)
+cli.add_command(store)
+cli.add_command(trace)
 cli.add_command(validate)
 
 def main():
@@ -0,0 +1,168 @@
+import click
+import json
+import re
+import vk.apidump as apidump
+import vk.utils as utils
+
+
+def show_call_statistics(report):
+    click.echo(f'{report["call_count"]} calls in {report["frame_count"]} frames, '
+               f'{report["draw_count"]} draws, {report["dispatch_count"]} dispatches')
+
+    pipeline_churn = report['pipeline_churn']
+    descriptor_set_churn = report['descriptor_set_churn']
+    click.echo(f'Pipeline binds: {pipeline_churn["bind_count"]} '
+               f'({pipeline_churn["redundant_bind_count"]} redundant)')
+    click.echo(f'Descriptor set binds: {descriptor_set_churn["bind_count"]} '
+               f'({descriptor_set_churn["redundant_bind_count"]} redundant)')
+
+    click.echo('\nTop calls:')
+    for name, count in report['top_calls']:
+        click.echo(f'  {count:>10}  {name}')
+
+    click.echo(f'\n{"Frame":>8}{"Calls":>10}{"Draws":>10}{"Dispatches":>12}{"Pipelines":>11}{"DescSets":>10}')
+    for frame in report['frames']:
+        click.echo(f'{frame["frame"]:>8}{frame["call_count"]:>10}{frame["draw_count"]:>10}'
+                   f'{frame["dispatch_count"]:>12}{frame["unique_pipeline_count"]:>11}'
+                   f'{frame["unique_descriptor_set_count"]:>10}')
+
+
+def show_cpu_profile(report):
+    click.echo(f'\nCPU time of {report["timed_call_count"]} calls (time between call entries on each thread):')
+    click.echo(f'{"Function":<40}{"Count":>10}{"Total ms":>12}{"Mean us":>10}{"Max us":>10}')
+    for x in report['functions']:
+        click.echo(f'{x["name"]:<40}{x["count"]:>10}{x["total_us"] / 1000.0:>12.2f}'
+                   f'{x["mean_us"]:>10.1f}{x["max_us"]:>10}')
+
+    click.echo('\nSlowest frames:')
+    for x in report['slowest_frames']:
+        click.echo(f'  Frame {x["frame"]:<8}{x["total_us"] / 1000.0:>10.2f} ms')
+
+    click.echo('\nSlowest calls:')
+    for x in report['slowest_calls']:
+        click.echo(f'  #{x["index"]:<10} Thread {x["thread"]}, Frame {x["frame"]}: {x["name"]} {x["duration_us"]} us')
+
+
+@click.command()
+@click.argument('filepath', type=click.Path(exists=True, dir_okay=False))
+@click.option('-f', '--format', 'dump_format', type=click.Choice(apidump.DUMP_FORMATS, case_sensitive=False),
+              help='Format of API dump. Default is detected from file.')
+@click.option('--cpu', 'profile_cpu', is_flag=True,
+              help='Profile CPU time of calls from timestamps of dump made by `vk dump-api -t`.')
+@click.option('--folded', 'folded_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Write folded stacks of CPU profile for flame graph tools (implies --cpu).')
+@click.option('--top', 'top_n', type=click.IntRange(min=1), default=20, metavar='N',
+              help='Show N most frequent calls.')
+@click.option('-o', '--output', 'output_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Write statistics to JSON file.')
+def analyze_dump(filepath, dump_format, profile_cpu, folded_filepath, top_n, output_filepath):
+    """Analyze API dump file of `vk dump-api` on host.
+
+    The file is parsed in one streaming pass, it reports per-frame call counts, most frequent
+    calls, draw/dispatch counts, and redundant pipeline/descriptor set binds.
+
+    \b
+    >> Example 1: Show call statistics of API dump.
+    $ vk analyze-dump output/com.foo.bar_20240101-120000.api.txt
+
+    \b
+    >> Example 2: Write call statistics with top 50 calls to JSON file.
+    $ vk analyze-dump com.foo.bar.api.json --top 50 -o stats.json
+
+    \b
+    >> Example 3: Find CPU hot spots of a timestamped dump and write flame graph input.
+    $ vk analyze-dump com.foo.bar.api.txt --cpu --folded cpu.folded
+    """
+
+    statistics = apidump.CallStatistics()
+    cpu_profile = apidump.CpuProfile(top_n) if profile_cpu or folded_filepath else None
+    for call in apidump.iter_calls(filepath, dump_format):
+        statistics.add(call)
+        if cpu_profile:
+            cpu_profile.add(call)
+
+    report = statistics.get_report(top_n)
+    show_call_statistics(report)
+
+    if cpu_profile:
+        if not cpu_profile.timed_call_count:
+            utils.log_warning('Can not find timestamps in API dump, please dump it with `vk dump-api -t`.')
+        else:
+            report['cpu_profile'] = cpu_profile.get_report()
+            show_cpu_profile(report['cpu_profile'])
+            if folded_filepath:
+                cpu_profile.write_folded_stacks(folded_filepath)
+                click.echo(f'Write folded stacks to {folded_filepath}')
+
+    if output_filepath:
+        with open(output_filepath, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f'Write statistics to {output_filepath}')
+
+
+@click.command()
+@click.argument('filepath', type=click.Path(exists=True, dir_okay=False))
+@click.option('-f', '--format', 'dump_format', type=click.Choice(apidump.DUMP_FORMATS, case_sensitive=False),
+              help='Format of API dump. Default is detected from file.')
+@click.option('-o', '--output', 'db_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Output SQLite database. Default is <FILEPATH>.sqlite.')
+def export_dump(filepath, dump_format, db_filepath):
+    """Export API dump file to indexed SQLite database.
+
+    Each call is stored as one row of table "calls" with frame, thread, time, function and
+    command buffer, and its handle parameters are stored in table "handles". Query it with
+    `vk query-dump` or any SQLite client.
+
+    \b
+    >> Example 1: Export API dump to com.foo.bar.api.json.sqlite.
+    $ vk export-dump com.foo.bar.api.json
+
+    \b
+    >> Example 2: Count draws per frame with sqlite3.
+    $ sqlite3 dump.sqlite "SELECT frame, COUNT(*) FROM call_view WHERE function LIKE 'vkCmdDraw%' GROUP BY frame"
+    """
+
+    db_filepath = db_filepath or f'{filepath}.sqlite'
+    exported_count = 0
+
+    def show_progress(count):
+        nonlocal exported_count
+        exported_count += count
+        click.echo(f'\r{exported_count} calls exported', nl=False)
+
+    apidump.export_to_sqlite(filepath, db_filepath, dump_format, progress=show_progress)
+    click.echo(f'\nWrite database to {db_filepath}')
+
+
+@click.command()
+@click.argument('db_filepath', type=click.Path(exists=True, dir_okay=False))
+@click.option('-n', '--name', 'function', type=str, metavar='<function>', help='Function name. Ex. vkQueueSubmit.')
+@click.option('-r', '--range', 'frame_range', type=str, metavar='<start-end>', help='Frame range, both inclusive.')
+@click.option('--handle', type=str, metavar='<value>', help='Only calls using handle <value>.')
+@click.option('-p', '--params', 'show_params', is_flag=True, help='Show parameters of calls.')
+@click.option('--limit', type=click.IntRange(min=1), default=1000, help='Maximum number of calls.')
+def query_dump(db_filepath, function, frame_range, handle, show_params, limit):
+    """Query calls in database exported by `vk export-dump`.
+
+    \b
+    >> Example 1: List vkQueueSubmit calls in frames 100-200 with parameters.
+    $ vk query-dump dump.sqlite -n vkQueueSubmit -r 100-200 -p
+
+    \b
+    >> Example 2: List calls using pipeline 0x7b00000040.
+    $ vk query-dump dump.sqlite --handle 0x7b00000040
+    """
+
+    if frame_range:
+        match_obj = re.match(r'^(\d+)(?:-(\d+))?$', frame_range)
+        if not match_obj:
+            raise click.BadParameter(f'incorrect format {frame_range}, should be start[-end]', param_hint='--range')
+        start, end = match_obj.groups()
+        frame_range = (int(start), int(end or start))
+
+    calls = apidump.query_calls(db_filepath, function, frame_range, handle, limit)
+    for call in calls:
+        click.echo(f'#{call.index} Thread {call.thread}, Frame {call.frame}: {call.name}')
+        if show_params:
+            click.echo('\n'.join(call.lines))
+    click.echo(f'{len(calls)} calls')
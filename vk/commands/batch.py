@@ -0,0 +1,254 @@
+import click
+import functools
+import json
+import os
+import threading
+import vk.utils as utils
+
+from vk.commands.replay import REPLAYER_NAME, check_trace_frame_ranges, get_measurement_args, \
+    resolve_trace, start_replayer
+from vk.pipeline import ArtifactPipeline, add_group_callback, store_artifact
+
+_ENTRY_OPTIONS = {
+    # option name: default value
+    'measure_frame_range': None,
+    'quit_after_measurement_range': True,
+    'screenshots': None,
+    'screenshot_scale': 1.0,
+    'screenshot_format': 'png',
+    'runs': 1,
+    'args': [],
+}
+
+
+def load_manifest(filepath):
+    """Load batch manifest.
+
+    The manifest is a JSON file as below, each trace entry could be a trace name or a dict of
+    options overriding "defaults".
+
+        {
+            "defaults": {"measure_frame_range": "10-110", "runs": 3},
+            "traces": [
+                "com.foo.bar-test1.gfxr",
+                {"trace": "com.foo.bar-test2.gfxr", "screenshots": "all", "args": ["--remove-unsupported"]}
+            ]
+        }
+
+    Returns:
+        List of entry dicts with all options.
+
+    Raises:
+        BadParameter: If manifest is invalid.
+    """
+    with open(filepath) as f:
+        data = json.load(f)
+
+    if isinstance(data, list):
+        data = {'traces': data}
+
+    defaults = dict(_ENTRY_OPTIONS)
+    defaults.update(data.get('defaults', {}))
+
+    entries = []
+    for item in data.get('traces', []):
+        entry = dict(defaults)
+        entry.update({'trace': item} if isinstance(item, str) else item)
+        unknown_keys = set(entry.keys()) - set(_ENTRY_OPTIONS.keys()) - {'trace'}
+        if 'trace' not in entry or unknown_keys:
+            raise click.BadParameter(f'Invalid manifest entry {item} (unknown keys: {unknown_keys})')
+        entries.append(entry)
+
+    if not entries:
+        raise click.BadParameter(f'Can not find any trace in {filepath}')
+    return entries
+
+
+def get_job_keys(entry_idx, entry):
+    """Return checkpoint keys of runs of entry, which are stable as long as the manifest is unchanged."""
+    return [f'{entry_idx}:{entry["trace"]}#{idx}' for idx in range(1, entry['runs'] + 1)]
+
+
+class Checkpoint:
+    """Record finished jobs of a batch to resume it after interruption.
+
+    Start time of the batch is kept as well, so a resumed batch writes outputs to the same folders.
+    """
+
+    def __init__(self, filepath, restart=False):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.done_keys = set()
+        self.time_str = None
+
+        if not restart and os.path.exists(filepath):
+            with open(filepath) as f:
+                data = json.load(f)
+            self.done_keys = set(data.get('done', []))
+            self.time_str = data.get('time')
+        self.time_str = self.time_str or utils.get_time_str()
+
+    def is_done(self, key):
+        with self.lock:
+            return key in self.done_keys
+
+    def mark_done(self, key):
+        with self.lock:
+            self.done_keys.add(key)
+            self._write()
+
+    def save(self):
+        with self.lock:
+            self._write()
+
+    def remove(self):
+        """Remove checkpoint file, so the next batch starts fresh."""
+        with self.lock:
+            if os.path.exists(self.filepath):
+                os.remove(self.filepath)
+
+    def _write(self):
+        tmp_filepath = f'{self.filepath}.tmp'
+        with open(tmp_filepath, 'w') as f:
+            json.dump({'time': self.time_str, 'done': sorted(self.done_keys)}, f, indent=2)
+        os.replace(tmp_filepath, self.filepath)
+
+
+def _submit_artifacts(pipeline, artifacts, use_store=True):
+    """Submit (path_on_device, local_path, is_folder) artifacts to pipeline, return list of futures."""
+    # Screenshots of deterministic replays are often identical, store them once.
+    return [pipeline.submit(path_on_device, local_path, is_folder,
+                            steps=[store_artifact] if is_folder and use_store else [])
+            for path_on_device, local_path, is_folder in artifacts]
+
+
+def _mark_job_done(checkpoint, job_key, futures):
+    if not any(x.exception() for x in futures):
+        checkpoint.mark_done(job_key)
+
+
+def _build_replay_job(entry, settings, trace_path, local_folder, run_idx):
+    """Return (replayer arguments, artifacts to pull) of one run of entry."""
+    args = list(entry['args'])
+    artifacts = []
+
+    if entry['screenshots']:
+        folder_on_device = f'{settings.get_temp_snap_folder_on_device()}_{run_idx:03}'
+        utils.create_folder_if_not_exists(folder_on_device)
+        if entry['screenshots'] == 'all':
+            args.append('--screenshot-all')
+        else:
+            args.append(f'--screenshots {entry["screenshots"]}')
+        args.append(f'--screenshot-dir {folder_on_device}')
+        args.append(f'--screenshot-scale {entry["screenshot_scale"]}')
+        args.append(f'--screenshot-format {entry["screenshot_format"]}')
+        artifacts.append((folder_on_device, os.path.join(local_folder, f'screenshots_{run_idx:03}'), True))
+
+    if entry['measure_frame_range']:
+        fps_file_on_device = settings.get_temp_filepath_on_device(f'gfxr_fps_{run_idx:03}', '.json')
+        args += get_measurement_args(entry['measure_frame_range'], fps_file_on_device,
+                                     entry['quit_after_measurement_range'])
+        artifacts.append((fps_file_on_device, os.path.join(local_folder, f'gfxr_fps_{run_idx:03}.json'), False))
+
+    args.append(trace_path)
+    return args, artifacts
+
+
+@click.command()
+@click.argument('manifest_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('-d', '--destination', 'output_folder', type=click.Path(file_okay=False), metavar='<path>',
+              default='./output', help='Local output folder.')
+@click.option('--max-temp', type=float, default=40.0, metavar='<celsius>',
+              help='Wait until device temperature is below <celsius> before each run.')
+@click.option('--thermal-zone', 'zone_pattern', type=str, metavar='<regex>',
+              help='Only check thermal zones whose type matches <regex>. Ex. "cpu|gpu".')
+@click.option('--cooldown-timeout', type=int, default=600, metavar='<seconds>',
+              help='Maximum waiting time of cooldown before each run.')
+@click.option('--restart', is_flag=True, help='Ignore checkpoint and run all traces again.')
+@click.option('--no-store', 'no_store', is_flag=True,
+              help='Copy pulled files directly instead of linking them from local content-addressed store.')
+def batch(manifest_path, output_folder, max_temp, zone_pattern, cooldown_timeout, restart, no_store):
+    """Replay traces listed in MANIFEST_PATH back to back.
+
+    Before each run, it waits until the device cools down. Output files of the previous run are
+    pulled in background while the next run is replaying. Finished runs are recorded in
+    <MANIFEST_PATH>.checkpoint, so an interrupted batch resumes from where it stopped and writes
+    to the same batch_<time> folders. The checkpoint is removed once all runs succeed.
+
+    \b
+    >> Example 1: Replay traces in nightly.json, wait until device is below 38C before each run.
+    $ vk batch nightly.json --max-temp 38
+
+    \b
+    >> Example 2: Run whole batch again regardless of checkpoint.
+    $ vk batch nightly.json --restart
+    """
+
+    entries = load_manifest(manifest_path)
+    checkpoint = Checkpoint(f'{manifest_path}.checkpoint', restart)
+    # Keep start time before any run finishes, outputs of an interrupted run are overwritten on resume.
+    checkpoint.save()
+
+    job_count = sum(x['runs'] for x in entries)
+    is_interrupted = False
+    finished_count = 0
+    failed_jobs = []
+    job_futures = []
+
+    with ArtifactPipeline() as pipeline:
+        try:
+            for entry_idx, entry in enumerate(entries):
+                trace_name = entry['trace']
+                job_keys = get_job_keys(entry_idx, entry)
+                if all(checkpoint.is_done(x) for x in job_keys):
+                    finished_count += len(job_keys)
+                    continue
+
+                try:
+                    app_name, trace_name, trace_path, settings = resolve_trace(trace_name)
+                    check_trace_frame_ranges(settings, trace_path, measure_frame_range=entry['measure_frame_range'],
+                                             screenshots_range=entry['screenshots'])
+                except (click.BadParameter, RuntimeError) as e:
+                    utils.log_error(e)
+                    failed_jobs += job_keys
+                    continue
+
+                for run_idx, job_key in enumerate(job_keys, 1):
+                    if checkpoint.is_done(job_key):
+                        finished_count += 1
+                        continue
+
+                    utils.wait_for_thermal_cooldown(max_temp, zone_pattern, cooldown_timeout)
+
+                    finished_count += 1
+                    click.echo(f'[{finished_count}/{job_count}] Replay {trace_name} (run {run_idx}/{entry["runs"]})')
+                    local_folder = os.path.join(output_folder, app_name, trace_name, f'batch_{checkpoint.time_str}')
+                    os.makedirs(local_folder, exist_ok=True)
+
+                    args, artifacts = _build_replay_job(entry, settings, trace_path, local_folder, run_idx)
+                    if not start_replayer(args):
+                        failed_jobs.append(job_key)
+                        continue
+
+                    utils.wait_until_app_exit(REPLAYER_NAME)
+                    # Artifacts are pulled and stored in background, the device is free for the next run.
+                    futures = _submit_artifacts(pipeline, artifacts, not no_store)
+                    add_group_callback(futures, functools.partial(_mark_job_done, checkpoint, job_key))
+                    job_futures.append((job_key, futures))
+        except KeyboardInterrupt:
+            is_interrupted = True
+            utils.stop_app(REPLAYER_NAME)
+            click.echo('Batch is interrupted, waiting for pending pulls. Run the same command to resume.')
+
+    for job_key, futures in job_futures:
+        if any(x.exception() for x in futures):
+            utils.log_error(f'Failed to pull outputs of {job_key}')
+            failed_jobs.append(job_key)
+
+    click.echo(f'{len(checkpoint.done_keys)}/{job_count} runs are done.')
+    if not is_interrupted and not failed_jobs:
+        # Next run of the same manifest (ex. nightly job) replays all traces again in a new folder.
+        checkpoint.remove()
+    if failed_jobs:
+        click.echo('Failed runs:')
+        click.echo('\n'.join(failed_jobs))
@@ -0,0 +1,171 @@
+import click
+import contextlib
+import csv
+import json
+import os
+import vk.stats as stats
+import vk.utils as utils
+
+from vk.benchmode import BenchModeSession
+from vk.commands.replay import REPLAYER_NAME, check_trace_frame_ranges, get_measurement_args, \
+    resolve_trace, start_replayer
+
+_SUMMARY_KEYS = ('count', 'mean', 'median', 'min', 'max', 'p5', 'p95', 'stdev', 'ci95_low', 'ci95_high')
+
+
+def run_measurement(settings, trace_path, measure_frame_range, local_filepath, extra_args=None,
+                    flush_measurement_range=False, flush_inside_measurement_range=False):
+    """Replay trace once and pull its measurement file to local_filepath.
+
+    Args:
+        settings: GfxrConfigSettings of the trace.
+        trace_path: Trace file path on device.
+        measure_frame_range: Frame range <start-end> for FPS measurement.
+        local_filepath: Local path of measurement file. If None, the measurement is discarded.
+        extra_args: Additional replayer arguments.
+
+    Returns:
+        True if the replayer is launched successfully.
+    """
+    fps_file_on_device = settings.get_temp_filepath_on_device('gfxr_fps', '.json')
+    args = list(extra_args) if extra_args else []
+    args += get_measurement_args(measure_frame_range, fps_file_on_device, True,
+                                 flush_measurement_range, flush_inside_measurement_range)
+    args.append(trace_path)
+
+    if not start_replayer(args):
+        return False
+
+    utils.wait_until_app_exit(REPLAYER_NAME)
+    if local_filepath:
+        utils.adb_pull(fps_file_on_device, local_filepath)
+    utils.adb_exec(f'shell rm -f {fps_file_on_device}')
+    return True
+
+
+def summarize_runs(runs):
+    """Return summaries of FPS and frame time of runs."""
+    return {
+        'fps': stats.summarize([x['fps'] for x in runs]),
+        'frame_time_ms': stats.summarize([x['frame_time_ms'] for x in runs]),
+    }
+
+
+def write_result_file(filepath, result):
+    """Write benchmark result to JSON, or CSV if filepath ends with '.csv'.
+
+    The CSV file contains one row per run, followed by one row per summary statistic.
+    """
+    folder_path = os.path.dirname(filepath)
+    if folder_path and not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+
+    if not filepath.lower().endswith('.csv'):
+        with open(filepath, 'w') as f:
+            json.dump(stats.to_json_value(result), f, indent=2, allow_nan=False)
+        return
+
+    with open(filepath, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['trace', 'run', 'fps', 'frame_time_ms', 'frame_count', 'duration'])
+        for run in result['runs']:
+            writer.writerow([result['trace'], run['run'], run['fps'], run['frame_time_ms'],
+                             run['frame_count'], run['duration']])
+        for key in _SUMMARY_KEYS:
+            writer.writerow([result['trace'], key, result['fps'][key], result['frame_time_ms'][key], '', ''])
+
+
+def show_summary(result):
+    fps = result['fps']
+    frame_time = result['frame_time_ms']
+    click.echo(f'{result["trace"]} ({fps["count"]} runs, frames {result["measure_frame_range"]}):')
+    click.echo(f'  {"":<14}{"mean":>10}{"median":>10}{"p5":>10}{"p95":>10}{"stdev":>10}  95% CI')
+    for name, summary in (('FPS', fps), ('Frame time ms', frame_time)):
+        click.echo(f'  {name:<14}{summary["mean"]:>10.2f}{summary["median"]:>10.2f}{summary["p5"]:>10.2f}'
+                   f'{summary["p95"]:>10.2f}{summary["stdev"]:>10.2f}'
+                   f'  [{summary["ci95_low"]:.2f}, {summary["ci95_high"]:.2f}]')
+
+
+@click.command()
+@click.argument('trace_name', type=str, default='?')
+@click.option('-mfr', '--measure-frame-range', type=str, metavar='<start-end>', required=True,
+              help='Frame range <start-end> for FPS measurement.')
+@click.option('-n', '--runs', 'run_count', type=click.IntRange(min=2), default=10, metavar='N',
+              help='Number of measured runs.')
+@click.option('-w', '--warmup', 'warmup_count', type=click.IntRange(min=0), default=1, metavar='N',
+              help='Number of warm-up runs which are not measured.')
+@click.option('--flush-measurement-range', is_flag=True,
+              help='Flush and wait for GPU to finish works at start and end of the measurement range.')
+@click.option('--flush-inside-measurement-range', is_flag=True,
+              help='Flush and wait for GPU to finish works at the end of each frame in the measurement range.')
+@click.option('-o', '--output', 'output_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Result file (*.json or *.csv). Default is bench_<time>.json in pull folder.')
+@click.option('--pull', 'pull_folder', type=click.Path(), metavar='<local_folder>',
+              help='Pull measurement files from device to <local_folder>.')
+@click.option('--bench-mode', is_flag=True,
+              help='Run in benchmark mode of `vk prepare --bench` after device cools down below 40C.')
+def bench(trace_name, measure_frame_range, run_count, warmup_count, flush_measurement_range,
+          flush_inside_measurement_range, output_filepath, pull_folder, bench_mode):
+    """Benchmark TRACE_NAME with repeated FPS measurements.
+
+    TRACE_NAME supports the same inputs as `vk replay`.
+
+    \b
+    >> Example 1: Replay trace 2 times for warm-up, then measure frames 5-50 in 10 runs.
+    $ vk bench com.foo.bar-test.gfxr -mfr 5-50 -w 2 -n 10
+
+    \b
+    >> Example 2: Measure 20 runs and write per-run results and statistics to CSV.
+    $ vk bench com.foo.bar-test.gfxr -mfr 5-50 -n 20 -o result.csv
+
+    \b
+    >> Example 3: Measure 10 runs with pinned clocks and no animations, then restore device states.
+    $ vk bench com.foo.bar-test.gfxr -mfr 5-50 --bench-mode
+    """
+
+    app_name, trace_name, trace_path, settings = resolve_trace(trace_name)
+    check_trace_frame_ranges(settings, trace_path, measure_frame_range=measure_frame_range)
+
+    time_str = utils.get_time_str()
+    if not pull_folder:
+        pull_folder = f'./output/{app_name}/{trace_name}/bench_{time_str}'
+    if not os.path.exists(pull_folder):
+        os.makedirs(pull_folder)
+
+    def run(local_filepath):
+        if not run_measurement(settings, trace_path, measure_frame_range, local_filepath,
+                               flush_measurement_range=flush_measurement_range,
+                               flush_inside_measurement_range=flush_inside_measurement_range):
+            raise click.ClickException('Failed to launch replayer')
+
+    runs = []
+    with BenchModeSession(max_temp=40.0) if bench_mode else contextlib.nullcontext():
+        for idx in range(warmup_count):
+            click.echo(f'Warm-up run {idx + 1}/{warmup_count}')
+            run(None)
+
+        for idx in range(run_count):
+            local_filepath = os.path.join(pull_folder, f'gfxr_fps_{idx + 1:03}.json')
+            run(local_filepath)
+
+            measurement = stats.load_fps_measurement(local_filepath)
+            measurement['run'] = idx + 1
+            measurement['file'] = local_filepath
+            runs.append(measurement)
+            click.echo(f'Run {idx + 1}/{run_count}: {measurement["fps"]:.2f} FPS')
+
+    result = {
+        'app': app_name,
+        'trace': trace_name,
+        'measure_frame_range': measure_frame_range,
+        'warmup_count': warmup_count,
+        'runs': runs,
+    }
+    result.update(summarize_runs(runs))
+
+    if not output_filepath:
+        output_filepath = os.path.join(pull_folder, f'bench_{time_str}.json')
+    write_result_file(output_filepath, result)
+
+    show_summary(result)
+    click.echo(f'Write benchmark result to {output_filepath}')
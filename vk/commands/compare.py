@@ -0,0 +1,168 @@
+import click
+import json
+import math
+import os
+import vk.stats as stats
+import vk.utils as utils
+
+_METRICS = {
+    # metric name: (measurement key, is higher better)
+    'fps': ('fps', True),
+    'frame_time': ('frame_time_ms', False),
+}
+
+
+def _get_trace_key(filepath, root_folder):
+    """Return trace key of measurement file under root_folder.
+
+    Replay outputs are stored as <root>/<app>/<trace>/[bench_<time>/]gfxr_fps_*.json, so the nearest
+    *.gfxr folder is used as the key. Otherwise the parent folder relative to root_folder is used.
+    """
+    rel_folder = os.path.relpath(os.path.dirname(filepath), root_folder)
+    parts = rel_folder.replace('\\', '/').split('/')
+    for part in reversed(parts):
+        if part.endswith('.gfxr'):
+            return part
+    return '/'.join(parts)
+
+
+def load_result_set(path):
+    """Load FPS measurements from a bench result file, a measurement file or a folder of them.
+
+    Returns:
+        Dict of trace key to list of measurements.
+
+    Raises:
+        BadParameter: If no measurement is found.
+    """
+    result_set = {}
+
+    if os.path.isfile(path):
+        with open(path) as f:
+            data = json.load(f)
+        if 'runs' in data:
+            result_set[data['trace']] = data['runs']
+        else:
+            result_set[_get_trace_key(path, os.path.dirname(path))] = [stats.load_fps_measurement(path)]
+    else:
+        for root, _, files in os.walk(path):
+            for filename in sorted(files):
+                if not (filename.startswith('gfxr_fps') and filename.endswith('.json')):
+                    continue
+                filepath = os.path.join(root, filename)
+                try:
+                    measurement = stats.load_fps_measurement(filepath)
+                except ValueError as e:
+                    utils.log_warning(e)
+                    continue
+                result_set.setdefault(_get_trace_key(filepath, path), []).append(measurement)
+
+    if not result_set:
+        raise click.BadParameter(f'Can not find any FPS measurement in {path}')
+    return result_set
+
+
+def compare_samples(baseline, candidate, higher_is_better, threshold, alpha):
+    """Compare two sample lists.
+
+    Returns:
+        Dict of medians, relative change of median, p-value and whether it's a regression.
+    """
+    baseline_median = stats.percentile(sorted(baseline), 50)
+    candidate_median = stats.percentile(sorted(candidate), 50)
+    change = (candidate_median - baseline_median) / baseline_median if baseline_median else math.nan
+    _, p_value = stats.mann_whitney_u(baseline, candidate)
+
+    worse_change = -change if higher_is_better else change
+    is_significant = p_value < alpha
+    return {
+        'baseline_count': len(baseline),
+        'candidate_count': len(candidate),
+        'baseline_median': baseline_median,
+        'candidate_median': candidate_median,
+        'change': change,
+        'p_value': p_value,
+        'regression': is_significant and worse_change > threshold,
+        'improvement': is_significant and -worse_change > threshold,
+    }
+
+
+@click.command()
+@click.argument('baseline_path', type=click.Path(exists=True))
+@click.argument('candidate_path', type=click.Path(exists=True))
+@click.option('-m', '--metric', type=click.Choice(list(_METRICS.keys())), default='fps',
+              help='Compared metric.')
+@click.option('-t', '--threshold', type=float, default=2.0, metavar='<percent>',
+              help='Minimum change of median in percent to be flagged.')
+@click.option('-a', '--alpha', type=float, default=0.05, help='Significance level of Mann-Whitney U test.')
+@click.option('-o', '--output', 'output_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Write comparison report to JSON file.')
+def compare(baseline_path, candidate_path, metric, threshold, alpha, output_filepath):
+    """Compare FPS measurements of BASELINE_PATH and CANDIDATE_PATH.
+
+    Each path could be a result file of `vk bench`, a measurement file, or a folder containing
+    gfxr_fps*.json files of replays (ex. ./output). Measurements are grouped by trace, and a trace
+    is flagged when its median changes beyond the threshold with statistical significance.
+
+    Exit status is 1 if any regression is found.
+
+    \b
+    >> Example 1: Compare all traces measured in two output folders.
+    $ vk compare output_driver_a output_driver_b
+
+    \b
+    >> Example 2: Flag frame time regressions larger than 5%.
+    $ vk compare -m frame_time -t 5 base/bench.json new/bench.json
+    """
+
+    measurement_key, higher_is_better = _METRICS[metric]
+    baseline_set = load_result_set(baseline_path)
+    candidate_set = load_result_set(candidate_path)
+
+    results = {}
+    for trace in sorted(set(baseline_set) | set(candidate_set)):
+        if trace not in baseline_set or trace not in candidate_set:
+            results[trace] = None
+            continue
+
+        baseline = [x[measurement_key] for x in baseline_set[trace]]
+        candidate = [x[measurement_key] for x in candidate_set[trace]]
+        results[trace] = compare_samples(baseline, candidate, higher_is_better, threshold / 100.0, alpha)
+
+    trace_col_width = max(max(len(x) for x in results), 10)
+    click.echo(f'{"Trace": <{trace_col_width}}  {"Baseline":>10}  {"Candidate":>10}  {"Change":>8}  {"p-value":>8}')
+    click.echo('─' * (trace_col_width + 46))
+
+    regression_count = 0
+    for trace, result in results.items():
+        if result is None:
+            side = 'baseline' if trace in baseline_set else 'candidate'
+            click.echo(f'{trace: <{trace_col_width}}  (only in {side})')
+            continue
+
+        mark = ''
+        if result['regression']:
+            regression_count += 1
+            mark = '  REGRESSION'
+        elif result['improvement']:
+            mark = '  improved'
+        click.echo(f'{trace: <{trace_col_width}}  {result["baseline_median"]:>10.2f}  '
+                   f'{result["candidate_median"]:>10.2f}  {result["change"]:>+8.1%}  {result["p_value"]:>8.3f}{mark}')
+
+    click.echo('─' * (trace_col_width + 46))
+    click.echo(f'{regression_count} regressions in {len(results)} traces ({metric}, threshold={threshold}%, alpha={alpha})')
+
+    if output_filepath:
+        report = {
+            'metric': metric,
+            'threshold': threshold,
+            'alpha': alpha,
+            'baseline': baseline_path,
+            'candidate': candidate_path,
+            'traces': results,
+        }
+        with open(output_filepath, 'w') as f:
+            json.dump(stats.to_json_value(report), f, indent=2, allow_nan=False)
+
+    if regression_count:
+        click.get_current_context().exit(1)
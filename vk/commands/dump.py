@@ -1,53 +1,157 @@
 import click
 import os
+import re
+import time
 import vk.config as config
+import vk.session as session
 import vk.utils as utils
 
+from vk.session import LayerSession
+
 
 _API_DUMP_LAYER_NAME = 'VK_LAYER_LUNARG_api_dump'
 _API_DUMP_LAYER_FILE_NAME = 'libVkLayer_api_dump.so'
 _SCREENSHOT_LAYER_NAME = 'VK_LAYER_LUNARG_screenshot'
 _SCREENSHOT_LAYER_FILE_NAME = 'libVkLayer_screenshot.so'
 
+_LIVE_CHUNK_SIZE = 8 << 20
+_LIVE_POLL_INTERVAL = 1.0
+_LIVE_TRUNCATE_THRESHOLD = 16 << 20
+# Ex. "Thread 0, Frame 12:" in text/html output and "frame" : 12 in json output.
+_FRAME_PATTERN = re.compile(rb'Frame (\d+)|"frame(?:Number)?"\s*:\s*"?(\d+)')
+
 
-class DumpSession:
+class DumpSession(LayerSession):
 
     def __init__(self, app_name, layer_name):
+        super().__init__()
         self.app_name = app_name
         self.layer_name = layer_name
 
     def __enter__(self):
-        self.old_global_layers = utils.get_debug_vulkan_layers()
-        self.old_app_name = utils.get_gpu_debug_app()
-        self.old_app_layers = utils.get_gpu_debug_layers()
-        self.old_enable_app_layers = utils.get_enable_gpu_debug_layers()
-
-        utils.enable_gpu_debug_layers(True)
+        super().__enter__()
         if self.app_name is None:
             # Set layer globally.
-            utils.set_debug_vulkan_layers(self.old_global_layers + [self.layer_name])
-            utils.set_gpu_debug_app(None)
-            utils.set_gpu_debug_layers(None)
+            self.enable_layers(global_layers=self.get_original_layers(session.DEBUG_VULKAN_LAYERS) + [self.layer_name])
         else:
-            utils.set_debug_vulkan_layers(None)
-            if self.old_app_name != self.app_name:
-                utils.set_gpu_debug_app(self.app_name)
-                utils.set_gpu_debug_layers([self.layer_name])
-            else:
-                utils.set_gpu_debug_layers(self.old_app_layers + [self.layer_name])
+            app_layers = [self.layer_name]
+            if self.get_original_app_name() == self.app_name:
+                app_layers = self.get_original_layers(session.GPU_DEBUG_LAYERS) + app_layers
+            self.enable_layers(self.app_name, app_layers)
 
             utils.unlock_device_screen()
             utils.stop_app(self.app_name)
             utils.start_app(self.app_name)
+        return self
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         if self.app_name:
             utils.stop_app(self.app_name)
+        super().__exit__(exc_type, exc_value, exc_tb)
+
 
-        utils.set_debug_vulkan_layers(self.old_global_layers)
-        utils.enable_gpu_debug_layers(self.old_enable_app_layers)
-        utils.set_gpu_debug_app(self.old_app_name)
-        utils.set_gpu_debug_layers(self.old_app_layers)
+class _ApiDumpStreamer:
+    """Copy API dump file on device to local file incrementally by byte offset.
+
+    If truncate is set, the device file is truncated after every 16MB pulled. The layer keeps
+    writing at its own file offset, so the truncated head becomes a hole and later bytes still land
+    at the same offsets. Bytes written between the last pull and the truncation are lost, they are
+    read back as zeros and reported.
+    """
+
+    def __init__(self, path_on_device, local_filepath, truncate=False):
+        self.path_on_device = path_on_device
+        self.local_filepath = local_filepath
+        self.truncate = truncate
+        self.offset = 0
+        self.last_frame = None
+        self.lost_byte_count = 0
+        self._last_truncated_offset = None
+        self._has_pending_hole = False
+        self._tail = b''
+        self._file = open(local_filepath, 'wb')
+
+    def close(self):
+        self._file.close()
+
+    def pull(self):
+        """Pull new bytes on device.
+
+        Returns:
+            Number of bytes consumed from device file, 0 if there is nothing new.
+        """
+        data = utils.adb_exec_out(f'tail -c +{self.offset + 1} {self.path_on_device} 2>/dev/null | head -c {_LIVE_CHUNK_SIZE}')
+        if not data:
+            if self._last_truncated_offset is not None:
+                self._check_appending_writer()
+            return 0
+
+        consumed_size = len(data)
+        if self._has_pending_hole:
+            # Bytes written after last pull and before truncation are zeros now.
+            hole_size = len(data) - len(data.lstrip(b'\0'))
+            self.lost_byte_count += hole_size
+            self.offset += hole_size
+            data = data[hole_size:]
+            self._has_pending_hole = not data
+
+        self._file.write(data)
+        self.offset += len(data)
+        # Keep tail of last chunk to find frame numbers across chunk boundary.
+        text = self._tail + data
+        frame_numbers = [int(a or b) for a, b in _FRAME_PATTERN.findall(text)]
+        if frame_numbers:
+            self.last_frame = max(frame_numbers + [self.last_frame or 0])
+        self._tail = text[-32:]
+
+        # Only truncate after catching up end of file to narrow the window of losing bytes.
+        is_caught_up = consumed_size < _LIVE_CHUNK_SIZE
+        if self.truncate and is_caught_up and \
+                self.offset - (self._last_truncated_offset or 0) >= _LIVE_TRUNCATE_THRESHOLD:
+            utils.adb_exec(f'shell truncate -s 0 {self.path_on_device}')
+            self._last_truncated_offset = self.offset
+            self._has_pending_hole = True
+        return consumed_size
+
+    def _check_appending_writer(self):
+        # Offset-based writer leaves file empty until its next write, which extends file beyond our offset.
+        size = utils.get_file_size(self.path_on_device)
+        if size and size < self.offset:
+            # The layer appends to the end of file, new data starts from the beginning after truncation.
+            utils.log_warning(f'{self.path_on_device} is opened in append mode, '
+                              f'bytes after offset {size} might be lost.')
+            self.offset = 0
+            self._last_truncated_offset = 0
+            self._has_pending_hole = False
+
+    def show_progress(self):
+        frame_text = f', frame {self.last_frame}' if self.last_frame is not None else ''
+        click.echo(f'\r{utils.format_size(self.offset - self.lost_byte_count)} pulled{frame_text}    ', nl=False)
+
+
+def _stream_api_dump(app_name, path_on_device, local_filepath, truncate):
+    """Stream API dump file to local_filepath until app exits or ctrl+c."""
+    streamer = _ApiDumpStreamer(path_on_device, local_filepath, truncate)
+    try:
+        if app_name:
+            # Otherwise the app is not running yet and streaming stops right away.
+            utils.wait_until_app_launch(app_name)
+        while True:
+            while streamer.pull():
+                streamer.show_progress()
+            if app_name and not utils.is_app_running(app_name):
+                break
+            time.sleep(_LIVE_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+
+    while streamer.pull():
+        streamer.show_progress()
+    streamer.close()
+
+    click.echo()
+    if streamer.lost_byte_count:
+        utils.log_warning(f'{streamer.lost_byte_count} bytes are lost due to truncation on device.')
 
 
 @click.command()
@@ -59,8 +163,11 @@ class DumpSession:
 @click.option('-t', '--timestamp', 'show_timestamp', is_flag=True, default=False, help='Show timestamp of function calls.')
 @click.option('-d', '--destination', 'local_dst_folder', type=click.Path(),
               metavar='<path>', default='./output', help='Local output folder path.')
+@click.option('--live', is_flag=True, help='Stream API dump to local file while app is running.')
+@click.option('--truncate', is_flag=True,
+              help='Truncate API dump file on device while streaming to bound its storage (best effort).')
 @click.argument('filename', type=click.Path(), default='')
-def dump_api(app_name, range, show_timestamp, format, filename, local_dst_folder):
+def dump_api(app_name, range, show_timestamp, format, filename, local_dst_folder, live, truncate):
     """Dump API log with VK_LAYER_LUNARG_api_dump.
 
     \b
@@ -83,6 +190,10 @@ def dump_api(app_name, range, show_timestamp, format, filename, local_dst_folder
     >> Example 3: Launch com.foo.bar and then dump its API log of 8 frames start from frame 5.
     $ vk dump-api --app com.foo.bar --range 5-8
 
+    \b
+    >> Example 4: Launch com.foo.bar and stream its API log to local folder until it exits.
+    $ vk dump-api --app com.foo.bar --live
+
     \f
     https://vulkan.lunarg.com/doc/sdk/latest/windows/api_dump_layer.html
     """
@@ -113,6 +224,10 @@ def dump_api(app_name, range, show_timestamp, format, filename, local_dst_folder
     # Ref: https://github.com/KhronosGroup/Vulkan-Samples/issues/646
     output_dst_folder = f'/sdcard/Android/data/{app_name}/files'
     output_path_on_device = f'{output_dst_folder}/{tmp_filename}'
+    local_dst_filepath = os.path.normpath(os.path.join(local_dst_folder, f'{filename}_{time_str}.api.{ext}'))
+
+    if truncate and not live:
+        raise click.UsageError('--truncate requires --live')
 
     try:
         utils.create_folder_if_not_exists(output_dst_folder)
@@ -127,15 +242,18 @@ def dump_api(app_name, range, show_timestamp, format, filename, local_dst_folder
         utils.adb_setprop('debug.vulkan.api_dump.timestamp', show_timestamp)
 
         ret = None
+        if not os.path.exists(local_dst_folder):
+            os.makedirs(local_dst_folder)
+
         with DumpSession(app_name, _API_DUMP_LAYER_NAME):
             click.echo(f'Start dumping API (range={range}) to {output_path_on_device}')
-            ret = utils.acquire_valid_input('Want to Stop or Stop-and-Pull (s/sp)? ', ('s', 'sp'))
+            if live:
+                click.echo(f'Streaming API dump to {local_dst_filepath} (ctrl+c to stop)')
+                _stream_api_dump(app_name, output_path_on_device, local_dst_filepath, truncate)
+            else:
+                ret = utils.acquire_valid_input('Want to Stop or Stop-and-Pull (s/sp)? ', ('s', 'sp'))
 
         if ret == 'sp':
-            if not os.path.exists(local_dst_folder):
-                os.makedirs(local_dst_folder)
-
-            local_dst_filepath = os.path.normpath(os.path.join(local_dst_folder, f'{filename}_{time_str}.api.{ext}'))
             click.echo(f'Copying api dump file to {local_dst_filepath}')
             utils.adb_pull(output_path_on_device, local_dst_filepath)
 
@@ -0,0 +1,55 @@
+import click
+import time
+import vk.config as config
+import vk.utils as utils
+
+from vk.frametimes import FrameTimeCollector
+
+
+@click.command()
+@click.option('--app', 'app_name', type=str, metavar='<app_name>', default='?',
+              help='Target app. Type ? for later selection.')
+@click.option('-t', '--duration', type=click.FloatRange(min=1.0), metavar='<seconds>',
+              help='Stop collection after <seconds>. Default is until app exits or ctrl+c.')
+@click.option('-i', '--interval', type=click.FloatRange(min=0.1, max=1.0), default=0.5, metavar='<seconds>',
+              help='Polling interval of SurfaceFlinger.')
+@click.option('--layer', type=str, metavar='<layer_name>',
+              help='SurfaceFlinger layer name. Default is the layer of app with most presented frames.')
+@click.option('-d', '--destination', 'output_folder', type=click.Path(file_okay=False), metavar='<path>',
+              help='Local output folder. Default is ./output/<app_name>.')
+def frametimes(app_name, duration, interval, layer, output_folder):
+    """Collect frame times of running app and analyze janks.
+
+    Frame times are polled from `dumpsys SurfaceFlinger --latency`. The app is launched if it's
+    not running. Requires numpy on host.
+
+    \b
+    >> Example 1: Collect frame times of com.foo.bar until it exits.
+    $ vk frametimes --app com.foo.bar
+
+    \b
+    >> Example 2: Collect frame times of com.foo.bar for 30 seconds.
+    $ vk frametimes --app com.foo.bar -t 30
+    """
+
+    app_name = config.get_valid_app_name(app_name)
+    if not utils.is_app_running(app_name):
+        utils.start_app(app_name)
+        utils.wait_until_app_launch(app_name)
+
+    collector = FrameTimeCollector(app_name, output_folder or f'./output/{app_name}', interval, layer)
+    collector.start()
+
+    try:
+        if duration:
+            click.echo(f'Collecting frame times for {duration} seconds...')
+            time.sleep(duration)
+        else:
+            click.echo('Collecting frame times until app exits (ctrl+c to stop)...')
+            utils.wait_until_app_exit(app_name)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+
+    collector.show_summary()
@@ -0,0 +1,88 @@
+import click
+import json
+import os
+
+from vk.imgdiff import DEFAULT_TOLERANCE, Tolerance, compare_folders
+
+
+def show_results(results, tolerance):
+    failed_results = [x for x in results if not x['passed']]
+    if failed_results:
+        name_col_width = max(max(len(x['name']) for x in failed_results), 10)
+        click.echo(f'{"Image": <{name_col_width}}  {"Max":>6}  {"Mean":>8}  {"RMSE":>8}  {"PSNR":>7}  {"SSIM":>7}')
+        click.echo('─' * (name_col_width + 48))
+        for x in failed_results:
+            if 'error' in x:
+                click.echo(f'{x["name"]: <{name_col_width}}  {x["error"]}')
+            else:
+                click.echo(f'{x["name"]: <{name_col_width}}  {x["max_error"]:>6.0f}  {x["mean_error"]:>8.3f}  '
+                           f'{x["rmse"]:>8.3f}  {x["psnr"]:>7.2f}  {x["ssim"]:>7.4f}')
+        click.echo('─' * (name_col_width + 48))
+
+    click.echo(f'{len(failed_results)} failures in {len(results)} images '
+               f'(max RMSE={tolerance.max_rmse}, min SSIM={tolerance.min_ssim})')
+
+
+def check_images(image_folder, golden_folder, tolerance=DEFAULT_TOLERANCE, diff_folder=None,
+                 max_workers=None, output_filepath=None):
+    """Compare images against golden images and show failures.
+
+    Returns:
+        Number of failed images.
+    """
+    diff_folder = diff_folder or f'{os.path.normpath(image_folder)}_diff'
+    results = compare_folders(image_folder, golden_folder, tolerance, diff_folder, max_workers)
+    show_results(results, tolerance)
+
+    failed_count = sum(not x['passed'] for x in results)
+    if any('diff' in x for x in results):
+        click.echo(f'Write diff heatmaps to {diff_folder}')
+
+    if output_filepath:
+        report = {
+            'images': image_folder,
+            'golden': golden_folder,
+            'max_rmse': tolerance.max_rmse,
+            'min_ssim': tolerance.min_ssim,
+            'results': results,
+        }
+        with open(output_filepath, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f'Write comparison report to {output_filepath}')
+    return failed_count
+
+
+@click.command()
+@click.argument('image_folder', type=click.Path(exists=True, file_okay=False))
+@click.argument('golden_folder', type=click.Path(exists=True, file_okay=False))
+@click.option('--max-rmse', type=click.FloatRange(min=0.0), default=DEFAULT_TOLERANCE.max_rmse,
+              help='Maximum RMSE of RGB channels in [0, 255] scale.')
+@click.option('--min-ssim', type=click.FloatRange(max=1.0), default=DEFAULT_TOLERANCE.min_ssim,
+              help='Minimum SSIM of luma.')
+@click.option('-d', '--diff', 'diff_folder', type=click.Path(file_okay=False), metavar='<path>',
+              help='Output folder of diff heatmaps of failed images. Default is <IMAGE_FOLDER>_diff.')
+@click.option('-j', '--jobs', 'max_workers', type=click.IntRange(min=1), metavar='N',
+              help='Number of worker processes. Default is number of CPUs.')
+@click.option('-o', '--output', 'output_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Write comparison report to JSON file.')
+def imgdiff(image_folder, golden_folder, max_rmse, min_ssim, diff_folder, max_workers, output_filepath):
+    """Compare screenshots against golden images.
+
+    Images in IMAGE_FOLDER and GOLDEN_FOLDER are paired by file name without extension, so BMP screenshots could be compared with
+    PNG golden images. An image fails when its RMSE or SSIM is beyond tolerance, or when it has
+    no counterpart. Requires numpy, and Pillow for PNG images.
+
+    Exit status is 1 if any image fails.
+
+    \b
+    >> Example 1: Compare screenshots of replay against golden images.
+    $ vk imgdiff output/com.foo.bar/com.foo.bar-test.gfxr/snap golden/com.foo.bar-test
+
+    \b
+    >> Example 2: Allow small rasterization differences and write report for CI.
+    $ vk imgdiff snap golden --max-rmse 2.5 --min-ssim 0.98 -o imgdiff.json
+    """
+
+    tolerance = Tolerance(max_rmse, min_ssim)
+    if check_images(image_folder, golden_folder, tolerance, diff_folder, max_workers, output_filepath):
+        click.get_current_context().exit(1)
@@ -0,0 +1,47 @@
+import click
+import vk.benchmode as benchmode
+import vk.session as session
+
+
+@click.command()
+@click.option('--bench', 'bench_mode', is_flag=True,
+              help='Put device into benchmark mode until `vk prepare --restore` or `vk recover`.')
+@click.option('--restore', is_flag=True, help='Restore device states changed by `vk prepare --bench`.')
+@click.option('--freq', 'freq_level', type=click.Choice(benchmode.FREQ_LEVELS), default='mid',
+              help='Pin CPU/GPU at middle or max available frequency (require ROOT access).')
+@click.option('--max-temp', type=float, default=40.0, metavar='<celsius>',
+              help='Wait until device temperature is below <celsius>.')
+@click.option('--thermal-zone', 'zone_pattern', type=str, metavar='<regex>',
+              help='Only check thermal zones whose type matches <regex>. Ex. "cpu|gpu".')
+@click.option('--cooldown-timeout', type=int, default=600, metavar='<seconds>',
+              help='Maximum waiting time of cooldown.')
+def prepare(bench_mode, restore, freq_level, max_temp, zone_pattern, cooldown_timeout):
+    """Prepare device states for measurements.
+
+    Benchmark mode disables animations and keeps screen awake while device is plugged in. With
+    ROOT access, CPU/GPU frequency domains are switched to performance governor and pinned at a
+    fixed frequency. Original states are kept in a journal on host.
+
+    \b
+    >> Example 1: Put device into benchmark mode, measure FPS, then restore device states.
+    $ vk prepare --bench
+    $ vk bench com.foo.bar-test.gfxr -mfr 5-50
+    $ vk prepare --restore
+
+    \b
+    >> Example 2: Pin clocks at max frequencies and wait until device is below 35C.
+    $ vk prepare --bench --freq max --max-temp 35
+    """
+    if bench_mode == restore:
+        raise click.UsageError('Specify one of --bench and --restore.')
+
+    if restore:
+        if not session.recover(name=benchmode.BenchModeSession.name):
+            click.echo('Device is not in benchmark mode.')
+        else:
+            click.echo('Device states are restored.')
+        return
+
+    with benchmode.BenchModeSession(freq_level, max_temp, zone_pattern, cooldown_timeout) as bench_session:
+        bench_session.keep()
+    click.echo('Device is in benchmark mode, run `vk prepare --restore` to restore device states.')
@@ -1,68 +1,107 @@
 import click
 import os
+import vk.store as store
 import vk.utils as utils
 
+from vk.commands.trace import show_trace_summary
 from vk.config import GfxrConfigSettings as ConfigSettings
 
 
-def _pull_file_to_local(src_filepath_on_device, local_dst_folder_path, session):
+def pull_file(src_filepath_on_device, dst_filepath, blob_store=None):
+    """Copy file from device to dst_filepath through blob_store if it's given.
+
+    Args:
+        src_filepath_on_device: File path on device.
+        dst_filepath: Destination file path on local.
+        blob_store: Optional store.BlobStore to skip transfer of known files.
+    """
+    if not blob_store:
+        utils.adb_pull(src_filepath_on_device, dst_filepath)
+        return
+
+    digest, is_transferred = blob_store.pull(src_filepath_on_device, dst_filepath)
+    if not is_transferred:
+        click.echo(f'Link {dst_filepath} to stored blob {digest[:12]}')
+
+
+def _pull_file_to_local(src_filepath_on_device, local_dst_folder_path, session, blob_store):
     """Copy file from device to local directory.
 
     Args:
         src_filepath_on_device: File path on device.
         local_dst_folder_path: Destination folder on local.
         session: utils.ConfirmSession for overwrite decision.
+        blob_store: Optional store.BlobStore for de-duplication.
+
+    Returns:
+        Local file path, or None if the copy is skipped.
     """
     filename = os.path.basename(src_filepath_on_device)
     dst_filepath = os.path.join(local_dst_folder_path, filename)
     if not os.path.exists(dst_filepath):
         click.echo(f'Copying {src_filepath_on_device} to {local_dst_folder_path}')
-        utils.adb_pull(src_filepath_on_device, local_dst_folder_path)
-        return
+        pull_file(src_filepath_on_device, dst_filepath, blob_store)
+        return dst_filepath
 
     if not session.force_overwrite():
         msg = f'{dst_filepath} already exists, overwrite it?'
         if not session.confirm(msg):
-            return
+            return None
 
     # Overwrite file.
     dst_bak_filepath = utils.get_bak_filepath(dst_filepath)
     os.rename(dst_filepath, dst_bak_filepath)
     display_src_path = src_filepath_on_device if utils.is_verbose() else filename
     click.echo(f'Copying {display_src_path} to {local_dst_folder_path}')
-    utils.adb_pull(src_filepath_on_device, local_dst_folder_path)
-    os.remove(dst_bak_filepath)
+    pull_file(src_filepath_on_device, dst_filepath, blob_store)
+    store.remove_file(dst_bak_filepath)
+    return dst_filepath
 
 
-def _pull_trace_folder(src_path_on_device, local_dst_path, session):
+def _pull_trace_folder(src_path_on_device, local_dst_path, session, blob_store):
     """Copy folder from device to local directory.
 
     Args:
         src_path_on_device: Folder path on device.
         local_dst_path: Destination folder path on local.
         session: utils.ConfirmSession for overwrite decision.
+        blob_store: Optional store.BlobStore for de-duplication.
+
+    Returns:
+        List of copied local file paths.
     """
     basename = os.path.basename(src_path_on_device)
     local_dst_folder_path = os.path.join(local_dst_path, basename)
-    if not os.path.exists(local_dst_folder_path):
+    if not os.path.exists(local_dst_folder_path) and not blob_store:
         os.makedirs(local_dst_folder_path)
         click.echo(f'Copying {src_path_on_device} to {local_dst_path}')
         utils.adb_pull(src_path_on_device, local_dst_path)
-        return
+        return [os.path.join(local_dst_folder_path, x) for x in os.listdir(local_dst_folder_path)]
+
+    if not os.path.exists(local_dst_folder_path):
+        os.makedirs(local_dst_folder_path)
 
+    local_filepaths = []
     trace_filenames = utils.list_dir(src_path_on_device)
     for trace_name in trace_filenames:
-        src_filepath_on_device = os.path.join(src_path_on_device, trace_name)
-        _pull_file_to_local(src_filepath_on_device, local_dst_folder_path, session)
+        src_filepath_on_device = f'{src_path_on_device}/{trace_name}'
+        local_filepath = _pull_file_to_local(src_filepath_on_device, local_dst_folder_path, session, blob_store)
+        if local_filepath:
+            local_filepaths.append(local_filepath)
+    return local_filepaths
 
 
-def _pull_traces(src_path, local_dst_path, session):
+def _pull_traces(src_path, local_dst_path, session, blob_store):
     """Pull trace files to local_dst_path.
 
     Args:
         src_path: Trace file name or '?' to select from menu.
         local_dst_path: Local folder.
         session: Confirm session for file overwrite.
+        blob_store: Optional store.BlobStore for de-duplication.
+
+    Returns:
+        List of copied local file paths.
 
     Raises:
         BadParameter: If not found trace repo on device.
@@ -85,30 +124,38 @@ def _pull_traces(src_path, local_dst_path, session):
         if app_name == src_path:
             # Pull whole traces from app to local host.
             src_path_on_device = settings.get_trace_folder_on_device()
-            _pull_trace_folder(src_path_on_device, local_dst_path, session)
-            return
+            return _pull_trace_folder(src_path_on_device, local_dst_path, session, blob_store)
         else:
             src_path_on_device = settings.get_trace_path_on_device(src_path)
 
     if not os.path.exists(local_dst_path):
         os.makedirs(local_dst_path)
+        dst_filepath = os.path.join(local_dst_path, os.path.basename(src_path_on_device))
         click.echo(f'Copying {src_path_on_device} to {local_dst_path}')
-        utils.adb_pull(src_path_on_device, local_dst_path)
-    else:
-        _pull_file_to_local(src_path_on_device, local_dst_path, session)
+        pull_file(src_path_on_device, dst_filepath, blob_store)
+        return [dst_filepath]
+
+    local_filepath = _pull_file_to_local(src_path_on_device, local_dst_path, session, blob_store)
+    return [local_filepath] if local_filepath else []
 
 
 @click.command()
 @click.option('-d', '--destination', 'dst_folder', type=click.Path(),
               metavar='<path>', default='./output', help='Local destination path.')
 @click.option('-f', '--force', is_flag=True, help='Force overwrite local files.')
+@click.option('-s', '--summary', 'show_summary', is_flag=True, help='Show summary of pulled traces.')
+@click.option('--no-store', 'no_store', is_flag=True,
+              help='Copy files directly instead of linking them from local content-addressed store.')
 @click.argument('path', type=click.Path())
-def pull(path, dst_folder, force):
+def pull(path, dst_folder, force, show_summary, no_store):
     """Pull traces from device.
 
     PATH could be package name or trace name with naming convention: <app_name>-trace_name.gfxr.
     If PATH is ?, <app_name> could be selected from menu.
 
+    Pulled files are kept in a local content-addressed store (see `vk store`) and linked to
+    destination. The transfer is skipped if the same file has been pulled before.
+
     \b
     >> Example 1: Pull trace with explicit file name.
     $ vk pull com.foo.bar-test.gfxr
@@ -120,7 +167,17 @@ def pull(path, dst_folder, force):
     \b
     >> Example 3: Pull all traces from selected trace repo on device.
     $ vk pull ?
+
+    \b
+    >> Example 4: Pull trace and show its frame count, API call count and payload size.
+    $ vk pull -s com.foo.bar-test.gfxr
     """
 
     session = utils.ConfirmSession(force)
-    _pull_traces(path, dst_folder, session)
\ No newline at end of file
+    blob_store = None if no_store else store.get_blob_store()
+    local_filepaths = _pull_traces(path, dst_folder, session, blob_store)
+
+    if show_summary:
+        for filepath in local_filepaths:
+            if filepath.endswith('.gfxr'):
+                show_trace_summary(filepath, top_n=0)
@@ -1,12 +1,33 @@
 import click
 import os
+import vk.gfxr as gfxr
 import vk.utils as utils
 
 from vk.config import GfxrConfigSettings as ConfigSettings
 
 
+def _push_frame_index(filepath, settings):
+    """Push frame index of trace to device, the index is built on host if necessary.
+
+    Args:
+        filepath: Path to trace file.
+        settings: GfxrConfigSettings of the trace.
+    """
+    try:
+        index = gfxr.get_frame_index(filepath)
+    except gfxr.GfxrFormatError as e:
+        utils.log_warning(f'Skip frame index of {filepath}: {e}')
+        return
+
+    trace_filename = os.path.basename(filepath)
+    index_path_on_device = settings.get_frame_index_path_on_device(trace_filename)
+    if utils.is_verbose():
+        click.echo(f'Push frame index ({index.frame_count} frames) to {index_path_on_device}')
+    utils.adb_push(gfxr.get_frame_index_filepath(filepath), index_path_on_device)
+
+
 def _push_trace_file(filepath, session):
-    """Push trace file to trace repo on device.
+    """Push trace file and its frame index to trace repo on device.
 
     Args:
         filepath: Path to trace file.
@@ -33,6 +54,7 @@ def _push_trace_file(filepath, session):
         utils.create_folder_if_not_exists(trace_folder_on_device)
         click.echo(f'Push {filepath} to {trace_folder_on_device}')
         utils.adb_push(filepath, trace_folder_on_device)
+        _push_frame_index(filepath, settings)
         return
 
     if not session.force_overwrite():
@@ -48,6 +70,7 @@ def _push_trace_file(filepath, session):
     click.echo(f'Push {filepath} to {trace_folder_on_device}')
     utils.adb_push(filepath, trace_folder_on_device)
     utils.adb_exec(f'shell rm {dst_bak_path_on_device}')    # Remove old backup file.
+    _push_frame_index(filepath, settings)
 
 
 @click.command()
@@ -66,4 +89,6 @@ def push(src_path, force):
 
     root, _, files = next(os.walk(src_path))
     for path in files:
+        if path.endswith(gfxr.FRAME_INDEX_EXT):
+            continue    # Frame index is pushed along with its trace.
         _push_trace_file(os.path.join(root, path), session)
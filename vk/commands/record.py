@@ -1,30 +1,144 @@
 import click
+import contextlib
+import json
 import os
+import re
+import threading
+import time
 import vk.config as config
+import vk.session as session
 import vk.utils as utils
 
+from vk.capture import CaptureMonitor
+from vk.logcat import LogcatStream
+from vk.pipeline import ArtifactPipeline, index_trace, store_artifact
+from vk.sampler import DeviceSampler
+from vk.session import LayerSession
 
-class RecordSession:
 
-    def __init__(self, app_name):
+_CAPTURE_FRAMES = (session.PROP, 'debug.gfxrecon.capture_frames')
+_CAPTURE_TRIGGER = (session.PROP, 'debug.gfxrecon.capture_android_trigger')
+# Ex. "100-150" or "10,100-150", frame ranges are inclusive.
+_FRAME_RANGES_PATTERN = re.compile(r'^\d+(-\d+)?(,\d+(-\d+)?)*$')
+# Wait for the layer to finish the segment at next frame after trigger is turned off.
+_TRIGGER_STOP_DELAY = 1.0
+
+
+class RecordSession(LayerSession):
+    """Enable gfxreconstruct layer for app, capture option properties are restored on exit as well."""
+
+    def __init__(self, app_name, capture_options=None):
+        self.capture_options = dict(capture_options or {})
+        option_names = list(config.CAPTURE_OPTIONS) + [x for x in self.capture_options if x not in config.CAPTURE_OPTIONS]
+        self.option_keys = {x: (session.PROP, config.get_capture_option_prop_name(x)) for x in option_names}
+        super().__init__(extra_keys=[_CAPTURE_FRAMES, _CAPTURE_TRIGGER] + list(self.option_keys.values()))
         self.app_name = app_name
 
     def __enter__(self):
-        self.old_global_layers = utils.get_debug_vulkan_layers()
-        self.old_app_name = utils.get_gpu_debug_app()
-        self.old_app_layers = utils.get_gpu_debug_layers()
-        self.old_enable_app_layers = utils.get_enable_gpu_debug_layers()
+        super().__enter__()
+        self.enable_layers(self.app_name, ['VK_LAYER_LUNARG_gfxreconstruct'])
+        return self
+
+    def configure_capture(self, frames=None, trigger=False):
+        """Set capture options, and capture frame ranges or wait for capture trigger if trigger is set.
+
+        Options not in capture_options are reset to defaults of the layer, and the whole run is
+        captured by default.
+        """
+        states = {key: self.capture_options.get(name, '') for name, key in self.option_keys.items()}
+        states[_CAPTURE_FRAMES] = frames or ''
+        states[_CAPTURE_TRIGGER] = 'false' if trigger else ''
+        self.set_states(states)
+
+    def set_capture_trigger(self, enable):
+        self.set_states({_CAPTURE_TRIGGER: 'true' if enable else 'false'})
+
+
+def get_trace_prefix(settings, filename):
+    return os.path.splitext(os.path.basename(settings.resolve_trace_path_on_device(filename)))[0]
+
+
+def list_capture_files(settings, filename):
+    """List trace files of filename on device, including trimmed ones suffixed with frame ranges."""
+    prefix = get_trace_prefix(settings, filename)
+    filenames = utils.list_dir(settings.get_trace_folder_on_device()).split()
+    return sorted(x for x in filenames if x == f'{prefix}.gfxr' or (x.startswith(f'{prefix}_') and x.endswith('.gfxr')))
+
+
+def remove_old_segments(settings, filename):
+    """Remove trimmed traces of filename left by previous recordings after confirmation.
+
+    Segment names only depend on frame ranges, thus new segments would overwrite old ones of the
+    same names, and they could not be told apart from old ones.
+
+    Raises:
+        Abort: If user keeps the old segments.
+    """
+    prefix = get_trace_prefix(settings, filename)
+    segment_names = [x for x in list_capture_files(settings, filename) if x != f'{prefix}.gfxr']
+    if not segment_names:
+        return
+
+    click.echo('\n'.join(f'  {x}' for x in segment_names))
+    if not click.confirm(f'Delete {len(segment_names)} existing trace segments of {filename}?'):
+        raise click.Abort
+
+    trace_folder = settings.get_trace_folder_on_device()
+    utils.adb_exec('shell rm -f ' + ' '.join(f'{trace_folder}/{x}' for x in segment_names))
 
-        utils.enable_gpu_debug_layers(True)
-        utils.set_debug_vulkan_layers(None)
-        utils.set_gpu_debug_app(self.app_name)
-        utils.set_gpu_debug_layers(['VK_LAYER_LUNARG_gfxreconstruct'])
 
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        utils.set_debug_vulkan_layers(self.old_global_layers)
-        utils.enable_gpu_debug_layers(self.old_enable_app_layers)
-        utils.set_gpu_debug_app(self.old_app_name)
-        utils.set_gpu_debug_layers(self.old_app_layers)
+def write_capture_options(filepath, app_name, profile_name, capture_options, frames, trigger, trace_paths):
+    """Write capture options used by a recording to JSON file."""
+    folder_path = os.path.dirname(filepath)
+    if folder_path and not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+
+    data = {
+        'app': app_name,
+        'profile': profile_name,
+        'options': {config.get_capture_option_prop_name(k): v for k, v in capture_options.items()},
+        'frames': frames,
+        'trigger': trigger,
+        'traces': trace_paths,
+    }
+    with open(filepath, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def _run_capture_trigger(rec, app_name):
+    """Toggle capture trigger by hotkey until app exits or user quits."""
+    click.echo('Press [t] to start/stop capturing a segment, [q] to stop app.')
+    exit_event = threading.Event()
+
+    def wait_app_exit():
+        utils.wait_until_app_exit(app_name)
+        exit_event.set()
+        click.echo(f'{app_name} exited, press any key to continue.')
+
+    threading.Thread(target=wait_app_exit, daemon=True).start()
+
+    is_capturing = False
+    segment_count = 0
+    while not exit_event.is_set():
+        key = click.getchar().lower()
+        if exit_event.is_set() or key == 'q':
+            break
+        if key != 't':
+            continue
+
+        is_capturing = not is_capturing
+        rec.set_capture_trigger(is_capturing)
+        if is_capturing:
+            segment_count += 1
+            click.echo(f'Capturing segment {segment_count}...')
+        else:
+            click.echo(f'Stop capturing segment {segment_count}')
+
+    if not exit_event.is_set():
+        if is_capturing:
+            rec.set_capture_trigger(False)
+            time.sleep(_TRIGGER_STOP_DELAY)
+        utils.stop_app(app_name)
 
 
 @click.command()
@@ -32,10 +146,32 @@ class RecordSession:
 @click.option('-f', '--filename', default='capture.gfxr', metavar='<trace_name>', help='Set trace name.')
 @click.option('--pull', 'pull_folder', type=click.Path(), metavar='<local_folder>',
               help='Pull output files from device to <local_folder>.')
+@click.option('--no-store', 'no_store', is_flag=True,
+              help='Copy pulled files directly instead of linking them from local content-addressed store.')
 @click.option('--log', 'enable_log', is_flag=True, default=False, help='Write log messages.')
-def record(app_name, filename, enable_log, pull_folder):
+@click.option('--frames', type=str, metavar='<ranges>',
+              help='Only capture frame ranges like "100-150" or "10,100-150", each range is written to its own trace.')
+@click.option('--trigger', is_flag=True,
+              help='Capture segments toggled by hotkey while app is running, each is written to its own trace.')
+@click.option('--profile', 'profile_name', type=str, default='default', metavar='<name>',
+              help='Capture profile of compression, memory tracking and file flush options (see `vk capture-profile -l`).')
+@click.option('--max-size', type=click.IntRange(min=1), metavar='<MB>',
+              help='Warn (or stop app with --stop-on-limit) if trace size exceeds <MB>.')
+@click.option('--min-free', type=click.IntRange(min=0), default=1024, metavar='<MB>',
+              help='Warn (or stop app with --stop-on-limit) if free space of trace folder drops below <MB>.')
+@click.option('--stop-on-limit', is_flag=True, help='Stop app when --max-size or --min-free is crossed.')
+@click.option('--sample', 'sample_interval', type=click.FloatRange(min=0.1), metavar='<seconds>',
+              help='Sample device temperature, clocks and battery current every <seconds> during recording.')
+@click.option('--logcat', 'logcat_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Stream logs of app and layers to <path>.')
+@click.option('--logcat-tee', is_flag=True, help='Print streamed logs to console as well.')
+def record(app_name, filename, enable_log, frames, trigger, profile_name, pull_folder, no_store, max_size, min_free,
+           stop_on_limit, sample_interval, logcat_filepath, logcat_tee):
     """Record API trace of APP_NAME.
 
+    While recording, trace size, write rate and free space of device are shown and written to
+    <trace_name>_<time>.capture.csv in output folder.
+
     \b
     APP_NAME could be set to:
         ? Select entity from prompt menu later
@@ -49,7 +185,42 @@ def record(app_name, filename, enable_log, pull_folder):
     \b
     >> Example 2: Launch app from selection, and then record a trace as test.gfxr.
     $ vk record -f test.gfxr ?
+
+    \b
+    >> Example 3: Record com.foo.bar and sample device states every second to ./output/com.foo.bar.
+    $ vk record -f test.gfxr --sample 1 com.foo.bar
+
+    \b
+    >> Example 4: Record com.foo.bar and print logs of app and gfxreconstruct layer.
+    $ vk record -f test.gfxr --logcat-tee com.foo.bar
+
+    \b
+    >> Example 5: Record frames 100-150 of com.foo.bar to test_frames_100_through_150.gfxr.
+    $ vk record -f test.gfxr --frames 100-150 com.foo.bar
+
+    \b
+    >> Example 6: Record segments started and stopped by pressing [t] while com.foo.bar is running.
+    $ vk record -f test.gfxr --trigger --pull ./traces com.foo.bar
+
+    \b
+    >> Example 7: Record com.foo.bar with LZ4 compression and no file flush to reduce overhead.
+    $ vk record -f test.gfxr --profile fast com.foo.bar
+
+    \b
+    >> Example 8: Record com.foo.bar, and stop it once trace exceeds 4GB or free space drops below 2GB.
+    $ vk record -f test.gfxr --max-size 4096 --min-free 2048 --stop-on-limit com.foo.bar
     """
+    if frames and trigger:
+        raise click.UsageError('--frames and --trigger are mutually exclusive.')
+    if frames and not _FRAME_RANGES_PATTERN.match(frames):
+        raise click.BadParameter(f'incorrect format {frames}, should be like "100-150" or "10,100-150"',
+                                 param_hint='--frames')
+    if frames:
+        utils.check_prop_value(_CAPTURE_FRAMES[1], frames)
+
+    capture_options = config.Settings().get_capture_profile(profile_name)
+    config.check_capture_options(capture_options)
+
     app_name = config.get_valid_app_name(app_name)
     settings = config.GfxrConfigSettings(app_name)
     utils.stop_app(app_name)
@@ -58,23 +229,123 @@ def record(app_name, filename, enable_log, pull_folder):
     if not filename.endswith('gfxr'):
         filename = f'{filename}.gfxr'
 
-    with RecordSession(app_name) as rec:
+    time_str = utils.get_time_str()
+    output_folder = pull_folder or f'./output/{app_name}'
+    if logcat_tee and not logcat_filepath:
+        logcat_filepath = os.path.join(output_folder, f'logcat_{time_str}.txt')
+
+    if frames or trigger:
+        remove_old_segments(settings, filename)
+
+    with RecordSession(app_name, capture_options) as rec, contextlib.ExitStack() as monitors:
         settings.set_capture_options(filename, enable_log=enable_log)
+        rec.configure_capture(frames, trigger)
+
+        logcat = None
+        if logcat_filepath:
+            logcat = monitors.enter_context(LogcatStream(logcat_filepath, tee=logcat_tee, hold_until_watch=True))
 
         click.echo(f'Start recording {app_name}...')
         utils.create_folder_if_not_exists(settings.get_trace_folder_on_device())
+        old_trace_filenames = set(list_capture_files(settings, filename))
         utils.start_app(app_name)
         utils.wait_until_app_launch(app_name)
-        utils.wait_until_app_exit(app_name)
 
-    click.echo('Finish recording {}'.format(settings.trace_path))
+        if logcat:
+            logcat.watch_app(app_name)
+        if sample_interval:
+            monitors.enter_context(DeviceSampler(output_folder, sample_interval))
+
+        trace_prefix = get_trace_prefix(settings, filename)
+        csv_filepath = os.path.join(output_folder, f'{os.path.splitext(filename)[0]}_{time_str}.capture.csv')
+        monitors.enter_context(CaptureMonitor(app_name, settings.get_trace_folder_on_device(), trace_prefix,
+                                              csv_filepath, max_size=max_size and max_size << 20,
+                                              min_free=min_free << 20, stop_on_limit=stop_on_limit,
+                                              include_segments=bool(frames or trigger),
+                                              show_progress=not logcat_tee))
+
+        if trigger:
+            _run_capture_trigger(rec, app_name)
+        else:
+            utils.wait_until_app_exit(app_name)
+
+    trace_paths = [settings.trace_path]
+    if frames or trigger:
+        # Trimmed traces are suffixed with frame ranges by the layer, ex. test_frames_100_through_150.gfxr.
+        trace_folder = settings.get_trace_folder_on_device()
+        trace_paths = [f'{trace_folder}/{x}' for x in list_capture_files(settings, filename)
+                       if x not in old_trace_filenames]
+        if not trace_paths:
+            utils.log_warning('No trace segment is captured.')
+
+    for trace_path in trace_paths:
+        click.echo('Finish recording {}'.format(trace_path))
+
+    options_filepath = os.path.join(output_folder, f'{os.path.splitext(filename)[0]}_{time_str}.options.json')
+    write_capture_options(options_filepath, app_name, profile_name, capture_options, frames, trigger, trace_paths)
 
     if pull_folder:
-        if not os.path.exists(pull_folder):
-            os.makedirs(pull_folder)
+        # Traces are kept on device for replay, and stored on host for de-duplication of later pulls.
+        steps = [index_trace] if no_store else [index_trace, store_artifact]
+        with ArtifactPipeline() as pipeline:
+            for trace_path in trace_paths:
+                pipeline.submit(trace_path, os.path.join(pull_folder, os.path.basename(trace_path)), steps=steps,
+                                remove=False)
+            if enable_log:
+                pipeline.submit(settings.log_path, os.path.join(pull_folder, os.path.basename(settings.log_path)),
+                                remove=False)
+
+        click.echo(f'Finish copying output files to host: "{pull_folder}"')
+
+
+@click.command()
+@click.argument('profile_name', type=str, required=False)
+@click.option('-o', '--option', 'options', type=str, multiple=True, metavar='<name=value>',
+              help='Set capture option of profile, ex. capture_compression_type=LZ4.')
+@click.option('--delete', is_flag=True, help='Delete user profile.')
+@click.option('-l', '--list', 'show_profiles', is_flag=True, help='List capture profiles.')
+def capture_profile(profile_name, options, delete, show_profiles):
+    """Customize capture profiles of `vk record --profile`.
+
+    Options of a profile are set to debug.gfxrecon.<name> properties while recording, the other
+    options of CAPTURE_OPTIONS are reset to defaults of the layer. Built-in profiles could be
+    overridden by user profiles with the same name.
+
+    \b
+    >> Example 1: List capture profiles and their options.
+    $ vk capture-profile -l
+
+    \b
+    >> Example 2: Save profile "lz4" with LZ4 compression and assisted memory tracking.
+    $ vk capture-profile lz4 -o capture_compression_type=LZ4 -o memory_tracking_mode=assisted
+
+    \b
+    >> Example 3: Delete profile "lz4".
+    $ vk capture-profile lz4 --delete
+    """
+    settings = config.Settings()
+
+    if show_profiles or not profile_name:
+        for name, profile_options in settings.get_capture_profiles().items():
+            option_text = ', '.join(f'{k}={v}' for k, v in profile_options.items()) or '(layer defaults)'
+            click.echo(f'{name: <12}  {option_text}')
+        return
+
+    if delete:
+        settings.delete_capture_profile(profile_name)
+        click.echo(f'Delete capture profile \'{profile_name}\' successfully.')
+        return
+
+    if not options:
+        click.echo(json.dumps(settings.get_capture_profile(profile_name), indent=2))
+        return
 
-        utils.adb_pull(settings.trace_path, pull_folder)
-        if enable_log:
-            utils.adb_pull(settings.log_path, pull_folder)
+    profile_options = {}
+    for option in options:
+        name, sep, value = option.partition('=')
+        if not sep:
+            raise click.BadParameter(f'incorrect format {option}, should be <name>=<value>', param_hint='--option')
+        profile_options[name.strip()] = value.strip()
 
-        click.echo(f'Finish copying output files to host: "{pull_folder}"')
\ No newline at end of file
+    settings.set_capture_profile(profile_name, profile_options)
+    click.echo(f'Save capture profile \'{profile_name}\' successfully.')
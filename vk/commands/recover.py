@@ -0,0 +1,26 @@
+import click
+import vk.session as session
+
+
+@click.command()
+def recover():
+    """Restore device states left by unfinished sessions.
+
+    Commands changing device states (ex. record, validate, dump-api and replay --bench-mode) keep a
+    journal of original states on host until they exit. If vkcli is killed, run this command to
+    restore the states, so debug layers don't slow down other Vulkan apps on device. It also
+    restores states kept by `vk prepare --bench`.
+
+    \b
+    >> Example 1: Restore device states after `vk validate` is killed.
+    $ vk recover
+    """
+    journals = session.recover()
+    if not journals:
+        click.echo('No unfinished session is found for the device.')
+        return
+
+    for journal in journals:
+        click.echo(f'Restored device states left by `{" ".join(journal["command"])}` at {journal["time"]}:')
+        for (kind, name), value in journal['states'].items():
+            click.echo(f'  {kind:<8} {name} = {value!r}')
@@ -1,8 +1,159 @@
 import click
+import contextlib
+import functools
 import os
+import re
 import vk.config as config
+import vk.gfxr as gfxr
 import vk.utils as utils
 
+from vk.benchmode import BenchModeSession
+from vk.commands.imgdiff import check_images
+from vk.frametimes import FrameTimeCollector
+from vk.logcat import LogcatStream
+from vk.pipeline import ArtifactPipeline, FolderStreamer, store_artifact
+from vk.sampler import DeviceSampler
+
+REPLAYER_NAME = 'com.lunarg.gfxreconstruct.replay'
+_REPLAYER_ACTIVITY = f'{REPLAYER_NAME}/android.app.NativeActivity'
+
+
+def _get_frame_count_on_device(settings, trace_path):
+    """Return frame count recorded in the frame index on device.
+
+    Returns:
+        Frame count, or None if the frame index is missing or stale.
+    """
+    index_path = settings.get_frame_index_path_on_device(os.path.basename(trace_path))
+    if not utils.check_file_existence(index_path):
+        return None
+
+    try:
+        index = gfxr.FrameIndex.from_bytes(utils.adb_exec_out(f'cat {index_path}'))
+    except (RuntimeError, gfxr.GfxrFormatError) as e:
+        utils.log_warning(f'Can not load frame index {index_path}: {e}')
+        return None
+
+    if index.source_size != utils.get_file_size(trace_path):
+        utils.log_warning(f'Frame index {index_path} is stale, skip frame range check.')
+        return None
+
+    return index.frame_count
+
+
+def resolve_trace(trace_name):
+    """Resolve TRACE_NAME argument of replay to trace file on device.
+
+    Args:
+        trace_name: ?, !, $, package name or trace file name.
+
+    Returns:
+        Tuple of (app_name, trace_name, trace_path, settings).
+
+    Raises:
+        BadParameter: If the trace does not exist on device.
+    """
+    if trace_name in ['?', '!']:
+        app_name = config.get_valid_app_name(trace_name)
+        trace_name = app_name
+    else:
+        if trace_name == '$':
+            trace_name = config.get_last_trace_name()
+        app_name = utils.extract_package_name(trace_name)
+
+    settings = config.GfxrConfigSettings(app_name)
+    if trace_name == app_name:
+        # Select from list files.
+        trace_list = utils.list_dir(settings.get_trace_folder_on_device())
+        trace_name = utils.get_selected_item(trace_list, \
+            'Available traces:', 'Please choose a trace (ctrl+c to abort)')
+
+    capture_tag = settings.extract_trace_capture_tag(trace_name)
+    trace_path = settings.resolve_trace_path_on_device(capture_tag)
+    if not utils.check_file_existence(trace_path):
+        raise click.BadParameter('{} does not exist!'.format(trace_path))
+
+    config.set_last_trace_name(trace_name)
+    return app_name, trace_name, trace_path, settings
+
+
+def check_trace_frame_ranges(settings, trace_path, pause_frame=None, measure_frame_range=None,
+                             screenshots_range=None):
+    """Check frame options against frame index of trace on device if it's available.
+
+    Raises:
+        BadParameter: If any frame is out of range.
+    """
+    frame_count = _get_frame_count_on_device(settings, trace_path)
+    if frame_count is not None:
+        click.echo(f'Trace has {frame_count} frames')
+        _check_frame_ranges(frame_count, pause_frame, measure_frame_range, screenshots_range)
+    elif utils.is_verbose():
+        click.echo('Frame index is not found on device, skip frame range check.')
+
+
+@functools.cache
+def _grant_replayer_permission():
+    # Grant MANAGE_EXTERNAL_STORAGE permission for replay apk once per command.
+    utils.adb_exec(f'shell appops set {REPLAYER_NAME} MANAGE_EXTERNAL_STORAGE allow')
+
+
+def start_replayer(args):
+    """Launch replayer with argument list and wait until it's launched.
+
+    Returns:
+        True if the replayer is launched successfully.
+    """
+    _grant_replayer_permission()
+    utils.stop_app(REPLAYER_NAME)
+
+    extras = "--es 'args' '{}'".format(' '.join(args))
+    result = utils.start_app_activity(_REPLAYER_ACTIVITY, extras)
+
+    if 'Error:' in result:
+        click.echo(result)
+        return False
+
+    utils.wait_until_app_launch(REPLAYER_NAME)
+    return True
+
+
+def get_measurement_args(measure_frame_range, fps_file_on_device, quit_after_measurement_range=False,
+                         flush_measurement_range=False, flush_inside_measurement_range=False):
+    """Return replayer arguments of FPS measurement."""
+    args = [f'--mfr {measure_frame_range}', f'--measurement-file {fps_file_on_device}']
+    if quit_after_measurement_range:
+        args.append('--quit-after-measurement-range')
+    if flush_measurement_range:
+        args.append('--flush-measurement-range')
+    if flush_inside_measurement_range:
+        args.append('--flush-inside-measurement-range')
+    return args
+
+
+def _get_last_frame(range_str):
+    """Return the last frame number in range string like '5-10' or '1,5-10'."""
+    frames = [int(x) for x in re.findall(r'\d+', range_str)]
+    return max(frames) if frames else 0
+
+
+def _check_frame_ranges(frame_count, pause_frame, measure_frame_range, screenshots_range):
+    """Check frame options against frame count of trace.
+
+    Raises:
+        BadParameter: If any frame is out of range.
+    """
+    checks = [
+        ('--pause-frame', pause_frame if pause_frame else 0),
+        ('--measure-frame-range', _get_last_frame(measure_frame_range) if measure_frame_range else 0),
+        ('--screenshots', _get_last_frame(screenshots_range) if screenshots_range and screenshots_range != 'all' else 0),
+    ]
+
+    for option_name, last_frame in checks:
+        if last_frame > frame_count:
+            raise click.BadParameter(f'frame {last_frame} exceeds frame count {frame_count} of trace',
+                                     param_hint=option_name)
+
 
 @click.command()
 @click.argument('trace_name', type=str, default='?')
@@ -18,6 +169,10 @@ import vk.utils as utils
               help='Prefix to screenshot file names.')
 @click.option('-ssf', '--screenshot-format', type=click.Choice(['bmp', 'png'], case_sensitive=False),
               default='png', help='Image file format of screenshots.')
+@click.option('--stream-screenshots', is_flag=True,
+              help='Pull screenshots during replay and remove them on device, so device storage stays bounded.')
+@click.option('--golden', 'golden_folder', type=click.Path(exists=True, file_okay=False), metavar='<dir>',
+              help='Compare screenshots against golden images in <dir> like `vk imgdiff`, exit 1 if any fails.')
 @click.option('-sfa', '--skip-failed-allocations', is_flag=True,
               help='Skip failed allocations during capture.')
 @click.option('-opc', '--omit-pipeline-cache', is_flag=True,
@@ -34,9 +189,21 @@ import vk.utils as utils
               help='Flush and wait for GPU to finish works at the end of each frame in the measurement range.')
 @click.option('--pull', 'pull_folder', type=click.Path(), metavar='<local_folder>',
               help='Pull output files from device to <local_folder>.')
+@click.option('--no-store', 'no_store', is_flag=True,
+              help='Copy pulled files directly instead of linking them from local content-addressed store.')
+@click.option('--sample', 'sample_interval', type=click.FloatRange(min=0.1), metavar='<seconds>',
+              help='Sample device temperature, clocks and battery current every <seconds> during replay.')
+@click.option('--frametimes', 'collect_frame_times', is_flag=True,
+              help='Collect per-frame present times from SurfaceFlinger and analyze janks (requires numpy).')
+@click.option('--logcat', 'logcat_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Stream logs of replayer and layers to <path>.')
+@click.option('--logcat-tee', is_flag=True, help='Print streamed logs to console as well.')
+@click.option('--bench-mode', is_flag=True,
+              help='Replay in benchmark mode of `vk prepare --bench` after device cools down below 40C.')
 def replay(trace_name, pause_frame, surface_index, screenshots_range, screenshot_scale, screenshot_prefix,
-        screenshot_format, skip_failed_allocations, omit_pipeline_cache, remove_unsupported, measure_frame_range,
-        quit_after_measurement_range, flush_measurement_range, flush_inside_measurement_range, pull_folder):
+        screenshot_format, stream_screenshots, golden_folder, skip_failed_allocations, omit_pipeline_cache, remove_unsupported,
+        measure_frame_range, quit_after_measurement_range, flush_measurement_range, flush_inside_measurement_range,
+        pull_folder, no_store, sample_interval, collect_frame_times, logcat_filepath, logcat_tee, bench_mode):
     """Replay TRACE_NAME on device.
 
     \b
@@ -70,36 +237,37 @@ def replay(trace_name, pause_frame, surface_index, screenshots_range, screenshot
     \b
     >> Example 6: Replay trace and dump thumbnails of all screenshots to local folder.
     $ vk replay com.foo.bar-test.gfxr -ss all -sss 0.1
-    """
 
-    # Grant MANAGE_EXTERNAL_STORAGE permission for replay apk.
-    utils.adb_exec('shell appops set com.lunarg.gfxreconstruct.replay MANAGE_EXTERNAL_STORAGE allow')
+    \b
+    >> Example 7: Measure FPS and check whether GPU/CPU is throttled by sampling device every 0.5s.
+    $ vk replay com.foo.bar-test.gfxr -mfr 5-50 --sample 0.5
 
-    replayer_name = 'com.lunarg.gfxreconstruct.replay'
-    replayer_activity = f'{replayer_name}/android.app.NativeActivity'
-    utils.stop_app(replayer_name)
+    \b
+    >> Example 8: Replay trace and analyze frame time percentiles and janks.
+    $ vk replay com.foo.bar-test.gfxr --frametimes
 
-    if trace_name in ['?', '!']:
-        app_name = config.get_valid_app_name(trace_name)
-        trace_name = app_name
-    else:
-        if trace_name == '$':
-            trace_name = config.get_last_trace_name()
-        app_name = utils.extract_package_name(trace_name)
+    \b
+    >> Example 9: Measure FPS with pinned clocks and no animations, then restore device states.
+    $ vk replay com.foo.bar-test.gfxr -mfr 5-50 --bench-mode
 
-    settings = config.GfxrConfigSettings(app_name)
-    if trace_name == app_name:
-        # Select from list files.
-        trace_list = utils.list_dir(settings.get_trace_folder_on_device())
-        trace_name = utils.get_selected_item(trace_list, \
-            'Available traces:', 'Please choose a trace (ctrl+c to abort)')
+    \b
+    >> Example 10: Dump screenshots of all frames and pull each of them while replaying.
+    $ vk replay com.foo.bar-test.gfxr -ss all --stream-screenshots
 
-    capture_tag = settings.extract_trace_capture_tag(trace_name)
-    trace_path = settings.resolve_trace_path_on_device(capture_tag)
-    if not utils.check_file_existence(trace_path):
-        raise click.BadParameter('{} does not exist!'.format(trace_path))
+    \b
+    >> Example 11: Check screenshots of frames 100-200 against golden images.
+    $ vk replay com.foo.bar-test.gfxr -ss 100-200 --golden golden/com.foo.bar-test
+    """
 
-    config.set_last_trace_name(trace_name)
+    if golden_folder and not screenshots_range:
+        raise click.UsageError('--golden requires --screenshots')
+    if golden_folder:
+        # Fail before replaying when numpy is missing.
+        utils.import_optional_module('numpy')
+
+    utils.stop_app(REPLAYER_NAME)
+    app_name, trace_name, trace_path, settings = resolve_trace(trace_name)
+    check_trace_frame_ranges(settings, trace_path, pause_frame, measure_frame_range, screenshots_range)
 
     args = []
     if pause_frame:
@@ -129,43 +297,67 @@ def replay(trace_name, pause_frame, surface_index, screenshots_range, screenshot
 
     fps_file_on_device = None
     if measure_frame_range:
-        args.append(f'--mfr {measure_frame_range}')
         fps_file_on_device = settings.get_temp_filepath_on_device('gfxr_fps', '.json')
-        args.append(f'--measurement-file {fps_file_on_device}')
-        if quit_after_measurement_range:
-            args.append('--quit-after-measurement-range')
-        if flush_measurement_range:
-            args.append('--flush-measurement-range')
-        if flush_inside_measurement_range:
-            args.append('--flush-inside-measurement-range')
+        args += get_measurement_args(measure_frame_range, fps_file_on_device, quit_after_measurement_range,
+                                     flush_measurement_range, flush_inside_measurement_range)
 
     args.append(trace_path)
-    extras = "--es 'args' '{}'".format(' '.join(args))
-    result = utils.start_app_activity(replayer_activity, extras)
+    if not pull_folder:
+        pull_folder = f'./output/{app_name}/{trace_name}'
 
-    if 'Error:' in result:
-        click.echo(result)
-        return
+    if logcat_tee and not logcat_filepath:
+        logcat_filepath = os.path.join(pull_folder, f'logcat_{utils.get_time_str()}.txt')
+
+    # Screenshots of deterministic replays are often identical, store them once.
+    screenshot_steps = [] if no_store else [store_artifact]
+    streamer = None
+    with contextlib.ExitStack() as monitors:
+        # Pipeline is entered first, thus pending pulls are finished after other monitors exit.
+        pipeline = monitors.enter_context(ArtifactPipeline())
+        if bench_mode:
+            monitors.enter_context(BenchModeSession(max_temp=40.0))
+
+        logcat = None
+        if logcat_filepath:
+            logcat = monitors.enter_context(LogcatStream(logcat_filepath, tee=logcat_tee, hold_until_watch=True))
+        if sample_interval:
+            monitors.enter_context(DeviceSampler(pull_folder, sample_interval))
 
-    utils.wait_until_app_launch(replayer_name)
+        if not start_replayer(args):
+            return
 
-    if screenshots_range or measure_frame_range:
-        utils.wait_until_app_exit(replayer_name)
+        if logcat:
+            logcat.watch_app(REPLAYER_NAME)
+        if collect_frame_times:
+            monitors.enter_context(FrameTimeCollector(REPLAYER_NAME, pull_folder))
 
-        if not pull_folder:
-            pull_folder = f'./output/{app_name}/{trace_name}'
+        local_screenshot_folder = os.path.join(pull_folder, os.path.basename(device_screenshot_folder)) \
+            if screenshots_range else None
+        if screenshots_range and stream_screenshots:
+            click.echo(f'Pull screenshots to {local_screenshot_folder} during replay')
+            streamer = monitors.enter_context(FolderStreamer(pipeline, device_screenshot_folder,
+                                                             local_screenshot_folder, steps=screenshot_steps))
+        if bench_mode or logcat or sample_interval or collect_frame_times or streamer:
+            utils.wait_until_app_exit(REPLAYER_NAME)
 
-        if not os.path.exists(pull_folder):
-            os.makedirs(pull_folder)
+        if screenshots_range or measure_frame_range:
+            utils.wait_until_app_exit(REPLAYER_NAME)
 
-        if screenshots_range:
-            click.echo(f'Pull screenshots to {pull_folder}')
-            utils.adb_pull(device_screenshot_folder, pull_folder)
+            if screenshots_range and not streamer:
+                click.echo(f'Pull screenshots to {pull_folder}')
+                pipeline.submit(device_screenshot_folder, local_screenshot_folder, is_folder=True,
+                                steps=screenshot_steps)
+            if measure_frame_range:
+                filename = os.path.basename(fps_file_on_device)
+                local_filepath = os.path.join(pull_folder, filename)
+                click.echo(f'Pull FPS measurement file to {local_filepath}')
+                pipeline.submit(fps_file_on_device, local_filepath)
+
+    if streamer:
+        if streamer.get_failed_paths():
+            utils.log_warning(f'Failed screenshots are kept in {device_screenshot_folder} on device.')
+        else:
             utils.delete_dir(device_screenshot_folder)
-        if measure_frame_range:
-            filename = os.path.basename(fps_file_on_device)
-            local_filepath = os.path.join(pull_folder, filename)
-            click.echo(f'Pull FPS measurement file to {local_filepath}')
-            utils.adb_pull(fps_file_on_device, local_filepath)
-            utils.adb_exec(f'shell rm {fps_file_on_device}')
 
+    if golden_folder and check_images(local_screenshot_folder, golden_folder):
+        click.get_current_context().exit(1)
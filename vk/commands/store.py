@@ -0,0 +1,44 @@
+import click
+import os
+import vk.config as config
+import vk.utils as utils
+
+from vk.store import get_blob_store
+
+
+@click.command()
+@click.option('--set-folder', 'folder_path', type=click.Path(file_okay=False), metavar='<path>',
+              help='Set store folder, ex. a folder shared by users of build machine.')
+@click.option('--prune', is_flag=True, help='Remove stored files which are no longer linked, except copied or reflinked ones.')
+def store(folder_path, prune):
+    """Manage local content-addressed store of pulled files.
+
+    Files pulled by `pull`, `record --pull` and `replay --pull` are stored once by their SHA-256
+    digest, and linked to the requested destinations.
+
+    \b
+    >> Example 1: Show store folder and its size.
+    $ vk store
+
+    \b
+    >> Example 2: Use a shared store folder.
+    $ vk store --set-folder /data/vkcli_store
+    """
+
+    if folder_path:
+        config.set_store_folder(os.path.abspath(folder_path))
+
+    blob_store = get_blob_store()
+
+    if prune:
+        removed_count, freed_size = blob_store.prune()
+        click.echo(f'Remove {removed_count} unlinked files ({utils.format_size(freed_size)})')
+
+    blob_count = 0
+    total_size = 0
+    for blob_path in blob_store.iter_blob_paths():
+        blob_count += 1
+        total_size += os.path.getsize(blob_path)
+
+    click.echo(f'Store folder: {blob_store.root_folder}')
+    click.echo(f'Stored files: {blob_count} ({utils.format_size(total_size)})')
@@ -0,0 +1,118 @@
+import click
+import json
+import os
+import vk.gfxr as gfxr
+import vk.utils as utils
+
+
+def show_trace_summary(filepath: str, top_n: int = 10) -> None:
+    """Print summary of a trace file on host.
+
+    Args:
+        filepath: Path to .gfxr file.
+        top_n: Number of the most frequent API calls to show.
+
+    Raises:
+        GfxrFormatError: If filepath is not a valid GFXR trace.
+    """
+    summary = gfxr.summarize_trace(filepath)
+
+    click.echo(f'{filepath}:')
+    click.echo(f'  Version:      {summary.version}')
+    click.echo(f'  Compression:  {summary.compression.name}')
+    click.echo(f'  File size:    {utils.format_size(summary.file_size)}')
+    click.echo(f'  Frames:       {summary.frame_count}')
+    click.echo(f'  Blocks:       {summary.block_count}')
+    click.echo(f'  API calls:    {summary.api_call_count}')
+    click.echo(f'  Payload:      {utils.format_size(summary.payload_size)} '
+               f'(compressed: {utils.format_size(summary.compressed_payload_size)} '
+               f'in {summary.compressed_block_count} blocks)')
+    if summary.truncated:
+        utils.log_warning(f'{filepath} ends with a partial block.')
+
+    if top_n and summary.api_call_counts:
+        click.echo(f'  Top {top_n} API calls:')
+        for call_id, count in summary.api_call_counts.most_common(top_n):
+            click.echo(f'    0x{call_id:08x}  {count}')
+
+
+@click.group()
+def trace():
+    """Inspect and convert trace files on host."""
+
+
+@trace.command()
+@click.argument('filepaths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--top', 'top_n', type=int, default=10, metavar='N', help='Show N most frequent API calls.')
+@click.option('--json', 'as_json', is_flag=True, help='Output summary in JSON format.')
+def info(filepaths, top_n, as_json):
+    """Show summary of trace files without replaying them.
+
+    \b
+    >> Example 1: Show frame count, API call count and payload size of test.gfxr.
+    $ vk trace info com.foo.bar-test.gfxr
+
+    \b
+    >> Example 2: Show summaries of all traces in a folder in JSON format.
+    $ vk trace info --json output/com.foo.bar/*.gfxr
+    """
+
+    if as_json:
+        result = [gfxr.summarize_trace(filepath).to_dict() for filepath in filepaths]
+        click.echo(json.dumps(result, indent=2))
+        return
+
+    for filepath in filepaths:
+        show_trace_summary(filepath, top_n)
+
+
+@trace.command()
+@click.argument('filepaths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('-f', '--force', is_flag=True, help='Rebuild frame index even if it is up to date.')
+def index(filepaths, force):
+    """Build frame index sidecar files (*.gfxr.fidx) of traces.
+
+    The frame index stores start offset and block count of each frame. It is pushed along with
+    trace by `vk push`, and is used by `vk replay` to check frame ranges before launching replayer.
+
+    \b
+    >> Example 1: Build frame index of test.gfxr.
+    $ vk trace index com.foo.bar-test.gfxr
+    """
+
+    for filepath in filepaths:
+        frame_index = gfxr.get_frame_index(filepath, rebuild=force)
+        click.echo(f'{gfxr.get_frame_index_filepath(filepath)}: {frame_index.frame_count} frames')
+
+
+@trace.command()
+@click.argument('src_filepath', type=click.Path(exists=True, dir_okay=False))
+@click.option('-c', '--compression', type=click.Choice(['none', 'lz4', 'zlib', 'zstd'], case_sensitive=False),
+              default='zstd', help='Compression type of output trace.')
+@click.option('-o', '--output', 'dst_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Output trace path. Default is <trace_name>.<compression>.gfxr')
+@click.option('-j', '--jobs', type=int, metavar='N', help='Number of worker processes. Default is CPU count.')
+def recompress(src_filepath, compression, dst_filepath, jobs):
+    """Rewrite blocks of trace with another compression type.
+
+    \b
+    >> Example 1: Convert trace to zstd compression as com.foo.bar-test.zstd.gfxr.
+    $ vk trace recompress com.foo.bar-test.gfxr
+
+    \b
+    >> Example 2: Decompress trace in place with 4 worker processes.
+    $ vk trace recompress -c none -o com.foo.bar-test.gfxr -j 4 com.foo.bar-test.gfxr
+    """
+
+    compression = gfxr.CompressionType[compression.upper()]
+    if not dst_filepath:
+        root, ext = os.path.splitext(src_filepath)
+        dst_filepath = f'{root}.{compression.name.lower()}{ext}'
+
+    src_size = os.path.getsize(src_filepath)
+    with click.progressbar(length=src_size, label=f'Recompressing to {compression.name}') as bar:
+        block_count = gfxr.recompress_trace(src_filepath, dst_filepath, compression, jobs, progress=bar.update)
+
+    dst_size = os.path.getsize(dst_filepath)
+    click.echo(f'Write {block_count} blocks to {dst_filepath}')
+    click.echo(f'{utils.format_size(src_size)} => {utils.format_size(dst_size)} ({dst_size / src_size:.1%})')
@@ -1,41 +1,35 @@
 import click
+import contextlib
 import os
 import vk.config as config
+import vk.session as session
 import vk.utils as utils
+import vk.vvl as vvl
+
+from vk.logcat import LogcatStream
+from vk.sampler import DeviceSampler
+from vk.session import LayerSession
 
 _VALIDATION_LAYER_NAME = 'VK_LAYER_KHRONOS_validation'
 _VALIDATION_LAYER_FILE_NAME = 'libVkLayer_khronos_validation.so'
 
-class ValidationSession:
+class ValidationSession(LayerSession):
 
-    _VK_LAYER_ENABLES = 'debug.vvl.enables'
-    _VK_LAYER_DISABLES = 'debug.vvl.disables'
+    _VK_LAYER_ENABLES = (session.PROP, 'debug.vvl.enables')
+    _VK_LAYER_DISABLES = (session.PROP, 'debug.vvl.disables')
 
     def __init__(self, app_name):
+        super().__init__(extra_keys=[self._VK_LAYER_ENABLES, self._VK_LAYER_DISABLES])
         self.app_name = app_name
 
     def __enter__(self):
-        self.old_global_layers = utils.get_debug_vulkan_layers()
-        self.old_app_name = utils.get_gpu_debug_app()
-        self.old_app_layers = utils.get_gpu_debug_layers()
-        self.old_enable_app_layers = utils.get_enable_gpu_debug_layers()
-        self.old_layer_enable_config = utils.adb_getprop(self._VK_LAYER_ENABLES)
-        self.old_layer_disable_config = utils.adb_getprop(self._VK_LAYER_DISABLES)
-
-        utils.enable_gpu_debug_layers(True)
-        utils.set_debug_vulkan_layers(None)
-        utils.set_gpu_debug_app(self.app_name)
-        utils.set_gpu_debug_layers(self.old_app_layers + [_VALIDATION_LAYER_NAME])
+        super().__enter__()
+        app_layers = [_VALIDATION_LAYER_NAME]
+        if self.get_original_app_name() == self.app_name:
+            app_layers = self.get_original_layers(session.GPU_DEBUG_LAYERS) + app_layers
+        self.enable_layers(self.app_name, app_layers)
         return self
 
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        utils.set_debug_vulkan_layers(self.old_global_layers)
-        utils.enable_gpu_debug_layers(self.old_enable_app_layers)
-        utils.set_gpu_debug_app(self.old_app_name)
-        utils.set_gpu_debug_layers(self.old_app_layers)
-        utils.adb_setprop(self._VK_LAYER_ENABLES, self.old_layer_enable_config)
-        utils.adb_setprop(self._VK_LAYER_DISABLES, self.old_layer_disable_config)
-
     def set_validation_flags(self, check_sync, check_bp, not_check_core):
         enable_flags = []
         disable_flags = []
@@ -61,8 +55,10 @@ class ValidationSession:
         # https://github.com/KhronosGroup/Vulkan-ValidationLayers/blob/27a8c7a33ab376acbcba52e0ceb8224a388ca9a7/layers/layer_options.cpp#L41
         #
         # Note: It seems vk_layer_settings.txt not supported on Android yet.
-        utils.adb_setprop(self._VK_LAYER_ENABLES, ':'.join(enable_flags))
-        utils.adb_setprop(self._VK_LAYER_DISABLES, ':'.join(disable_flags))
+        self.set_states({
+            self._VK_LAYER_ENABLES: ':'.join(enable_flags),
+            self._VK_LAYER_DISABLES: ':'.join(disable_flags),
+        })
 
 
 @click.command()
@@ -72,9 +68,24 @@ class ValidationSession:
 @click.option('-cbp', '--check-bp', 'check_bp', is_flag=True, default=False, help='Check Arm best practices')
 @click.option('-nc', '--not-check-core', 'not_check_core', is_flag=True, default=False, help='Check parameter/object usage errors')
 @click.option('-p', 'prompt', is_flag=True, default=False, help='Prompt to launch app manually')
-def validate(app_name, check_sync, check_bp, not_check_core, prompt):
+@click.option('--sample', 'sample_interval', type=click.FloatRange(min=0.1), metavar='<seconds>',
+              help='Sample device temperature, clocks and battery current every <seconds> to ./output/<app_name>.')
+@click.option('--logcat', 'logcat_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Stream logs of app and layers to <path>.')
+@click.option('--logcat-tee', is_flag=True, help='Print streamed logs to console as well.')
+@click.option('--report', 'report_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Validation report (*.json or *.html). Default is ./output/<app_name>/vvl_<time>.json.')
+@click.option('--baseline', 'baseline_filepath', type=click.Path(exists=True, dir_okay=False), metavar='<path>',
+              help='Baseline file of known VUIDs and message patterns. Exit status is 1 if any new error is found.')
+@click.option('--write-baseline', 'output_baseline_filepath', type=click.Path(dir_okay=False), metavar='<path>',
+              help='Write VUIDs found in this run (and patterns of --baseline) to baseline file <path>.')
+def validate(app_name, check_sync, check_bp, not_check_core, prompt, sample_interval, logcat_filepath, logcat_tee,
+             report_filepath, baseline_filepath, output_baseline_filepath):
     """Validate application with validation layers.
 
+    Validation messages are aggregated by VUID and message template while app is running, and
+    written to a report after app exits.
+
     \b
     APP_NAME could be set to:
         ? Select entity from prompt menu later
@@ -97,6 +108,19 @@ def validate(app_name, check_sync, check_bp, not_check_core, prompt):
     >> Example 4: Manually launch and validate com.foo.bar
     $ vk validate --app com.foo.bar -p
 
+    \b
+    >> Example 5: Validate com.foo.bar, write validation messages to vvl.txt and print them.
+    $ vk validate --app com.foo.bar --logcat vvl.txt --logcat-tee
+
+    \b
+    >> Example 6: Validate com.foo.bar and write deduplicated messages to HTML report.
+    $ vk validate --app com.foo.bar --report vvl.html
+
+    \b
+    >> Example 7: Create baseline from current errors, then only fail on new errors in later runs.
+    $ vk validate --app com.foo.bar --write-baseline known.json
+    $ vk validate --app com.foo.bar --baseline known.json
+
     \f
     https://vulkan.lunarg.com/doc/view/latest/windows/khronos_validation_layer.html
     """
@@ -110,9 +134,21 @@ def validate(app_name, check_sync, check_bp, not_check_core, prompt):
 
     utils.stop_app(app_name)
 
-    with ValidationSession(app_name) as vs:
+    time_str = utils.get_time_str()
+    if logcat_tee and not logcat_filepath:
+        logcat_filepath = f'./output/{app_name}/logcat_{time_str}.txt'
+    if not report_filepath:
+        report_filepath = f'./output/{app_name}/vvl_{time_str}.json'
+
+    baseline = vvl.Baseline.load(baseline_filepath) if baseline_filepath else None
+    aggregator = vvl.MessageAggregator(baseline)
+
+    with ValidationSession(app_name) as vs, contextlib.ExitStack() as monitors:
         vs.set_validation_flags(check_sync, check_bp, not_check_core)
 
+        logcat = monitors.enter_context(LogcatStream(logcat_filepath, tee=logcat_tee, hold_until_watch=True))
+        logcat.add_callback(aggregator.add_line)
+
         click.echo(f'Validating {app_name}')
         utils.unlock_device_screen()
 
@@ -124,4 +160,20 @@ def validate(app_name, check_sync, check_bp, not_check_core, prompt):
 
         utils.wait_until_app_launch(app_name)
         click.echo(f'{app_name} is launched')
+
+        logcat.watch_app(app_name)
+        if sample_interval:
+            monitors.enter_context(DeviceSampler(f'./output/{app_name}', sample_interval))
         utils.wait_until_app_exit(app_name)
+
+    aggregator.show_summary()
+    aggregator.write_report(report_filepath)
+    click.echo(f'Validation report is written to {report_filepath}')
+
+    if output_baseline_filepath:
+        vuids = set(x.vuid for x in aggregator.entries.values())
+        (baseline or vvl.Baseline()).save(output_baseline_filepath, vuids)
+        click.echo(f'Baseline of {len(vuids)} VUIDs is written to {output_baseline_filepath}')
+
+    if baseline and aggregator.get_new_entries('Error'):
+        click.get_current_context().exit(1)
@@ -1,9 +1,11 @@
 import click
 import json
 import os
+import re
 
 from pkg_resources import resource_filename
 
+import vk.gfxr as gfxr
 import vk.utils as utils
 
 class Settings:
@@ -24,13 +26,17 @@ class Settings:
                 'app_name': None,
                 'trace_name': None,
                 'layerset': {},
-                'layer_bin_folder': None    # The folder contains layer *.so files on host.
+                'layer_bin_folder': None,   # The folder contains layer *.so files on host.
+                'store_folder': None,       # The folder of content-addressed store on host.
+                'capture_profile': {},      # Capture options of gfxreconstruct layer by profile name.
             }
 
         self.layer_presets = self.data.get('layerset', {})
         self.layer_bin_folder = self.data.get('layer_bin_folder', None)
         self.last_app_name = self.data.get('app_name', None)
         self.last_trace_name = self.data.get('trace_name', None)
+        self.store_folder = self.data.get('store_folder', None)
+        self.capture_profiles = self.data.setdefault('capture_profile', {})
 
     def __store(self):
         with open(self.filepath, 'w') as f:
@@ -63,6 +69,41 @@ class Settings:
         self.data['layer_bin_folder'] = path
         self.__store()
 
+    def get_store_folder(self):
+        if self.store_folder:
+            return self.store_folder
+
+        return os.path.join(os.path.expanduser('~'), '.vkcli', 'store')
+
+    def set_store_folder(self, path: str):
+        self.data['store_folder'] = path
+        self.__store()
+
+    def get_capture_profiles(self):
+        """Return dict of profile name to capture options, user profiles override built-in ones."""
+        profiles = dict(BUILTIN_CAPTURE_PROFILES)
+        profiles.update(self.capture_profiles)
+        return profiles
+
+    def get_capture_profile(self, name: str):
+        profiles = self.get_capture_profiles()
+        if name not in profiles:
+            raise click.BadParameter(f'Cannot find capture profile named "{name}", '
+                                     f'available profiles: {", ".join(profiles)}')
+        return profiles[name]
+
+    def set_capture_profile(self, name: str, options: dict):
+        check_capture_options(options)
+        self.capture_profiles[name] = options
+        self.__store()
+
+    def delete_capture_profile(self, name: str):
+        if name in self.capture_profiles:
+            del self.capture_profiles[name]
+            self.__store()
+        else:
+            raise click.BadParameter(f'Cannot find user capture profile named "{name}"')
+
     def resolve_layer_filepath(self, name: str):
         if not self.layer_bin_folder:
             return name
@@ -111,6 +152,69 @@ class Settings:
                 index_column_spaces = ' ' * 7 if show_indices else ''
                 click.echo(f'{index_column_spaces}{name_col_spaces}  {app_name: <{app_col_width}}  {app_layers_value}')
 
+_BOOL_VALUES = ('true', 'false')
+
+# Capture options of gfxreconstruct layer which affect capture overhead, and their valid values.
+# https://github.com/LunarG/gfxreconstruct/blob/dev/USAGE_android.md#capture-options
+CAPTURE_OPTIONS = {
+    'capture_compression_type': ('NONE', 'LZ4', 'ZLIB', 'ZSTD'),
+    'capture_file_flush': _BOOL_VALUES,
+    'memory_tracking_mode': ('page_guard', 'assisted', 'unassisted'),
+    'page_guard_copy_on_map': _BOOL_VALUES,
+    'page_guard_separate_read': _BOOL_VALUES,
+    'page_guard_persistent_memory': _BOOL_VALUES,
+    'page_guard_align_buffer_sizes': _BOOL_VALUES,
+    'page_guard_external_memory': _BOOL_VALUES,
+}
+
+# Options set by record itself, which can't be overridden by capture profiles.
+RECORD_MANAGED_OPTIONS = ('capture_file', 'capture_file_timestamp', 'capture_frames', 'capture_android_trigger',
+                          'log_file')
+
+BUILTIN_CAPTURE_PROFILES = {
+    # Defaults of the layer.
+    'default': {},
+    # Fast compression without flushing file after each block.
+    'fast': {
+        'capture_compression_type': 'LZ4',
+        'capture_file_flush': 'false',
+        'memory_tracking_mode': 'page_guard',
+    },
+    # Smaller traces at the cost of more CPU time.
+    'small': {'capture_compression_type': 'ZSTD'},
+    # Lowest overhead of memory tracking for apps which flush non-coherent mapped memory correctly.
+    'assisted': {
+        'capture_compression_type': 'LZ4',
+        'memory_tracking_mode': 'assisted',
+    },
+    # Flush file after each block, so trace is usable even if app crashes.
+    'crash': {'capture_file_flush': 'true'},
+}
+
+
+def get_capture_option_prop_name(name):
+    return f'debug.gfxrecon.{name}'
+
+
+def check_capture_options(options):
+    """Check capture options of profile.
+
+    Raises:
+        BadParameter: If an option is managed by record, has an invalid value, or its value exceeds
+            property length limit.
+    """
+    for name, value in options.items():
+        if not re.match(r'^[a-z0-9_]+$', name):
+            raise click.BadParameter(f'Invalid capture option name "{name}"')
+        if name in RECORD_MANAGED_OPTIONS:
+            raise click.BadParameter(f'Capture option {name} is set by record, it can not be set in profile')
+
+        valid_values = CAPTURE_OPTIONS.get(name)
+        if valid_values and value not in valid_values:
+            raise click.BadParameter(f'Invalid value "{value}" of {name}, should be one of {", ".join(valid_values)}')
+        utils.check_prop_value(get_capture_option_prop_name(name), value)
+
+
 class GfxrConfigSettings:
 
     root_trace_folder = '/sdcard/vk_trace_repo'
@@ -141,6 +245,10 @@ class GfxrConfigSettings:
     def get_trace_folder_on_device(self):
         return self.trace_folder
 
+    def get_frame_index_path_on_device(self, trace_name):
+        # Prefix '.' to hide index files from trace lists.
+        return f'{self.trace_folder}/.{trace_name}{gfxr.FRAME_INDEX_EXT}'
+
     def extract_trace_capture_tag(self, filepath):
         """Extract capture tag from trace name.
 
@@ -156,6 +264,9 @@ class GfxrConfigSettings:
 
     def set_capture_options(self, filename, frames=None, enable_log=False):
         filepath_on_device = self.resolve_trace_path_on_device(filename)
+        utils.check_prop_value('debug.gfxrecon.capture_file', filepath_on_device)
+        if enable_log:
+            utils.check_prop_value('debug.gfxrecon.log_file', f'{filepath_on_device}.log')
         if utils.check_file_existence(filepath_on_device):
             if not click.confirm(f'Override existent trace {filepath_on_device}?'):
                 raise click.Abort
@@ -208,3 +319,9 @@ def set_last_layer_bin_folder(folder_path: click.Path):
 
 def resolve_layer_filepath(name: str):
     return Settings().resolve_layer_filepath(name)
+
+def get_store_folder():
+    return Settings().get_store_folder()
+
+def set_store_folder(folder_path: click.Path):
+    Settings().set_store_folder(folder_path)
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""Per-frame present timing collected from SurfaceFlinger.
+
+`dumpsys SurfaceFlinger --latency <layer>` only keeps the latest 127 frames of a layer, so it's
+polled in one persistent device shell well within the period the ring buffer covers, and frames
+are de-duplicated by present timestamp on host.
+"""
+
+import click
+import csv
+import json
+import os
+import subprocess as sp
+import threading
+import time
+
+import vk.utils as utils
+
+# Frames whose fence is not signaled yet are reported with INT64_MAX.
+_PENDING_TIMESTAMP = (1 << 63) - 1
+_RING_BUFFER_SIZE = 127
+_STUTTER_BUCKET_COUNT = 5
+_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def get_layer_names(app_name):
+    """Return SurfaceFlinger layer names of app_name."""
+    output = utils.adb_exec('shell dumpsys SurfaceFlinger --list')
+    return [x.strip() for x in output.splitlines() if app_name in x]
+
+
+def parse_latency_output(output):
+    """Parse output of `dumpsys SurfaceFlinger --latency`.
+
+    Returns:
+        Tuple of (refresh period in ns, list of actual present timestamps in ns).
+    """
+    lines = output.splitlines()
+    if not lines or not lines[0].strip().isdigit():
+        return None, []
+
+    refresh_period = int(lines[0])
+    timestamps = []
+    for line in lines[1:]:
+        tokens = line.split()
+        if len(tokens) != 3:
+            continue
+        present_time = int(tokens[1])
+        if present_time and present_time != _PENDING_TIMESTAMP:
+            timestamps.append(present_time)
+    return refresh_period, timestamps
+
+
+def find_app_layer(app_name, timeout=10):
+    """Return layer name of app_name with most presented frames.
+
+    Returns:
+        Layer name, or None if app doesn't present any frame within timeout seconds.
+    """
+    end_time = time.monotonic() + timeout
+    while True:
+        best_layer = None
+        best_count = 0
+        for layer in get_layer_names(app_name):
+            # Layer names contain spaces and brackets, pass the command as one argument of adb.
+            proc = utils.adb_popen(['shell', f"dumpsys SurfaceFlinger --latency '{layer}'"])
+            output, _ = proc.communicate()
+            _, timestamps = parse_latency_output(output.decode('utf-8', errors='replace'))
+            if len(timestamps) > best_count:
+                best_layer, best_count = layer, len(timestamps)
+
+        if best_layer or time.monotonic() > end_time:
+            return best_layer
+        time.sleep(1)
+
+
+def analyze_frame_times(timestamps, refresh_period):
+    """Compute frame time statistics from present timestamps.
+
+    A frame is counted as jank if its frame time is longer than twice the median frame time. The
+    stutter histogram counts frames by the number of refresh periods they spanned, the last bucket
+    holds frames of 5 or more periods.
+
+    Args:
+        timestamps: Sorted present timestamps in ns.
+        refresh_period: Display refresh period in ns.
+
+    Returns:
+        Dict of frame time summary in ms.
+    """
+    np = utils.import_optional_module('numpy')
+
+    frame_times = np.diff(np.asarray(timestamps, dtype=np.int64)) / 1e6
+    if frame_times.size == 0:
+        raise ValueError('At least 2 frames are required for frame time analysis')
+
+    median = float(np.median(frame_times))
+    percentiles = np.percentile(frame_times, _PERCENTILES)
+
+    # 1% low is the average FPS of the slowest 1% frames.
+    slow_count = max(1, frame_times.size // 100)
+    slowest = np.sort(frame_times)[-slow_count:]
+
+    refresh_period_ms = refresh_period / 1e6 if refresh_period else median
+    vsync_counts = np.clip(np.rint(frame_times / refresh_period_ms).astype(np.int64), 1, _STUTTER_BUCKET_COUNT)
+    histogram = np.bincount(vsync_counts, minlength=_STUTTER_BUCKET_COUNT + 1)[1:]
+
+    return {
+        'frame_count': int(frame_times.size),
+        'duration': float(frame_times.sum()) / 1000.0,
+        'fps': float(frame_times.size * 1000.0 / frame_times.sum()),
+        'one_percent_low_fps': float(1000.0 / slowest.mean()),
+        'refresh_period_ms': refresh_period_ms,
+        'frame_time_ms': {
+            'mean': float(frame_times.mean()),
+            'min': float(frame_times.min()),
+            'max': float(frame_times.max()),
+            'stdev': float(frame_times.std()),
+            **{f'p{p:g}': float(v) for p, v in zip(_PERCENTILES, percentiles)},
+        },
+        'jank_count': int(np.count_nonzero(frame_times > 2.0 * median)),
+        'stutter_histogram': {f'{idx}{"+" if idx == _STUTTER_BUCKET_COUNT else ""}': int(count)
+                              for idx, count in enumerate(histogram, 1)},
+    }
+
+
+class FrameTimeCollector:
+    """Collect present timestamps of app layer in background.
+
+    Usage:
+        with FrameTimeCollector(app_name, output_folder):
+            utils.wait_until_app_exit(app_name)
+    """
+
+    def __init__(self, app_name, output_folder, interval=0.5, layer=None):
+        self.app_name = app_name
+        self.interval = interval
+        self.layer = layer
+        time_str = utils.get_time_str()
+        self.csv_filepath = os.path.join(output_folder, f'frametimes_{time_str}.csv')
+        self.summary_filepath = os.path.join(output_folder, f'frametimes_{time_str}.summary.json')
+        self.refresh_period = None
+        self.timestamps = []
+        self.overflow_count = 0
+        self._proc = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+        if exc_type is None:
+            self.show_summary()
+
+    def start(self):
+        # Import here to fail before collecting frames when numpy is missing.
+        utils.import_optional_module('numpy')
+
+        if not self.layer:
+            self.layer = find_app_layer(self.app_name)
+        if not self.layer:
+            utils.log_warning(f'Can not find any presented layer of {self.app_name}, skip frame time collection.')
+            return
+
+        click.echo(f'Collect frame times of layer "{self.layer}"')
+        script = (f"while true; do dumpsys SurfaceFlinger --latency '{self.layer}'; "
+                  f'echo ---; sleep {self.interval}; done')
+        self._proc = utils.adb_popen(['shell', script], stdin=sp.DEVNULL)
+        self._thread = threading.Thread(target=self._read_frames, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._proc:
+            return
+
+        self._proc.terminate()
+        self._proc.wait()
+        self._thread.join()
+        self._proc = None
+
+    def add_latency_output(self, output):
+        """Merge frames of one `--latency` dump into collected timestamps."""
+        refresh_period, timestamps = parse_latency_output(output)
+        if refresh_period:
+            self.refresh_period = refresh_period
+
+        last_timestamp = self.timestamps[-1] if self.timestamps else None
+        new_timestamps = [x for x in timestamps if last_timestamp is None or x > last_timestamp]
+
+        # All frames are new while ring buffer is full, some frames might be missed in between.
+        if last_timestamp is not None and len(timestamps) >= _RING_BUFFER_SIZE and \
+                len(new_timestamps) == len(timestamps):
+            self.overflow_count += 1
+        self.timestamps += new_timestamps
+
+    def _read_frames(self):
+        lines = []
+        for line in self._proc.stdout:
+            line = line.decode('utf-8', errors='replace')
+            if line.strip() != '---':
+                lines.append(line)
+                continue
+
+            self.add_latency_output(''.join(lines))
+            lines = []
+
+    def get_summary(self):
+        summary = analyze_frame_times(self.timestamps, self.refresh_period)
+        summary['app'] = self.app_name
+        summary['layer'] = self.layer
+        summary['overflow_count'] = self.overflow_count
+        return summary
+
+    def write_frame_times(self):
+        folder_path = os.path.dirname(self.csv_filepath)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+
+        with open(self.csv_filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['present_time_ns', 'frame_time_ms'])
+            prev_timestamp = None
+            for timestamp in self.timestamps:
+                frame_time = '' if prev_timestamp is None else f'{(timestamp - prev_timestamp) / 1e6:.3f}'
+                writer.writerow([timestamp, frame_time])
+                prev_timestamp = timestamp
+
+    def show_summary(self):
+        if not self.layer:
+            return
+
+        if len(self.timestamps) < 2:
+            utils.log_warning(f'Only {len(self.timestamps)} frames are collected.')
+            return
+
+        self.write_frame_times()
+        summary = self.get_summary()
+        with open(self.summary_filepath, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        frame_time = summary['frame_time_ms']
+        click.echo(f'{summary["frame_count"]} frames in {summary["duration"]:.1f}s: '
+                   f'{summary["fps"]:.2f} FPS, 1% low {summary["one_percent_low_fps"]:.2f} FPS, '
+                   f'{summary["jank_count"]} janks')
+        click.echo('  Frame time ms: ' + ', '.join(f'{k} {frame_time[k]:.2f}'
+                                                  for k in ('mean', 'p50', 'p90', 'p95', 'p99', 'max')))
+        click.echo('  Refresh periods per frame: ' + ', '.join(f'{k}: {v}' for k, v in
+                                                               summary['stutter_histogram'].items()))
+        if self.overflow_count:
+            utils.log_warning(f'Frame buffer of SurfaceFlinger overflowed {self.overflow_count} times, '
+                              'use a shorter polling interval.')
+        click.echo(f'Frame times are written to {self.csv_filepath}')
@@ -0,0 +1,686 @@
+"""Host-side reader of GFXReconstruct capture files.
+
+The capture file consists of a file header followed by a stream of blocks:
+
+    FileHeader      fourcc 'GFXR', major/minor version, option count
+    FileOptionPair  (key, value) * option count
+    BlockHeader     payload size (u64), block type (u32)
+    ...             payload
+
+All parsing is done on a read-only mmap, and only block headers are touched while walking
+the stream. Thus memory usage is bounded regardless of the trace size.
+
+https://github.com/LunarG/gfxreconstruct/blob/dev/framework/format/format.h
+"""
+
+import array
+import collections
+import concurrent.futures
+import mmap
+import os
+import struct
+import zlib
+
+from enum import IntEnum
+
+import vk.utils as utils
+
+_FOURCC = b'GFXR'
+_FILE_HEADER = struct.Struct('<4sHHI')
+_FILE_OPTION = struct.Struct('<II')
+_BLOCK_HEADER = struct.Struct('<QI')
+_MARKER = struct.Struct('<IQ')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+_INDEX_MAGIC = b'GFXI'
+_INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct('<4sHHQQ')
+FRAME_INDEX_EXT = '.fidx'
+
+COMPRESSED_BLOCK_BIT = 0x80000000
+
+
+class GfxrFormatError(RuntimeError):
+    pass
+
+
+class FileOption(IntEnum):
+    CompressionType = 1
+
+
+class CompressionType(IntEnum):
+    NONE = 0
+    LZ4 = 1
+    ZLIB = 2
+    ZSTD = 3
+
+
+class BlockType(IntEnum):
+    Unknown = 0
+    FrameMarker = 1
+    StateMarker = 2
+    MetaData = 3
+    FunctionCall = 4
+    Annotation = 5
+    MethodCall = 6
+    CompressedMetaData = COMPRESSED_BLOCK_BIT | 3
+    CompressedFunctionCall = COMPRESSED_BLOCK_BIT | 4
+    CompressedMethodCall = COMPRESSED_BLOCK_BIT | 6
+
+
+class MarkerType(IntEnum):
+    Unknown = 0
+    Begin = 1
+    End = 2
+
+
+class MetaDataType(IntEnum):
+    FillMemoryCommand = 2
+    InitBufferCommand = 7
+    InitImageCommand = 8
+    InitSubresourceCommand = 17
+
+
+_API_CALL_BLOCK_TYPES = frozenset([
+    BlockType.FunctionCall, BlockType.CompressedFunctionCall,
+    BlockType.MethodCall, BlockType.CompressedMethodCall,
+])
+
+
+class Block(collections.namedtuple('Block', ['offset', 'type', 'size'])):
+    """Block location in trace file.
+
+    Attributes:
+        offset: File offset of the block header.
+        type: Block type (u32).
+        size: Payload size excluding block header.
+    """
+
+    __slots__ = ()
+
+    @property
+    def payload_offset(self):
+        return self.offset + _BLOCK_HEADER.size
+
+    @property
+    def end_offset(self):
+        return self.offset + _BLOCK_HEADER.size + self.size
+
+    @property
+    def is_compressed(self):
+        return bool(self.type & COMPRESSED_BLOCK_BIT)
+
+
+class GfxrReader:
+    """Walk block stream of a .gfxr file.
+
+    Usage:
+        with GfxrReader(filepath) as reader:
+            for block in reader.blocks():
+                ...
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise GfxrFormatError(f'{filepath} is empty')
+
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self._buf.madvise(mmap.MADV_SEQUENTIAL)
+
+        self.file_size = len(self._buf)
+        self.truncated = False
+        self._parse_file_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def close(self):
+        self._buf.close()
+        self._file.close()
+
+    def _parse_file_header(self):
+        if self.file_size < _FILE_HEADER.size:
+            raise GfxrFormatError(f'{self.filepath} is too small to be a GFXR trace')
+
+        fourcc, self.major_version, self.minor_version, option_count = _FILE_HEADER.unpack_from(self._buf, 0)
+        if fourcc != _FOURCC:
+            raise GfxrFormatError(f'{self.filepath} is not a GFXR trace (fourcc={fourcc!r})')
+
+        self.options = {}
+        offset = _FILE_HEADER.size
+        for _ in range(option_count):
+            if offset + _FILE_OPTION.size > self.file_size:
+                raise GfxrFormatError(f'{self.filepath} has truncated file options')
+            key, value = _FILE_OPTION.unpack_from(self._buf, offset)
+            self.options[key] = value
+            offset += _FILE_OPTION.size
+
+        self.data_offset = offset
+
+    @property
+    def compression(self):
+        value = self.options.get(FileOption.CompressionType, CompressionType.NONE)
+        try:
+            return CompressionType(value)
+        except ValueError:
+            raise GfxrFormatError(f'Unknown compression type {value} in {self.filepath}')
+
+    @property
+    def version(self):
+        return f'{self.major_version}.{self.minor_version}'
+
+    def header_bytes(self):
+        """Return raw bytes of file header and options."""
+        return self._buf[:self.data_offset]
+
+    def blocks(self, start_offset=None):
+        """Yield each Block from start_offset (default: first block) to the end of file.
+
+        A trailing partial block (ex. capture is interrupted) stops the iteration and sets
+        self.truncated to True.
+        """
+        buf = self._buf
+        file_size = self.file_size
+        header_size = _BLOCK_HEADER.size
+        unpack_from = _BLOCK_HEADER.unpack_from
+        offset = self.data_offset if start_offset is None else start_offset
+
+        while offset + header_size <= file_size:
+            size, block_type = unpack_from(buf, offset)
+            end = offset + header_size + size
+            if end > file_size:
+                break
+            yield Block(offset, block_type, size)
+            offset = end
+
+        self.truncated = offset != file_size
+
+    def read(self, offset, size):
+        """Return a copy of bytes in [offset, offset + size)."""
+        return self._buf[offset:offset + size]
+
+    def read_u32(self, offset):
+        return _U32.unpack_from(self._buf, offset)[0]
+
+    def read_marker(self, block):
+        """Return (marker_type, frame_number) of a frame/state marker block."""
+        return _MARKER.unpack_from(self._buf, block.payload_offset)
+
+    def is_frame_end(self, block):
+        return block.type == BlockType.FrameMarker and \
+            block.size >= _MARKER.size and self.read_marker(block)[0] == MarkerType.End
+
+
+class TraceSummary:
+    """Statistics of a trace collected by one pass of block headers."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.version = None
+        self.compression = CompressionType.NONE
+        self.file_size = 0
+        self.block_count = 0
+        self.frame_count = 0
+        self.state_marker_count = 0
+        self.metadata_count = 0
+        self.annotation_count = 0
+        self.api_call_counts = collections.Counter()
+        self.payload_size = 0
+        self.compressed_block_count = 0
+        self.compressed_payload_size = 0
+        self.truncated = False
+
+    @property
+    def api_call_count(self):
+        return sum(self.api_call_counts.values())
+
+    def to_dict(self):
+        return {
+            'filepath': self.filepath,
+            'version': self.version,
+            'compression': self.compression.name,
+            'file_size': self.file_size,
+            'block_count': self.block_count,
+            'frame_count': self.frame_count,
+            'state_marker_count': self.state_marker_count,
+            'metadata_count': self.metadata_count,
+            'annotation_count': self.annotation_count,
+            'api_call_count': self.api_call_count,
+            'api_call_counts': {f'0x{k:08x}': v for k, v in self.api_call_counts.most_common()},
+            'payload_size': self.payload_size,
+            'compressed_block_count': self.compressed_block_count,
+            'compressed_payload_size': self.compressed_payload_size,
+            'truncated': self.truncated,
+        }
+
+
+def summarize_trace(filepath):
+    """Scan block headers of filepath and return TraceSummary.
+
+    Frame count is derived from frame end markers written by the capture layer.
+
+    Raises:
+        GfxrFormatError: If filepath is not a valid GFXR trace.
+    """
+    summary = TraceSummary(filepath)
+
+    with GfxrReader(filepath) as reader:
+        summary.version = reader.version
+        summary.compression = reader.compression
+        summary.file_size = reader.file_size
+
+        api_call_counts = summary.api_call_counts
+        block_count = 0
+        payload_size = 0
+        compressed_block_count = 0
+        compressed_payload_size = 0
+
+        for block in reader.blocks():
+            block_count += 1
+            payload_size += block.size
+            block_type = block.type
+
+            if block_type & COMPRESSED_BLOCK_BIT:
+                compressed_block_count += 1
+                compressed_payload_size += block.size
+
+            if block_type in _API_CALL_BLOCK_TYPES:
+                api_call_counts[reader.read_u32(block.payload_offset)] += 1
+            elif block_type == BlockType.FrameMarker:
+                if reader.is_frame_end(block):
+                    summary.frame_count += 1
+            elif block_type == BlockType.StateMarker:
+                summary.state_marker_count += 1
+            elif block_type in (BlockType.MetaData, BlockType.CompressedMetaData):
+                summary.metadata_count += 1
+            elif block_type == BlockType.Annotation:
+                summary.annotation_count += 1
+
+        summary.block_count = block_count
+        summary.payload_size = payload_size
+        summary.compressed_block_count = compressed_block_count
+        summary.compressed_payload_size = compressed_payload_size
+        summary.truncated = reader.truncated
+
+    return summary
+
+
+class FrameIndex:
+    """Start offset and block count of each frame in a trace.
+
+    The sidecar file is packed as:
+
+        header   magic 'GFXI', version (u16), reserved (u16), trace file size (u64), frame count (u64)
+        offsets  u64 * frame count
+        counts   u32 * frame count
+
+    Trace file size is kept to detect stale index after the trace is rewritten.
+    """
+
+    def __init__(self, source_size, offsets=None, block_counts=None):
+        self.source_size = source_size
+        self.offsets = offsets if offsets is not None else array.array('Q')
+        self.block_counts = block_counts if block_counts is not None else array.array('I')
+
+    @property
+    def frame_count(self):
+        return len(self.offsets)
+
+    def get_frame_offset(self, frame_idx):
+        """Return file offset of the first block of frame_idx (0-based)."""
+        return self.offsets[frame_idx]
+
+    def get_block_count(self, frame_idx):
+        return self.block_counts[frame_idx]
+
+    def to_bytes(self):
+        offsets = array.array('Q', self.offsets)
+        block_counts = array.array('I', self.block_counts)
+        if _is_big_endian():
+            offsets.byteswap()
+            block_counts.byteswap()
+
+        header = _INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, 0, self.source_size, self.frame_count)
+        return header + offsets.tobytes() + block_counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create FrameIndex from packed bytes.
+
+        Raises:
+            GfxrFormatError: If data is not a valid frame index.
+        """
+        if len(data) < _INDEX_HEADER.size:
+            raise GfxrFormatError('Frame index is too small')
+
+        magic, version, _, source_size, frame_count = _INDEX_HEADER.unpack_from(data, 0)
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            raise GfxrFormatError(f'Unsupported frame index (magic={magic!r}, version={version})')
+
+        offsets_end = _INDEX_HEADER.size + frame_count * 8
+        if len(data) != offsets_end + frame_count * 4:
+            raise GfxrFormatError('Frame index size mismatch')
+
+        offsets = array.array('Q')
+        offsets.frombytes(data[_INDEX_HEADER.size:offsets_end])
+        block_counts = array.array('I')
+        block_counts.frombytes(data[offsets_end:])
+        if _is_big_endian():
+            offsets.byteswap()
+            block_counts.byteswap()
+
+        return cls(source_size, offsets, block_counts)
+
+    def save(self, filepath):
+        tmp_filepath = f'{filepath}.tmp'
+        with open(tmp_filepath, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_filepath, filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def _is_big_endian():
+    return struct.pack('=I', 1) == struct.pack('>I', 1)
+
+
+def get_frame_index_filepath(trace_filepath):
+    return f'{trace_filepath}{FRAME_INDEX_EXT}'
+
+
+def build_frame_index(filepath):
+    """Build FrameIndex of filepath with one pass of block headers.
+
+    Blocks after the last frame end marker do not belong to any complete frame, thus
+    they are not indexed.
+    """
+    with GfxrReader(filepath) as reader:
+        index = FrameIndex(reader.file_size)
+        frame_start = reader.data_offset
+        block_count = 0
+
+        for block in reader.blocks():
+            block_count += 1
+            if block.type == BlockType.FrameMarker and reader.is_frame_end(block):
+                index.offsets.append(frame_start)
+                index.block_counts.append(block_count)
+                frame_start = block.end_offset
+                block_count = 0
+
+    return index
+
+
+def get_frame_index(filepath, rebuild=False):
+    """Return FrameIndex of filepath from its sidecar file.
+
+    The sidecar file is (re)built when it is missing, stale or rebuild is True.
+    """
+    index_filepath = get_frame_index_filepath(filepath)
+    if not rebuild and os.path.exists(index_filepath):
+        try:
+            index = FrameIndex.load(index_filepath)
+            if index.source_size == os.path.getsize(filepath):
+                return index
+        except GfxrFormatError:
+            pass
+
+    index = build_frame_index(filepath)
+    index.save(index_filepath)
+    return index
+
+
+# Size of fixed fields preceding the (compressed) parameter data of each compressible block type.
+# Compressed function/method calls insert uncompressed size (u64) after these fields, while
+# compressed metadata commands keep uncompressed size in their own size field.
+_FUNCTION_CALL_HEADER_SIZE = 4 + 8          # api_call_id, thread_id
+_METHOD_CALL_HEADER_SIZE = 4 + 8 + 8        # api_call_id, object_id, thread_id
+
+# Metadata type: (header size, offset of uncompressed data size field).
+_META_DATA_LAYOUTS = {
+    # meta_data_id, thread_id, memory_id, memory_offset, memory_size
+    MetaDataType.FillMemoryCommand: (4 + 8 + 8 + 8 + 8, 4 + 8 + 8 + 8),
+    # meta_data_id, thread_id, device_id, buffer_id, data_size
+    MetaDataType.InitBufferCommand: (4 + 8 + 8 + 8 + 8, 4 + 8 + 8 + 8),
+    # meta_data_id, thread_id, device_id, image_id, data_size, aspect, layout, level_count,
+    # followed by level sizes (u64 * level_count) which are never compressed.
+    MetaDataType.InitImageCommand: (4 + 8 + 8 + 8 + 8 + 4 + 4 + 4, 4 + 8 + 8 + 8),
+    # meta_data_id, thread_id, device_id, resource_id, subresource, initial_state, resource_state,
+    # barrier_flags, data_size
+    MetaDataType.InitSubresourceCommand: (4 + 8 + 8 + 8 + 4 + 4 + 4 + 4 + 8, 4 + 8 + 8 + 8 + 4 + 4 + 4 + 4),
+}
+_INIT_IMAGE_LEVEL_COUNT_OFFSET = 4 + 8 + 8 + 8 + 8 + 4 + 4
+
+_codec_cache = {}
+
+
+def _get_codec(compression):
+    """Return (compress, decompress) functions of compression type.
+
+    decompress takes (data, uncompressed_size). The codec objects are cached per process.
+    """
+    if compression in _codec_cache:
+        return _codec_cache[compression]
+
+    if compression == CompressionType.LZ4:
+        lz4_block = utils.import_optional_module('lz4.block', 'lz4')
+        codec = (lambda data: lz4_block.compress(data, store_size=False),
+                 lambda data, size: lz4_block.decompress(data, uncompressed_size=size))
+    elif compression == CompressionType.ZLIB:
+        codec = (zlib.compress, lambda data, size: zlib.decompress(data, bufsize=max(size, 1)))
+    elif compression == CompressionType.ZSTD:
+        zstandard = utils.import_optional_module('zstandard')
+        compressor = zstandard.ZstdCompressor()
+        decompressor = zstandard.ZstdDecompressor()
+        codec = (compressor.compress, lambda data, size: decompressor.decompress(data, max_output_size=size))
+    else:
+        codec = (None, None)
+
+    _codec_cache[compression] = codec
+    return codec
+
+
+def _get_data_layout(block_type, payload):
+    """Return (header_size, size_offset, is_supported) of the compressible data in block payload.
+
+    size_offset is the offset of uncompressed size field of metadata commands, or None for API
+    calls which insert the size field after header when compressed.
+    """
+    base_type = block_type & ~COMPRESSED_BLOCK_BIT
+    if base_type == BlockType.FunctionCall:
+        return _FUNCTION_CALL_HEADER_SIZE, None, True
+    elif base_type == BlockType.MethodCall:
+        return _METHOD_CALL_HEADER_SIZE, None, True
+    elif base_type == BlockType.MetaData and len(payload) >= _U32.size:
+        meta_data_type = _U32.unpack_from(payload, 0)[0] & 0xffff
+        if meta_data_type in _META_DATA_LAYOUTS:
+            header_size, size_offset = _META_DATA_LAYOUTS[meta_data_type]
+            if len(payload) >= header_size and meta_data_type == MetaDataType.InitImageCommand:
+                header_size += _U64.size * _U32.unpack_from(payload, _INIT_IMAGE_LEVEL_COUNT_OFFSET)[0]
+            if len(payload) >= header_size:
+                return header_size, size_offset, True
+    return 0, None, False
+
+
+def _recompress_block(block_type, payload, src_compression, dst_compression):
+    """Return (block_type, payload) re-encoded with dst_compression.
+
+    Raises:
+        GfxrFormatError: If the block is compressed with an unknown layout.
+    """
+    header_size, size_offset, is_supported = _get_data_layout(block_type, payload)
+    is_compressed = bool(block_type & COMPRESSED_BLOCK_BIT)
+    if not is_supported:
+        if is_compressed:
+            raise GfxrFormatError(f'Unsupported compressed block type 0x{block_type:08x}')
+        return block_type, payload
+
+    base_type = block_type & ~COMPRESSED_BLOCK_BIT
+    is_meta_data = size_offset is not None
+    header = payload[:header_size]
+
+    if is_compressed:
+        _, decompress = _get_codec(src_compression)
+        if decompress is None:
+            raise GfxrFormatError('Compressed block found in uncompressed trace')
+        if is_meta_data:
+            data_size = _U64.unpack_from(payload, size_offset)[0]
+            data = decompress(payload[header_size:], data_size)
+        else:
+            data_size = _U64.unpack_from(payload, header_size)[0]
+            data = decompress(payload[header_size + _U64.size:], data_size)
+        if len(data) != data_size:
+            raise GfxrFormatError(f'Decompressed size mismatch ({len(data)} != {data_size})')
+    else:
+        data = payload[header_size:]
+
+    compress, _ = _get_codec(dst_compression)
+    if compress is not None and data:
+        compressed_data = compress(data)
+        # Keep data uncompressed when compression doesn't help, which is the same as capture layer.
+        if len(compressed_data) < len(data):
+            size_field = b'' if is_meta_data else _U64.pack(len(data))
+            return base_type | COMPRESSED_BLOCK_BIT, header + size_field + compressed_data
+
+    return base_type, header + data
+
+
+def _recompress_blocks(chunk, src_compression, dst_compression):
+    """Recompress consecutive blocks in chunk, return (output bytes, block count)."""
+    output = bytearray()
+    offset = 0
+    block_count = 0
+    chunk_size = len(chunk)
+    header_size = _BLOCK_HEADER.size
+
+    while offset < chunk_size:
+        size, block_type = _BLOCK_HEADER.unpack_from(chunk, offset)
+        payload = chunk[offset + header_size:offset + header_size + size]
+        block_type, payload = _recompress_block(block_type, payload, src_compression, dst_compression)
+        output += _BLOCK_HEADER.pack(len(payload), block_type)
+        output += payload
+        offset += header_size + size
+        block_count += 1
+
+    return bytes(output), block_count
+
+
+def _iter_block_chunks(reader, chunk_size):
+    """Yield (start_offset, end_offset, block_count) of consecutive blocks about chunk_size."""
+    start = None
+    end = None
+    block_count = 0
+    for block in reader.blocks():
+        if start is None:
+            start = block.offset
+        end = block.end_offset
+        block_count += 1
+        if end - start >= chunk_size:
+            yield start, end, block_count
+            start = None
+            block_count = 0
+
+    if start is not None:
+        yield start, end, block_count
+
+
+def _make_file_header(reader, compression):
+    """Return file header bytes of reader with compression option replaced."""
+    options = dict(reader.options)
+    options[FileOption.CompressionType] = int(compression)
+    header = _FILE_HEADER.pack(_FOURCC, reader.major_version, reader.minor_version, len(options))
+    return header + b''.join(_FILE_OPTION.pack(key, value) for key, value in options.items())
+
+
+def count_blocks(filepath):
+    """Return (block count, is_truncated) of filepath."""
+    with GfxrReader(filepath) as reader:
+        block_count = sum(1 for _ in reader.blocks())
+        return block_count, reader.truncated
+
+
+def recompress_trace(src_filepath, dst_filepath, compression, jobs=None, chunk_size=4 << 20, progress=None):
+    """Rewrite blocks of src_filepath with another compression type.
+
+    Chunks of blocks are recompressed in a process pool. At most 2 * jobs chunks are in flight, and
+    results are written in submission order, so memory usage is bounded by chunk_size and jobs.
+    The block count of output file is verified before it replaces dst_filepath.
+
+    Args:
+        src_filepath: Input trace.
+        dst_filepath: Output trace, which could be the same as src_filepath.
+        compression: Target CompressionType.
+        jobs: Number of worker processes, default is CPU count.
+        chunk_size: Approximate size of blocks processed by one task.
+        progress: Optional callback receives number of input bytes processed.
+
+    Returns:
+        Number of blocks written.
+
+    Raises:
+        GfxrFormatError: If input is invalid or block count check fails.
+    """
+    compression = CompressionType(compression)
+    jobs = jobs or os.cpu_count() or 1
+    tmp_filepath = f'{dst_filepath}.tmp'
+    src_block_count = 0
+    dst_block_count = 0
+
+    # Fail early if codecs are not available.
+    _get_codec(compression)
+
+    try:
+        with GfxrReader(src_filepath) as reader, open(tmp_filepath, 'wb') as f, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            src_compression = reader.compression
+            _get_codec(src_compression)
+            f.write(_make_file_header(reader, compression))
+
+            pending = collections.deque()
+
+            def write_result():
+                nonlocal dst_block_count
+                future, processed_size = pending.popleft()
+                data, block_count = future.result()
+                f.write(data)
+                dst_block_count += block_count
+                if progress:
+                    progress(processed_size)
+
+            for start, end, block_count in _iter_block_chunks(reader, chunk_size):
+                src_block_count += block_count
+                future = executor.submit(_recompress_blocks, reader.read(start, end - start),
+                                         src_compression, compression)
+                pending.append((future, end - start))
+                if len(pending) >= 2 * jobs:
+                    write_result()
+
+            while pending:
+                write_result()
+
+            if reader.truncated:
+                utils.log_warning(f'{src_filepath} ends with a partial block, which is dropped.')
+
+        written_block_count, truncated = count_blocks(tmp_filepath)
+        if truncated or not (src_block_count == dst_block_count == written_block_count):
+            raise GfxrFormatError(f'Block count mismatch: {src_block_count} blocks in source, '
+                                  f'{written_block_count} blocks in output')
+
+        os.replace(tmp_filepath, dst_filepath)
+    finally:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+
+    return dst_block_count
+
@@ -0,0 +1,242 @@
+"""Comparison of screenshots against golden images with NumPy.
+
+BMP images are decoded natively, while PNG images require Pillow. Each image pair is compared
+by max, mean and RMSE error of RGB channels, PSNR, and SSIM of luma with a 7x7 box window. Pairs
+are compared in a process pool, since decoding and metrics of each pair are independent.
+"""
+
+import collections
+import concurrent.futures
+import filecmp
+import math
+import os
+import struct
+
+import vk.utils as utils
+
+IMAGE_EXTS = ('.bmp', '.png')
+
+# PSNR of identical images is infinite, it's capped to keep reports valid JSON.
+MAX_PSNR = 100.0
+_SSIM_WINDOW_SIZE = 7
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+_LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+
+# BMP compression types of uncompressed pixels and pixels with channel masks.
+_BI_RGB = 0
+_BI_BITFIELDS = 3
+
+Tolerance = collections.namedtuple('Tolerance', ['max_rmse', 'min_ssim'])
+DEFAULT_TOLERANCE = Tolerance(1.0, 0.99)
+
+
+def _import_numpy():
+    return utils.import_optional_module('numpy')
+
+
+def read_bmp(filepath):
+    """Decode uncompressed 24/32-bit BMP file to HxWx3 uint8 RGB array."""
+    np = _import_numpy()
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    if data[:2] != b'BM' or len(data) < 34:
+        raise ValueError(f'{filepath} is not a BMP file')
+
+    data_offset, = struct.unpack_from('<I', data, 10)
+    width, height, _, bpp, compression = struct.unpack_from('<iiHHI', data, 18)
+    if bpp not in (24, 32) or compression not in (_BI_RGB, _BI_BITFIELDS):
+        raise ValueError(f'Unsupported BMP format of {filepath}: {bpp} bpp, compression {compression}')
+
+    # Rows are padded to 4 bytes, and stored bottom-up unless height is negative.
+    row_size = (bpp * width + 31) // 32 * 4
+    pixels = np.frombuffer(data, np.uint8, row_size * abs(height), data_offset).reshape(abs(height), row_size)
+    pixels = pixels[:, :width * (bpp // 8)].reshape(abs(height), width, bpp // 8)
+    if height > 0:
+        pixels = pixels[::-1]
+    return pixels[..., 2::-1]
+
+
+def write_bmp(filepath, image):
+    """Encode HxWx3 uint8 RGB array to 24-bit BMP file."""
+    np = _import_numpy()
+    height, width = image.shape[:2]
+    row_size = (24 * width + 31) // 32 * 4
+
+    pixels = np.zeros((height, row_size), np.uint8)
+    pixels[:, :width * 3] = image[::-1, :, ::-1].reshape(height, width * 3)
+
+    header_size = 14 + 40
+    with open(filepath, 'wb') as f:
+        f.write(struct.pack('<2sIHHI', b'BM', header_size + pixels.size, 0, 0, header_size))
+        f.write(struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, _BI_RGB, pixels.size, 2835, 2835, 0, 0))
+        f.write(pixels.tobytes())
+
+
+def read_image(filepath):
+    """Decode BMP or PNG file to HxWx3 uint8 RGB array."""
+    if filepath.lower().endswith('.bmp'):
+        return read_bmp(filepath)
+
+    np = _import_numpy()
+    image_module = utils.import_optional_module('PIL.Image', 'Pillow')
+    with image_module.open(filepath) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+def write_image(filepath, image):
+    if filepath.lower().endswith('.bmp'):
+        write_bmp(filepath, image)
+    else:
+        image_module = utils.import_optional_module('PIL.Image', 'Pillow')
+        image_module.fromarray(image).save(filepath)
+
+
+def _box_mean(x, size):
+    """Return means of all size x size windows of last 2 axes of x.
+
+    The window is summed by shifted slices separably, which keeps float32 precise unlike summed-area
+    tables of large images.
+    """
+    height, width = x.shape[-2] - size + 1, x.shape[-1] - size + 1
+    rows = x[..., :height, :].copy()
+    for idx in range(1, size):
+        rows += x[..., idx:idx + height, :]
+
+    window_sum = rows[..., :width].copy()
+    for idx in range(1, size):
+        window_sum += rows[..., idx:idx + width]
+    return window_sum / (size * size)
+
+
+def compute_ssim(image, golden):
+    """Return mean SSIM of luma of two RGB arrays over all 7x7 windows."""
+    np = _import_numpy()
+    weights = np.asarray(_LUMA_WEIGHTS, np.float32)
+    x = image.astype(np.float32) @ weights
+    y = golden.astype(np.float32) @ weights
+
+    size = min(_SSIM_WINDOW_SIZE, *x.shape)
+    mu_x, mu_y, mean_xx, mean_yy, mean_xy = _box_mean(np.stack([x, y, x * x, y * y, x * y]), size)
+    var_x = mean_xx - mu_x * mu_x
+    var_y = mean_yy - mu_y * mu_y
+    cov_xy = mean_xy - mu_x * mu_y
+
+    ssim_map = ((2 * mu_x * mu_y + _SSIM_C1) * (2 * cov_xy + _SSIM_C2)) / \
+        ((mu_x * mu_x + mu_y * mu_y + _SSIM_C1) * (var_x + var_y + _SSIM_C2))
+    return float(ssim_map.mean(dtype=np.float64))
+
+
+def _get_identical_metrics():
+    return {'max_error': 0.0, 'mean_error': 0.0, 'rmse': 0.0, 'psnr': MAX_PSNR, 'ssim': 1.0}
+
+
+def compute_metrics(image, golden):
+    """Return dict of error metrics of image against golden, errors are in [0, 255] scale."""
+    np = _import_numpy()
+    # Deterministic replays mostly reproduce golden images exactly, skip SSIM which dominates the cost.
+    if np.array_equal(image, golden):
+        return _get_identical_metrics()
+
+    diff = image.astype(np.float32) - golden.astype(np.float32)
+    abs_diff = np.abs(diff)
+    rmse = float(np.sqrt(np.mean(diff * diff)))
+    return {
+        'max_error': float(abs_diff.max()),
+        'mean_error': float(abs_diff.mean()),
+        'rmse': rmse,
+        'psnr': min(20.0 * math.log10(255.0 / rmse), MAX_PSNR) if rmse else MAX_PSNR,
+        'ssim': compute_ssim(image, golden),
+    }
+
+
+def make_heatmap(image, golden):
+    """Return RGB heatmap of max channel error normalized by the largest one, from black through red to white."""
+    np = _import_numpy()
+    error = np.abs(image.astype(np.int16) - golden.astype(np.int16)).max(axis=2).astype(np.float32)
+    t = error / max(float(error.max()), 1.0)
+    heatmap = np.stack([np.clip(3 * t, 0, 1), np.clip(3 * t - 1, 0, 1), np.clip(3 * t - 2, 0, 1)], axis=2)
+    return (heatmap * 255).astype(np.uint8)
+
+
+def compare_image(name, image_filepath, golden_filepath, tolerance=DEFAULT_TOLERANCE, diff_filepath=None):
+    """Compare image file against golden file, and write heatmap to diff_filepath if it fails.
+
+    Returns:
+        Dict of name, file paths, metrics, and 'passed'. 'error' describes why images are not comparable.
+    """
+    result = {'name': name, 'image': image_filepath, 'golden': golden_filepath, 'passed': False}
+    if filecmp.cmp(image_filepath, golden_filepath, shallow=False):
+        result.update(_get_identical_metrics(), passed=True)
+        return result
+
+    try:
+        image = read_image(image_filepath)
+        golden = read_image(golden_filepath)
+    except (OSError, ValueError) as e:
+        result['error'] = str(e)
+        return result
+
+    if image.shape != golden.shape:
+        result['error'] = f'Image size {image.shape[1]}x{image.shape[0]} differs from golden size ' \
+                          f'{golden.shape[1]}x{golden.shape[0]}'
+        return result
+
+    result.update(compute_metrics(image, golden))
+    result['passed'] = result['rmse'] <= tolerance.max_rmse and result['ssim'] >= tolerance.min_ssim
+    if not result['passed'] and diff_filepath:
+        os.makedirs(os.path.dirname(diff_filepath) or '.', exist_ok=True)
+        write_image(diff_filepath, make_heatmap(image, golden))
+        result['diff'] = diff_filepath
+    return result
+
+
+def _compare_image_args(args):
+    return compare_image(*args)
+
+
+def list_images(folder_path):
+    """Return dict of file name stem to path of images in folder_path."""
+    images = {}
+    for filename in sorted(os.listdir(folder_path)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() in IMAGE_EXTS:
+            images[stem] = os.path.join(folder_path, filename)
+    return images
+
+
+def compare_folders(image_folder, golden_folder, tolerance=DEFAULT_TOLERANCE, diff_folder=None, max_workers=None):
+    """Compare images against golden images of the same file name stem in a process pool.
+
+    Images without golden ones, and golden images without images, are failed results with 'error'.
+    Heatmaps of failed pairs are written to diff_folder as <stem>.diff.<ext of image>.
+
+    Returns:
+        List of results of compare_image sorted by name.
+    """
+    # Fail before spawning workers when numpy is missing.
+    _import_numpy()
+    images = list_images(image_folder)
+    goldens = list_images(golden_folder)
+
+    results = []
+    for name in sorted(images.keys() ^ goldens.keys()):
+        error = 'Golden image is missing' if name in images else 'Image is missing'
+        results.append({'name': name, 'image': images.get(name), 'golden': goldens.get(name), 'passed': False,
+                        'error': error})
+
+    tasks = []
+    for name in sorted(images.keys() & goldens.keys()):
+        diff_filepath = None
+        if diff_folder:
+            diff_filepath = os.path.join(diff_folder, f'{name}.diff{os.path.splitext(images[name])[1].lower()}')
+        tasks.append((name, images[name], goldens[name], tolerance, diff_filepath))
+
+    if tasks:
+        max_workers = max_workers or os.cpu_count() or 1
+        chunk_size = max(1, len(tasks) // (max_workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results += executor.map(_compare_image_args, tasks, chunksize=chunk_size)
+
+    return sorted(results, key=lambda x: x['name'])
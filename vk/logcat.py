@@ -0,0 +1,223 @@
+"""Streaming logcat consumer running in background threads.
+
+A reader thread parses and filters lines of `adb logcat`, and hands them to a writer thread through
+a bounded queue. When the writer falls behind, the reader blocks on the queue instead of dropping
+lines, so the backlog is kept in logd buffer and adb pipe rather than host memory.
+"""
+
+import click
+import collections
+import os
+import queue
+import re
+import subprocess as sp
+import threading
+import time
+
+import vk.utils as utils
+
+DEFAULT_TAGS = ('gfxrecon', 'VALIDATION', 'vulkan')
+
+# Ex. "05-30 12:34:56.789  1234  1250 E VALIDATION: Validation Error: ..."
+_THREADTIME_PATTERN = re.compile(r'^(\d\d-\d\d \d\d:\d\d:\d\d\.\d+)\s+(\d+)\s+(\d+)\s+([VDIWEFS])\s+(.*?)\s*: (.*)$')
+
+LogLine = collections.namedtuple('LogLine', ['time', 'pid', 'tid', 'priority', 'tag', 'message'])
+_QUEUE_SIZE = 8192
+_BATCH_SIZE = 512
+_DRAIN_DELAY = 0.5
+# Maximum lines held before watch_app(), it's about a few MB.
+_MAX_HELD_LINES = 65536
+
+
+def parse_line(line):
+    """Parse logcat line of threadtime format.
+
+    Returns:
+        LogLine, or None if line is not a log entry (ex. "--------- beginning of main").
+    """
+    match_obj = _THREADTIME_PATTERN.match(line)
+    return LogLine(*match_obj.groups()) if match_obj else None
+
+
+class RotatingFile:
+    """Text file rotated to <filepath>.1 ... <filepath>.N when it exceeds max_bytes."""
+
+    def __init__(self, filepath, max_bytes=16 << 20, backup_count=5):
+        self.filepath = filepath
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        folder_path = os.path.dirname(filepath)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+        self.file = open(filepath, 'w', encoding='utf-8')
+        self.size = 0
+
+    def write(self, text):
+        if self.max_bytes and self.size and self.size + len(text) > self.max_bytes:
+            self._rotate()
+        self.file.write(text)
+        self.size += len(text)
+
+    def _rotate(self):
+        self.file.close()
+        for idx in range(self.backup_count - 1, 0, -1):
+            src_filepath = f'{self.filepath}.{idx}'
+            if os.path.exists(src_filepath):
+                os.replace(src_filepath, f'{self.filepath}.{idx + 1}')
+        if self.backup_count:
+            os.replace(self.filepath, f'{self.filepath}.1')
+        self.file = open(self.filepath, 'w', encoding='utf-8')
+        self.size = 0
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class LogcatStream:
+    """Stream device logs since start() to a rotating file and callbacks in background.
+
+    Lines are kept if their tag is in tags or they are logged by watched processes. Callbacks are
+    invoked with each kept line on the writer thread.
+
+    Processes of app are only known after it's launched. If hold_until_watch is set, lines are held
+    until watch_app() is called and then filtered in order, so lines logged by app during startup
+    are kept as well.
+
+    Usage:
+        with LogcatStream('./output/logcat.txt', tee=True, hold_until_watch=True) as logcat:
+            utils.start_app(app_name)
+            utils.wait_until_app_launch(app_name)
+            logcat.watch_app(app_name)
+            utils.wait_until_app_exit(app_name)
+    """
+
+    def __init__(self, output_filepath=None, tags=DEFAULT_TAGS, tee=False, max_bytes=16 << 20, backup_count=5,
+                 hold_until_watch=False):
+        self.output_filepath = output_filepath
+        self.tags = set(tags or [])
+        self.tee = tee
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.callbacks = []
+        self.line_count = 0
+        self._pids = set()
+        self._held_lines = [] if hold_until_watch else None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._proc = None
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+        if exc_type is None:
+            self.show_summary()
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def watch_app(self, app_name):
+        """Keep all lines logged by running processes of app_name, including held ones."""
+        pids = utils.get_app_pids(app_name)
+        with self._lock:
+            self._pids.update(pids)
+            self._release_held_lines()
+
+    def _release_held_lines(self):
+        """Queue wanted lines of held ones in order and stop holding lines, the lock should be acquired."""
+        if self._held_lines is None:
+            return
+
+        for line in self._held_lines:
+            if self.is_wanted(line):
+                self._queue.put(line)
+        self._held_lines = None
+
+    def is_wanted(self, line):
+        log_line = parse_line(line)
+        return log_line is not None and (log_line.tag in self.tags or log_line.pid in self._pids)
+
+    def start(self):
+        # Only stream logs since now, instead of dumping whole log buffer first.
+        device_time = utils.adb_exec('shell date +%s').strip()
+        self._proc = utils.adb_popen(['logcat', '-v', 'threadtime', '-T', f'{device_time}.000'], stdin=sp.DEVNULL)
+        self._file = None
+        if self.output_filepath:
+            self._file = RotatingFile(self.output_filepath, self.max_bytes, self.backup_count)
+        self._threads = [
+            threading.Thread(target=self._read_lines, daemon=True),
+            threading.Thread(target=self._write_lines, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        if not self._proc:
+            return
+
+        # Wait a moment for lines logged right before stop.
+        time.sleep(_DRAIN_DELAY)
+        self._proc.terminate()
+        self._proc.wait()
+        for thread in self._threads:
+            thread.join()
+        if self._file:
+            self._file.close()
+        self._proc = None
+
+    def _read_lines(self):
+        for line in self._proc.stdout:
+            line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            with self._lock:
+                if self._held_lines is not None:
+                    self._held_lines.append(line)
+                    if len(self._held_lines) >= _MAX_HELD_LINES:
+                        utils.log_warning('Too many log lines before app is watched, filter them by tags.')
+                        self._release_held_lines()
+                    continue
+
+            if self.is_wanted(line):
+                self._queue.put(line)
+
+        with self._lock:
+            self._release_held_lines()
+        self._queue.put(None)
+
+    def _write_lines(self):
+        is_done = False
+        while not is_done:
+            lines = [self._queue.get()]
+            # Drain pending lines to write them in one batch.
+            while len(lines) < _BATCH_SIZE:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if lines[-1] is None:
+                lines.pop()
+                is_done = True
+            if not lines:
+                continue
+
+            self.line_count += len(lines)
+            if self._file:
+                self._file.write('\n'.join(lines) + '\n')
+                self._file.flush()
+
+            for line in lines:
+                if self.tee:
+                    click.echo(line)
+                for callback in self.callbacks:
+                    callback(line)
+
+    def show_summary(self):
+        if self.line_count and self.output_filepath:
+            click.echo(f'{self.line_count} log lines are written to {self.output_filepath}')
@@ -0,0 +1,255 @@
+"""Background pipeline of pulling artifacts from device and post-processing them on host.
+
+Artifacts are pulled one at a time by a pull thread, since transfers share one adb connection.
+Once an artifact is on host, its post-processing steps (ex. hashing into store, indexing traces)
+run in a worker pool, so they overlap pulls of later artifacts and next jobs on device.
+FolderStreamer feeds the pipeline with files of a folder on device as soon as they're written.
+"""
+
+import click
+import concurrent.futures
+import os
+import subprocess as sp
+import threading
+
+import vk.gfxr as gfxr
+import vk.utils as utils
+
+from vk.store import get_blob_store
+
+
+def store_artifact(local_path):
+    """Post-processing step to move file or folder into blob store for de-duplication."""
+    blob_store = get_blob_store()
+    if os.path.isdir(local_path):
+        blob_store.add_folder(local_path)
+    else:
+        blob_store.add_file(local_path)
+
+
+def index_trace(local_path):
+    """Post-processing step to build frame index of trace file for later trimming and seeking."""
+    try:
+        gfxr.get_frame_index(local_path)
+    except gfxr.GfxrFormatError as e:
+        # Trace of killed app is truncated, it's still pulled as is.
+        utils.log_warning(f'Failed to index {local_path}: {e}')
+
+
+def add_group_callback(futures, callback):
+    """Call callback(futures) once all futures are done, immediately if futures is empty."""
+    futures = list(futures)
+    lock = threading.Lock()
+    remaining_count = len(futures)
+
+    def on_done(_):
+        nonlocal remaining_count
+        with lock:
+            remaining_count -= 1
+            is_last = remaining_count == 0
+        if is_last:
+            callback(futures)
+
+    if not futures:
+        callback(futures)
+    for future in futures:
+        future.add_done_callback(on_done)
+
+
+class ArtifactPipeline:
+    """Pull artifacts in a background thread and post-process them in a worker pool.
+
+    Usage:
+        with ArtifactPipeline() as pipeline:
+            pipeline.submit(trace_path_on_device, local_filepath, steps=[store_artifact], remove=False)
+            ...  # Device is free for next job here.
+        # All artifacts are pulled and post-processed on exit, failures are logged.
+    """
+
+    def __init__(self, max_workers=None):
+        self._pull_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._post_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def submit(self, path_on_device, local_path, is_folder=False, steps=(), remove=True, size=None):
+        """Queue artifact to pull from path_on_device to local_path.
+
+        Args:
+            is_folder: Whether the artifact is a folder, local_path is the pulled folder itself.
+            steps: Post-processing functions called with local_path in order.
+            remove: Remove the artifact on device after it's pulled.
+            size: Expected size of file, the artifact is not removed on device if pulled size differs.
+
+        Returns:
+            Future resolved with local_path once the artifact is pulled and post-processed.
+        """
+        future = concurrent.futures.Future()
+        self._futures.append((path_on_device, future))
+        self._pull_executor.submit(self._pull, future, path_on_device, local_path, is_folder, list(steps), remove,
+                                   size)
+        return future
+
+    def _pull(self, future, path_on_device, local_path, is_folder, steps, remove, size):
+        try:
+            folder_path = os.path.dirname(local_path)
+            if folder_path:
+                os.makedirs(folder_path, exist_ok=True)
+
+            utils.adb_pull(path_on_device, local_path)
+            if size is not None and os.path.getsize(local_path) != size:
+                raise RuntimeError(f'Size of pulled {local_path} is {os.path.getsize(local_path)}, expected {size}')
+            if remove and is_folder:
+                utils.delete_dir(path_on_device)
+            elif remove:
+                utils.adb_exec(f'shell rm -f {path_on_device}')
+        except Exception as e:
+            # Any error should resolve future, otherwise waiting for it blocks forever.
+            future.set_exception(e)
+            return
+
+        self._post_executor.submit(self._post_process, future, local_path, steps)
+
+    def _post_process(self, future, local_path, steps):
+        try:
+            for step in steps:
+                step(local_path)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(local_path)
+
+    def wait(self):
+        """Wait until all artifacts are done.
+
+        Returns:
+            List of (path_on_device, exception) of failed artifacts.
+        """
+        failures = []
+        for path_on_device, future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                failures.append((path_on_device, e))
+        return failures
+
+    def close(self):
+        for path_on_device, e in self.wait():
+            utils.log_error(f'Failed to process {path_on_device}: {e}')
+
+        self._futures = []
+        self._pull_executor.shutdown()
+        self._post_executor.shutdown()
+
+
+_LISTING_END = '--'
+
+
+def _get_listing_script(folder_on_device):
+    return (f'for f in {folder_on_device}/*; do [ -f "$f" ] && echo "$(stat -c %s "$f") $f"; done; '
+            f'echo {_LISTING_END}')
+
+
+def parse_listing_line(line):
+    """Parse line of '<size> <path>' to (path, size), or return None if it's malformed."""
+    size, sep, path = line.rstrip('\r\n').partition(' ')
+    if not sep or not size.isdigit():
+        return None
+    return path, int(size)
+
+
+class FolderStreamer:
+    """Pull files written to folder on device while the writer is still running.
+
+    A file is finished once its size is non-zero and unchanged in two consecutive listings, and a
+    newer file has appeared. The writer writes files one after another, so the newest file might be
+    still written after a stall. Each finished file is submitted to pipeline and removed on device
+    after its pulled size is verified, so files don't pile up on device. Remaining files are pulled
+    on stop, the writer should have exited then.
+
+    Usage:
+        with ArtifactPipeline() as pipeline:
+            with FolderStreamer(pipeline, folder_on_device, local_folder):
+                utils.wait_until_app_exit(app_name)
+    """
+
+    def __init__(self, pipeline, folder_on_device, local_folder, interval=0.5, steps=()):
+        self.pipeline = pipeline
+        self.folder_on_device = folder_on_device
+        self.local_folder = local_folder
+        self.interval = interval
+        self.steps = list(steps)
+
+        self.futures = {}
+        self._sizes = {}
+        # Index of listing where each file is first seen.
+        self._first_seen = {}
+        self._listing_count = 0
+        self._proc = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    def start(self):
+        script = f'while true; do {_get_listing_script(self.folder_on_device)}; sleep {self.interval}; done'
+        self._proc = utils.adb_popen(['shell', script], stdin=sp.DEVNULL)
+        self._thread = threading.Thread(target=self._read_listings, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._proc:
+            return
+
+        self._proc.terminate()
+        self._proc.wait()
+        self._thread.join()
+        self._proc = None
+
+        proc = utils.adb_popen(['shell', _get_listing_script(self.folder_on_device)], stdin=sp.DEVNULL)
+        output, _ = proc.communicate()
+        listing = dict(filter(None, map(parse_listing_line, output.decode('utf-8', errors='replace').splitlines())))
+        self.add_listing(listing, is_final=True)
+        click.echo(f'{len(self.futures)} files of {self.folder_on_device} are pulled to {self.local_folder}')
+
+    def _read_listings(self):
+        listing = {}
+        for line in self._proc.stdout:
+            line = line.decode('utf-8', errors='replace')
+            if line.strip() == _LISTING_END:
+                self.add_listing(listing)
+                listing = {}
+            elif item := parse_listing_line(line):
+                listing[item[0]] = item[1]
+
+    def add_listing(self, listing, is_final=False):
+        """Submit finished files of listing {path: size}, and return list of submitted paths."""
+        self._listing_count += 1
+        for path in listing:
+            self._first_seen.setdefault(path, self._listing_count)
+        newest_listing_idx = max(self._first_seen.values(), default=0)
+
+        submitted_paths = []
+        for path, size in listing.items():
+            if path in self.futures:
+                continue
+            if is_final or (size and self._sizes.get(path) == size and self._first_seen[path] < newest_listing_idx):
+                local_path = os.path.join(self.local_folder, os.path.basename(path))
+                self.futures[path] = self.pipeline.submit(path, local_path, steps=self.steps, size=size)
+                submitted_paths.append(path)
+
+        self._sizes = listing
+        return submitted_paths
+
+    def get_failed_paths(self):
+        """Return paths on device of files failed to pull, it blocks until all files are done."""
+        return [path for path, future in self.futures.items() if future.exception()]
@@ -0,0 +1,227 @@
+"""Background sampler of device thermal, clock and power nodes.
+
+Nodes are probed once, then one persistent device shell reads them with shell builtins at a fixed
+interval, so sampling costs one lightweight loop on device. Samples are streamed to a CSV file.
+"""
+
+import click
+import csv
+import json
+import os
+import subprocess as sp
+import threading
+import time
+
+import vk.utils as utils
+
+_PROBE_SCRIPT = '''
+for z in /sys/class/thermal/thermal_zone*; do
+    [ -r $z/temp ] && echo "temp $z/temp $(cat $z/type)"
+done
+for p in /sys/devices/system/cpu/cpufreq/policy*; do
+    [ -r $p/scaling_cur_freq ] && echo "cpu_freq $p/scaling_cur_freq ${p##*/}"
+    [ -r $p/scaling_max_freq ] && echo "cpu_max_freq $p/scaling_max_freq ${p##*/}"
+done
+for d in /sys/class/devfreq/*; do
+    case ${d##*/} in *gpu*|*mali*|*kgsl*)
+        [ -r $d/cur_freq ] && echo "gpu_freq $d/cur_freq ${d##*/}"
+        [ -r $d/max_freq ] && echo "gpu_max_freq $d/max_freq ${d##*/}";;
+    esac
+done
+[ -r /sys/class/power_supply/battery/current_now ] && echo "battery_current /sys/class/power_supply/battery/current_now battery"
+'''
+
+# Divisor to convert raw node value of each kind to display unit.
+_UNITS = {
+    'temp': ('C', None),        # Millidegree or degree Celsius, see _convert().
+    'cpu_freq': ('MHz', 1e3),   # kHz
+    'cpu_max_freq': ('MHz', 1e3),
+    'gpu_freq': ('MHz', 1e6),   # Hz
+    'gpu_max_freq': ('MHz', 1e6),
+    'battery_current': ('mA', 1e3),  # uA
+}
+
+_MAX_FREQ_KINDS = ('cpu_max_freq', 'gpu_max_freq')
+
+
+def _convert(kind, raw_value):
+    try:
+        value = int(raw_value)
+    except ValueError:
+        return None
+
+    if kind == 'temp':
+        return value / 1000.0 if abs(value) >= 1000 else float(value)
+    return value / _UNITS[kind][1]
+
+
+def probe_nodes():
+    """Return list of (kind, node_path, column_name) readable on device."""
+    proc = utils.adb_popen(['shell', _PROBE_SCRIPT])
+    output, _ = proc.communicate()
+
+    nodes = []
+    column_names = set()
+    for line in output.decode('utf-8', errors='replace').splitlines():
+        tokens = line.split(maxsplit=2)
+        if len(tokens) != 3 or tokens[0] not in _UNITS:
+            continue
+
+        kind, path, name = tokens
+        column_name = f'{kind}:{name}' if kind != 'battery_current' else kind
+        suffix = 1
+        while column_name in column_names:
+            suffix += 1
+            column_name = f'{kind}:{name}#{suffix}'
+        column_names.add(column_name)
+        nodes.append((kind, path, column_name))
+    return nodes
+
+
+class _ColumnStats:
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        # Throttling is detected by the drop of frequency cap below its peak.
+        self.throttle_events = 0
+        self.throttled_samples = 0
+        self.is_throttled = False
+
+    def add(self, value):
+        if self.kind in _MAX_FREQ_KINDS and self.max is not None:
+            is_throttled = value < self.max
+            if is_throttled and not self.is_throttled:
+                self.throttle_events += 1
+            self.throttled_samples += int(is_throttled)
+            self.is_throttled = is_throttled
+
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        result = {
+            'unit': _UNITS[self.kind][0],
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+        }
+        if self.kind in _MAX_FREQ_KINDS:
+            result['throttle_events'] = self.throttle_events
+            result['throttled_samples'] = self.throttled_samples
+        return result
+
+
+class DeviceSampler:
+    """Sample device nodes in background and write time series to <output_folder>/<name>_<time>.csv.
+
+    Usage:
+        with DeviceSampler(output_folder, interval=0.5):
+            utils.wait_until_app_exit(app_name)
+    """
+
+    def __init__(self, output_folder, interval=1.0, name='device_samples'):
+        self.interval = interval
+        time_str = utils.get_time_str()
+        self.csv_filepath = os.path.join(output_folder, f'{name}_{time_str}.csv')
+        self.summary_filepath = os.path.join(output_folder, f'{name}_{time_str}.summary.json')
+        self.nodes = []
+        self.column_stats = {}
+        self.sample_count = 0
+        self._proc = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+        if exc_type is None:
+            self.show_summary()
+
+    def start(self):
+        self.nodes = probe_nodes()
+        if not self.nodes:
+            utils.log_warning('Can not find readable thermal/clock/power nodes on device, skip sampling.')
+            return
+
+        self.column_stats = {name: _ColumnStats(kind) for kind, _, name in self.nodes}
+        paths = ' '.join(path for _, path, _ in self.nodes)
+        script = (f'while true; do for f in {paths}; do v=; read v < $f; echo "$v"; done 2>/dev/null; '
+                  f'echo ---; sleep {self.interval}; done')
+
+        folder_path = os.path.dirname(self.csv_filepath)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+
+        self._proc = utils.adb_popen(['shell', script], stdin=sp.DEVNULL)
+        self._thread = threading.Thread(target=self._read_samples, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._proc:
+            return
+
+        self._proc.terminate()
+        self._proc.wait()
+        self._thread.join()
+        self._proc = None
+
+    def _read_samples(self):
+        start_time = time.monotonic()
+        values = []
+
+        with open(self.csv_filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time'] + [name for _, _, name in self.nodes])
+
+            for line in self._proc.stdout:
+                line = line.decode('utf-8', errors='replace').strip()
+                if line != '---':
+                    values.append(line)
+                    continue
+
+                if len(values) == len(self.nodes):
+                    row = [f'{time.monotonic() - start_time:.3f}']
+                    for (kind, _, name), raw_value in zip(self.nodes, values):
+                        value = _convert(kind, raw_value)
+                        if value is not None:
+                            self.column_stats[name].add(value)
+                        row.append('' if value is None else f'{value:g}')
+                    writer.writerow(row)
+                    self.sample_count += 1
+                values = []
+
+    def get_summary(self):
+        return {
+            'interval': self.interval,
+            'sample_count': self.sample_count,
+            'columns': {name: stats.to_dict() for name, stats in self.column_stats.items() if stats.count},
+        }
+
+    def show_summary(self):
+        if not self.nodes:
+            return
+
+        summary = self.get_summary()
+        with open(self.summary_filepath, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        columns = summary['columns']
+        temps = [x['max'] for name, x in columns.items() if name.startswith('temp:')]
+        click.echo(f'Device samples ({self.sample_count}) are written to {self.csv_filepath}')
+        if temps:
+            click.echo(f'  Max temperature: {max(temps):.1f}C')
+
+        for name, x in columns.items():
+            if name.startswith(('cpu_freq:', 'gpu_freq:')):
+                click.echo(f'  {name}: mean {x["mean"]:.0f} MHz, max {x["max"]:.0f} MHz')
+            elif name.startswith(_MAX_FREQ_KINDS) and x['throttle_events']:
+                utils.log_warning(f'{name} is throttled {x["throttle_events"]} times '
+                                  f'({x["throttled_samples"]} samples), max {x["max"]:.0f} MHz, min {x["min"]:.0f} MHz')
@@ -0,0 +1,281 @@
+"""Crash-safe snapshot and restore of device states changed by layer sessions.
+
+Original values of all states are read in one adb round trip and written to a journal file on host
+before anything is changed. On exit, states are restored by one batched shell script which only
+writes values differing from the original ones, then the journal is deleted. If vkcli is killed
+before that, `vk recover` (or the next session of the same kind on the device) restores states
+from the journal left behind.
+"""
+
+import json
+import os
+import re
+import shlex
+import sys
+
+from pkg_resources import resource_filename
+
+import vk.utils as utils
+
+PROP = 'prop'
+SETTING = 'setting'
+SYSFS = 'sysfs'
+
+ENABLE_GPU_DEBUG_LAYERS = (SETTING, 'enable_gpu_debug_layers')
+GPU_DEBUG_APP = (SETTING, 'gpu_debug_app')
+GPU_DEBUG_LAYERS = (SETTING, 'gpu_debug_layers')
+DEBUG_VULKAN_LAYERS = (PROP, 'debug.vulkan.layers')
+LAYER_STATE_KEYS = (ENABLE_GPU_DEBUG_LAYERS, GPU_DEBUG_APP, GPU_DEBUG_LAYERS, DEBUG_VULKAN_LAYERS)
+
+# Value of `settings get` for a setting which is not set.
+_NULL_SETTING = 'null'
+
+
+def _get_read_command(key):
+    kind, name = key
+    if kind == PROP:
+        return f'getprop {name}'
+    elif kind == SETTING:
+        return f'settings get global {name}'
+    elif kind == SYSFS:
+        return f'cat {name} 2>/dev/null'
+    raise ValueError(f'Unknown state kind: {kind}')
+
+
+def _get_write_command(key, value):
+    kind, name = key
+    quoted_value = shlex.quote(value or '')
+    if kind == PROP:
+        return f'setprop {name} {quoted_value}'
+    elif kind == SETTING:
+        if value is None or value == _NULL_SETTING:
+            return f'settings delete global {name} >/dev/null'
+        return f'settings put global {name} {quoted_value}'
+    elif kind == SYSFS:
+        return f'echo {quoted_value} > {name}'
+    raise ValueError(f'Unknown state kind: {kind}')
+
+
+def _run_script(script, root=False):
+    """Run shell script on device in one adb call, the script is passed as one argument."""
+    if root:
+        script = f'su 0 sh -c {shlex.quote(script)}'
+    proc = utils.adb_popen(['shell', script])
+    output, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f'Execution failure [exit status: {proc.returncode}]: adb shell {script}')
+    return output.decode('utf-8', errors='replace')
+
+
+def read_states(keys, root=False):
+    """Read values of state keys in one round trip.
+
+    Returns:
+        Dict of key to value string.
+    """
+    keys = list(keys)
+    script = '; '.join(f'echo "{idx}:$({_get_read_command(key)})"' for idx, key in enumerate(keys))
+
+    values = {}
+    for line in _run_script(script, root).splitlines():
+        idx, sep, value = line.rstrip('\r').partition(':')
+        if sep and idx.isdigit() and int(idx) < len(keys):
+            values[keys[int(idx)]] = value
+    return values
+
+
+def write_states(values, only_changed=False, root=False):
+    """Write values of state keys in one round trip.
+
+    Sysfs nodes are written twice, since limits like min/max frequencies reject a value crossing
+    the other limit until the other one is written.
+
+    Args:
+        values: Dict of key to value. None value of setting deletes the setting.
+        only_changed: Only write values differing from current ones on device.
+    """
+    commands = []
+    for key, value in values.items():
+        command = _get_write_command(key, value)
+        if only_changed:
+            expected_value = _NULL_SETTING if key[0] == SETTING and not value else (value or '')
+            command = f'[ "$({_get_read_command(key)})" = {shlex.quote(expected_value)} ] || {command}'
+        commands.append(command)
+    commands += [x for key, x in zip(values, list(commands)) if key[0] == SYSFS]
+
+    if commands:
+        # Failed writes (ex. sysfs nodes rejecting values) don't fail the rest of script.
+        _run_script('; '.join(commands + ['true']), root)
+
+
+def get_device_serial():
+    return utils.adb_exec('get-serialno')
+
+
+def get_journal_folder():
+    return resource_filename('vk', 'data/sessions')
+
+
+def get_journal_filepath(serial, name):
+    # Serial of network device is like '192.168.0.2:5555', which is not a valid filename on Windows.
+    serial = re.sub(r'[^\w.-]', '_', serial)
+    return os.path.join(get_journal_folder(), f'{serial}.{name}.json')
+
+
+def load_journal(serial, name):
+    """Load journal of session name on device, or return None if there is none."""
+    filepath = get_journal_filepath(serial, name)
+    if not os.path.exists(filepath):
+        return None
+
+    with open(filepath) as f:
+        data = json.load(f)
+    data['states'] = {(kind, name): value for kind, name, value in data['states']}
+    return data
+
+
+def get_journal_names(serial):
+    """Return names of sessions which have journals on device."""
+    prefix = os.path.basename(get_journal_filepath(serial, ''))[:-len('.json')]
+    folder_path = get_journal_folder()
+    if not os.path.exists(folder_path):
+        return []
+    return sorted(x[len(prefix):-len('.json')] for x in os.listdir(folder_path)
+                  if x.startswith(prefix) and x.endswith('.json'))
+
+
+def recover(serial=None, name=None):
+    """Restore device states from journals of unfinished sessions.
+
+    Args:
+        serial: Serial of device, default is the connected device.
+        name: Only restore journal of session name, default is all sessions.
+
+    Returns:
+        List of journal data of restored sessions.
+    """
+    serial = serial or get_device_serial()
+    journals = []
+    for journal_name in ([name] if name else get_journal_names(serial)):
+        journal = load_journal(serial, journal_name)
+        if journal is None:
+            continue
+
+        write_states(journal['states'], only_changed=True, root=journal.get('root', False))
+        os.remove(get_journal_filepath(serial, journal_name))
+        journals.append(journal)
+    return journals
+
+
+class StateSession:
+    """Snapshot device states of keys on enter, and restore states changed by set_states on exit.
+
+    If root is set, states are read and written with root access. A journal of original states is
+    kept on host until the session exits. Journal of session with the same name left by a killed
+    process is restored on enter.
+    """
+
+    name = 'states'
+
+    def __init__(self, keys=(), root=False):
+        self.keys = list(keys)
+        self.root = root
+        self.original_states = {}
+        self.changed_keys = set()
+        self.serial = None
+
+    def __enter__(self):
+        self.serial = get_device_serial()
+        for journal in recover(self.serial, self.name):
+            utils.log_warning(f'Restored device states left by unfinished session: {" ".join(journal["command"])}')
+
+        self.original_states = read_states(self.keys, self.root)
+        self._write_journal()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.restore()
+
+    def _write_journal(self, persistent=False):
+        filepath = get_journal_filepath(self.serial, self.name)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        data = {
+            'serial': self.serial,
+            'time': utils.get_time_str(),
+            'command': [os.path.basename(sys.argv[0])] + sys.argv[1:],
+            'root': self.root,
+            'persistent': persistent,
+            'states': [[kind, name, value] for (kind, name), value in self.original_states.items()],
+        }
+
+        # Replace journal atomically, a half-written journal can't be recovered.
+        tmp_filepath = f'{filepath}.tmp'
+        with open(tmp_filepath, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_filepath, filepath)
+
+    def get_original_state(self, key):
+        return self.original_states.get(key)
+
+    def set_states(self, values):
+        """Write values of state keys in one round trip, keys should be given in constructor."""
+        unknown_keys = [x for x in values if x not in self.original_states]
+        if unknown_keys:
+            raise ValueError(f'States are not in snapshot of session: {unknown_keys}')
+
+        write_states(values, root=self.root)
+        self.changed_keys.update(values)
+
+    def keep(self):
+        """Keep changed states after exit, they are restored by `vk recover` later."""
+        if self.serial is None:
+            return
+
+        self._write_journal(persistent=True)
+        self.changed_keys.clear()
+        self.serial = None
+
+    def restore(self):
+        if self.serial is None:
+            return
+
+        values = {key: self.original_states[key] for key in self.changed_keys}
+        write_states(values, only_changed=True, root=self.root)
+        os.remove(get_journal_filepath(self.serial, self.name))
+        self.changed_keys.clear()
+        self.serial = None
+
+
+class LayerSession(StateSession):
+    """Snapshot and restore layer states of device, and other states given by extra_keys.
+
+    Usage:
+        with LayerSession(extra_keys=[(session.PROP, 'debug.vvl.enables')]) as s:
+            s.enable_layers(app_name, ['VK_LAYER_KHRONOS_validation'])
+            s.set_states({(session.PROP, 'debug.vvl.enables'): 'VK_VALIDATION_FEATURE_ENABLE_...'})
+
+    Only states changed through this session are restored on exit.
+    """
+
+    name = 'layers'
+
+    def __init__(self, extra_keys=()):
+        super().__init__(list(LAYER_STATE_KEYS) + [x for x in extra_keys if x not in LAYER_STATE_KEYS])
+
+    def get_original_layers(self, key):
+        """Return list of layer names of original DEBUG_VULKAN_LAYERS or GPU_DEBUG_LAYERS."""
+        value = self.original_states.get(key)
+        return [] if value in (None, '', _NULL_SETTING) else value.split(':')
+
+    def get_original_app_name(self):
+        value = self.original_states.get(GPU_DEBUG_APP)
+        return None if value in (None, '', _NULL_SETTING) else value
+
+    def enable_layers(self, app_name=None, app_layers=(), global_layers=()):
+        """Enable app_layers for app_name and global_layers for all apps."""
+        self.set_states({
+            ENABLE_GPU_DEBUG_LAYERS: '1',
+            GPU_DEBUG_APP: app_name,
+            GPU_DEBUG_LAYERS: ':'.join(app_layers) if app_name else None,
+            DEBUG_VULKAN_LAYERS: ':'.join(global_layers),
+        })
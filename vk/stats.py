@@ -0,0 +1,151 @@
+"""Statistics of replay measurements."""
+
+import json
+import math
+import statistics
+
+# Two-sided 95% critical values of Student's t-distribution for 1-30 degrees of freedom.
+_T_CRITICAL_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+_Z_CRITICAL_95 = 1.960
+
+
+def load_fps_measurement(filepath):
+    """Load measurement file written by gfxrecon-replay --measurement-file.
+
+    Returns:
+        Dict of 'fps', 'frame_count', 'duration' (seconds) and 'frame_time_ms'.
+
+    Raises:
+        ValueError: If FPS is not found in the file.
+    """
+    with open(filepath) as f:
+        data = json.load(f)
+
+    frame_range = data.get('frame_range', data)
+    fps = frame_range.get('fps')
+    if fps is None:
+        raise ValueError(f'Can not find FPS in {filepath}')
+
+    frame_count = frame_range.get('frame_count')
+    duration = frame_range.get('duration')
+    if duration and frame_count:
+        frame_time_ms = duration * 1000.0 / frame_count
+    else:
+        frame_time_ms = 1000.0 / fps if fps else math.inf
+
+    return {
+        'fps': float(fps),
+        'frame_count': frame_count,
+        'duration': duration,
+        'frame_time_ms': frame_time_ms,
+    }
+
+
+def percentile(sorted_values, p):
+    """Return p-th percentile (0-100) of sorted_values with linear interpolation."""
+    if not sorted_values:
+        return math.nan
+
+    pos = (len(sorted_values) - 1) * p / 100.0
+    lower = math.floor(pos)
+    upper = math.ceil(pos)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+def t_critical_95(dof):
+    """Return two-sided 95% critical value of t-distribution with dof degrees of freedom."""
+    if dof < 1:
+        return math.nan
+    if dof <= len(_T_CRITICAL_95):
+        return _T_CRITICAL_95[dof - 1]
+    return _Z_CRITICAL_95
+
+
+def summarize(values):
+    """Return descriptive statistics and 95% confidence interval of mean of values."""
+    sorted_values = sorted(values)
+    count = len(sorted_values)
+    mean = statistics.fmean(sorted_values) if count else math.nan
+    stdev = statistics.stdev(sorted_values) if count > 1 else 0.0
+    margin = t_critical_95(count - 1) * stdev / math.sqrt(count) if count > 1 else math.nan
+
+    return {
+        'count': count,
+        'mean': mean,
+        'median': percentile(sorted_values, 50),
+        'min': sorted_values[0] if count else math.nan,
+        'max': sorted_values[-1] if count else math.nan,
+        'p5': percentile(sorted_values, 5),
+        'p95': percentile(sorted_values, 95),
+        'stdev': stdev,
+        'ci95_low': mean - margin,
+        'ci95_high': mean + margin,
+    }
+
+
+def to_json_value(obj):
+    """Return copy of obj with NaN and infinity replaced by None, since they're invalid in strict JSON."""
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    if isinstance(obj, dict):
+        return {key: to_json_value(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_json_value(x) for x in obj]
+    return obj
+
+
+def rank(values):
+    """Return 1-based ranks of values, ties get the average rank."""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        avg_rank = (i + j) / 2.0 + 1.0
+        for k in range(i, j + 1):
+            ranks[order[k]] = avg_rank
+        i = j + 1
+    return ranks
+
+
+def mann_whitney_u(samples_a, samples_b):
+    """Two-sided Mann-Whitney U test with normal approximation and tie correction.
+
+    Returns:
+        Tuple of (U statistic of samples_a, p-value).
+    """
+    n_a = len(samples_a)
+    n_b = len(samples_b)
+    if not n_a or not n_b:
+        return math.nan, math.nan
+
+    combined = list(samples_a) + list(samples_b)
+    ranks = rank(combined)
+    u_a = sum(ranks[:n_a]) - n_a * (n_a + 1) / 2.0
+
+    n = n_a + n_b
+    tie_sum = sum(t ** 3 - t for t in _count_ties(combined))
+    variance = n_a * n_b / 12.0 * ((n + 1) - tie_sum / (n * (n - 1)))
+    if variance <= 0:
+        return u_a, 1.0
+
+    mean_u = n_a * n_b / 2.0
+    # Continuity correction.
+    z = (abs(u_a - mean_u) - 0.5) / math.sqrt(variance)
+    p = 2.0 * (1.0 - statistics.NormalDist().cdf(max(z, 0.0)))
+    return u_a, min(p, 1.0)
+
+
+def _count_ties(values):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return [x for x in counts.values() if x > 1]
@@ -0,0 +1,201 @@
+"""Content-addressed store for files pulled from device.
+
+Each blob is keyed by its SHA-256 digest and kept read-only in <store_folder>/objects/<xx>/<digest>.
+Requested destinations are hardlinks (or reflinks/copies across file systems) of blobs, so the
+same trace pulled to different folders occupies disk space only once. Blobs with reflinked or copied
+destinations are pinned in <store_folder>/pins, since their link counts don't tell whether they're
+still used.
+"""
+
+import click
+import errno
+import hashlib
+import os
+import shutil
+import stat
+import sys
+import uuid
+
+import vk.config as config
+import vk.utils as utils
+
+_HASH_CHUNK_SIZE = 1 << 20
+_FICLONE = 0x40049409   # Linux ioctl to create reflink.
+
+
+def hash_file(filepath):
+    """Return SHA-256 hex digest of filepath."""
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _reflink(src_filepath, dst_filepath):
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, 'reflink is not supported')
+
+    import fcntl
+    with open(src_filepath, 'rb') as src, open(dst_filepath, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(dst_filepath)
+            raise
+
+
+def remove_file(filepath):
+    """Remove file, which could be a read-only link of blob."""
+    try:
+        os.remove(filepath)
+    except PermissionError:
+        os.chmod(filepath, stat.S_IWUSR | stat.S_IRUSR)
+        os.remove(filepath)
+
+
+def _link_or_copy(src_filepath, dst_filepath):
+    """Create dst_filepath sharing content with src_filepath in the cheapest way.
+
+    Returns:
+        True if dst_filepath is a hardlink of src_filepath.
+    """
+    try:
+        os.link(src_filepath, dst_filepath)
+        return True
+    except OSError:
+        pass
+
+    try:
+        _reflink(src_filepath, dst_filepath)
+    except OSError:
+        shutil.copyfile(src_filepath, dst_filepath)
+    return False
+
+
+class BlobStore:
+
+    def __init__(self, root_folder):
+        self.root_folder = root_folder
+        self.object_folder = os.path.join(root_folder, 'objects')
+        self.tmp_folder = os.path.join(root_folder, 'tmp')
+        self.pin_folder = os.path.join(root_folder, 'pins')
+
+    def get_blob_path(self, digest):
+        return os.path.join(self.object_folder, digest[:2], digest)
+
+    def get_pin_path(self, digest):
+        return os.path.join(self.pin_folder, digest)
+
+    def has(self, digest):
+        return os.path.exists(self.get_blob_path(digest))
+
+    def iter_blob_paths(self):
+        if not os.path.exists(self.object_folder):
+            return
+
+        for root, _, files in os.walk(self.object_folder):
+            for filename in files:
+                yield os.path.join(root, filename)
+
+    def _ingest(self, filepath, digest):
+        """Move filepath into store as blob of digest."""
+        blob_path = self.get_blob_path(digest)
+        if os.path.exists(blob_path):
+            remove_file(filepath)
+            return
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.chmod(filepath, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(filepath, blob_path)
+
+    def link_to(self, digest, dst_filepath):
+        """Create dst_filepath from blob of digest, existing dst_filepath is replaced."""
+        if os.path.lexists(dst_filepath):
+            remove_file(dst_filepath)
+
+        dst_folder = os.path.dirname(dst_filepath)
+        if dst_folder:
+            os.makedirs(dst_folder, exist_ok=True)
+        if not _link_or_copy(self.get_blob_path(digest), dst_filepath):
+            # Link count of blob is unchanged, pin it so prune doesn't remove blob still in use.
+            os.makedirs(self.pin_folder, exist_ok=True)
+            open(self.get_pin_path(digest), 'w').close()
+
+    def add_file(self, filepath):
+        """Move local file into store and replace it with a link to the blob.
+
+        Returns:
+            Digest of the file.
+        """
+        digest = hash_file(filepath)
+        os.makedirs(self.tmp_folder, exist_ok=True)
+        tmp_filepath = os.path.join(self.tmp_folder, uuid.uuid4().hex)
+        shutil.move(filepath, tmp_filepath)
+        self._ingest(tmp_filepath, digest)
+        self.link_to(digest, filepath)
+        return digest
+
+    def add_folder(self, folder_path):
+        """Add all files under folder_path into store."""
+        for root, _, files in os.walk(folder_path):
+            for filename in files:
+                self.add_file(os.path.join(root, filename))
+
+    def pull(self, src_filepath_on_device, dst_filepath):
+        """Pull file from device through the store.
+
+        The transfer is skipped when the digest of file on device is already in store.
+
+        Returns:
+            Tuple of (digest, is_transferred).
+
+        Raises:
+            RuntimeError: If failed to execute adb commands or the pulled file is corrupted.
+        """
+        device_digest = utils.get_device_file_hash(src_filepath_on_device)
+        if device_digest and self.has(device_digest):
+            if utils.is_verbose():
+                click.echo(f'Found {device_digest[:12]} in store, skip transfer of {src_filepath_on_device}')
+            self.link_to(device_digest, dst_filepath)
+            return device_digest, False
+
+        os.makedirs(self.tmp_folder, exist_ok=True)
+        tmp_filepath = os.path.join(self.tmp_folder, uuid.uuid4().hex)
+        try:
+            utils.adb_pull(src_filepath_on_device, tmp_filepath)
+            digest = hash_file(tmp_filepath)
+            if device_digest and digest != device_digest:
+                raise RuntimeError(f'Hash mismatch of {src_filepath_on_device}: '
+                                   f'{digest} (host) != {device_digest} (device)')
+            self._ingest(tmp_filepath, digest)
+        finally:
+            if os.path.exists(tmp_filepath):
+                remove_file(tmp_filepath)
+
+        self.link_to(digest, dst_filepath)
+        return digest, True
+
+    def prune(self):
+        """Remove blobs which are not linked from anywhere.
+
+        Pinned blobs are kept, since their reflinked or copied destinations can't be tracked.
+
+        Returns:
+            Tuple of (removed blob count, freed bytes).
+        """
+        removed_count = 0
+        freed_size = 0
+        for blob_path in list(self.iter_blob_paths()):
+            st = os.stat(blob_path)
+            if st.st_nlink == 1 and not os.path.exists(self.get_pin_path(os.path.basename(blob_path))):
+                remove_file(blob_path)
+                removed_count += 1
+                freed_size += st.st_size
+        return removed_count, freed_size
+
+
+def get_blob_store():
+    """Return BlobStore located at folder from settings."""
+    return BlobStore(config.get_store_folder())
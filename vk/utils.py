@@ -1,10 +1,13 @@
 import click
+import collections
 import datetime
 import functools
+import importlib
 import re
 import shlex
 import subprocess as sp
 import sys
+import time
 
 _VERBOSE = False
 _IS_WIN = 'win' in sys.platform
@@ -22,6 +25,19 @@ def log_error(msg):
 def log_warning(msg):
     click.echo(f'Warning: {msg}')
 
+def import_optional_module(name, package=None):
+    """Import optional dependency, raise RuntimeError with install hint if it's missing.
+
+    Args:
+        name: Module name. Ex. 'zstandard', 'lz4.block'.
+        package: Package name on PyPI if it's different from module name.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        package = package or name.split('.')[0]
+        raise RuntimeError(f'This feature requires "{package}", please install it by `pip install {package}`')
+
 class FrameRange(click.ParamType):
     name = 'FrameRange'
 
@@ -88,6 +104,44 @@ def adb_cmd(split_result=False, separator=None):
 def adb_exec(cmd):
     return cmd
 
+def adb_exec_out(cmd):
+    """Execute 'adb exec-out <cmd>' and return raw bytes of stdout."""
+    cmd = f'adb exec-out {cmd}'
+
+    if _VERBOSE:
+        click.echo(f'>> {cmd}')
+
+    result = sp.run(shlex.split(cmd, posix='win' not in sys.platform), stdout=sp.PIPE, stderr=sp.PIPE)
+    if result.returncode != 0:
+        msg = 'Execution failure [exit status: {}]: {}\n{}'.format(
+            result.returncode, cmd, result.stderr.decode('utf-8').strip('\r\n'))
+        raise RuntimeError(msg)
+    return result.stdout
+
+def adb_popen(args, stdin=None):
+    """Start 'adb <args>' as a child process whose stdout is piped.
+
+    Args:
+        args: List of adb arguments. Ex. ['shell', script], where script is passed as one argument.
+        stdin: Optional stdin of child process.
+    """
+    cmd = ['adb'] + list(args)
+
+    if _VERBOSE:
+        click.echo('>> {}'.format(' '.join(cmd)))
+
+    return sp.Popen(cmd, stdin=stdin, stdout=sp.PIPE, stderr=sp.DEVNULL)
+
+# Max bytes of system property value, PROP_VALUE_MAX (92) includes the terminating null.
+PROP_VALUE_MAX = 91
+
+def check_prop_value(name, value):
+    """Raise BadParameter if value exceeds max length of system property."""
+    value_size = len(str(value).encode('utf-8'))
+    if value_size > PROP_VALUE_MAX:
+        raise click.BadParameter(f'Value of {name} is {value_size} bytes, exceeds {PROP_VALUE_MAX} bytes limit of '
+                                 f'system property: {value}')
+
 @adb_cmd()
 def adb_getprop(name):
     return f'shell getprop {name}'
@@ -98,23 +152,103 @@ def adb_setprop(option, value):
         value = '\\\"\\\"'
     return f'shell setprop {option} {value}'
 
+# Print wakefulness of power manager and lockscreen state of window policy. Queries of
+# 'dumpsys power' and 'dumpsys window policy' are much lighter than a full 'dumpsys window'.
+# https://android.stackexchange.com/a/220889
+_SCREEN_STATE_PROBE = (
+    "probe() { echo $(dumpsys power | grep -m1 -o 'mWakefulness=[A-Za-z]*') "
+    "$(dumpsys window policy | grep -m1 -o 'mDreamingLockscreen=[a-z]*'); }; "
+    'state=$(probe); echo "$state"'
+)
+# Wake up device (KEYCODE_WAKEUP), press MENU and then swipe screen only while it's still locked,
+# and print the final state.
+_SCREEN_UNLOCK_SCRIPT = _SCREEN_STATE_PROBE + (
+    '; case "$state" in *mWakefulness=Awake*) ;; *) input keyevent 224; sleep 0.3; state=$(probe);; esac'
+    '; case "$state" in *mDreamingLockscreen=true*) input keyevent 82; sleep 0.3; state=$(probe);; esac'
+    '; case "$state" in *mDreamingLockscreen=true*) input touchscreen swipe 50 1500 50 0; sleep 0.3; state=$(probe);; esac'
+    '; echo "$state"'
+)
+
+_screen_state = None
+
+
+class ScreenState(collections.namedtuple('ScreenState', ['wakefulness', 'is_locked'])):
+    """Screen state of device, wakefulness is one of 'Awake', 'Asleep', 'Dreaming', 'Dozing'.
+
+    Fields are None if they're missing in the output of dumpsys.
+    """
+
+    @property
+    def is_known(self):
+        return self.wakefulness is not None and self.is_locked is not None
+
+    @property
+    def is_ready(self):
+        """Whether screen is known to be awake and unlocked, so a launched app is in foreground."""
+        return self.wakefulness == 'Awake' and self.is_locked is False
+
+
+def parse_screen_state(line):
+    wakefulness = re.search(r'mWakefulness=(\w+)', line)
+    is_locked = re.search(r'mDreamingLockscreen=(\w+)', line)
+    return ScreenState(wakefulness.group(1) if wakefulness else None,
+                       is_locked.group(1) == 'true' if is_locked else None)
+
+
+def _run_screen_script(script):
+    """Run screen script in one adb call, and cache the last printed state if it's known.
+
+    Returns:
+        Tuple of (first ScreenState, last ScreenState) printed by script.
+    """
+    global _screen_state
+
+    proc = adb_popen(['shell', script])
+    output, _ = proc.communicate()
+    lines = output.decode('utf-8', errors='replace').splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f'Execution failure [exit status: {proc.returncode}]: adb shell {script}')
+
+    state = parse_screen_state(lines[-1])
+    # Unknown state is probed again next time instead of suppressing later unlocks.
+    _screen_state = state if state.is_known else None
+    return parse_screen_state(lines[0]), state
+
+def get_screen_state(refresh=False):
+    """Return ScreenState of device, it's probed once and cached for the rest of command if it's known."""
+    if _screen_state is None or refresh:
+        return _run_screen_script(_SCREEN_STATE_PROBE)[1]
+    return _screen_state
+
 def is_device_screen_locked():
-    # Use 'mDreamingLockscreen' to determine if screen is locked. https://android.stackexchange.com/a/220889
     try:
-        result = adb_exec('shell dumpsys window | grep mDreamingLockscreen')
-        is_locked = re.search('mDreamingLockscreen=(\w+)', result).group(1)
-        return is_locked == 'true'
+        return bool(get_screen_state().is_locked)
     except RuntimeError as e:
         log_error(e)
         return False
 
-def unlock_device_screen():
-    KEYCODE_MENU = 82   # https://developer.android.com/reference/android/view/KeyEvent#KEYCODE_MENU
-    adb_exec(f'shell input keyevent {KEYCODE_MENU}')  # Press MENU key to wake up device
-    adb_exec(f'shell input keyevent {KEYCODE_MENU}')  # Press MENU key to focus menu
+def unlock_device_screen(force=False):
+    """Wake up and unlock device screen in one adb call, unless cached state shows it's ready.
+
+    Returns:
+        ScreenState after unlocking, or None if the state can't be probed.
+    """
+    if _screen_state is not None and _screen_state.is_ready and not force:
+        return _screen_state
+
+    try:
+        old_state, new_state = _run_screen_script(_SCREEN_UNLOCK_SCRIPT)
+    except RuntimeError as e:
+        log_error(e)
+        return None
 
-    if is_device_screen_locked():
-        adb_exec('shell input touchscreen swipe 50 1500 50 0')  # Swipe screen to unlock
+    if is_verbose() and new_state != old_state:
+        click.echo(f'Screen state: {old_state} -> {new_state}')
+    if not new_state.is_known:
+        log_warning(f'Unknown screen state of device: {new_state}')
+    elif not new_state.is_ready:
+        log_warning(f'Failed to unlock device screen: {new_state}')
+    return new_state
 
 @adb_cmd()
 def start_app_activity(app_activity, extras):
@@ -138,6 +272,58 @@ def wait_until_app_exit(app_name):
 def wait_until_app_launch(app_name):
     return f'shell while [ ! "$(pidof {app_name})" ]; do (sleep 1); done'
 
+def get_app_pids(app_name):
+    cmd = f'pidof {app_name} || true'
+    return adb_exec(f'shell {cmd}' if _IS_WIN else f'shell "{cmd}"').split()
+
+def is_app_running(app_name):
+    return bool(get_app_pids(app_name))
+
+def get_thermal_zone_temps():
+    """Return dict of thermal zone type to temperature in Celsius."""
+    cmd = 'for z in /sys/class/thermal/thermal_zone*; do echo $(cat $z/type) $(cat $z/temp); done 2>/dev/null'
+    output = adb_exec(f'shell {cmd}' if _IS_WIN else f'shell "{cmd}"')
+
+    temps = {}
+    for line in output.splitlines():
+        tokens = line.split()
+        if len(tokens) != 2 or not tokens[1].lstrip('-').isdigit():
+            continue
+        value = int(tokens[1])
+        # Most zones report millidegree Celsius, but some report degree Celsius.
+        temp = value / 1000.0 if abs(value) >= 1000 else float(value)
+        if 0.0 < temp < 150.0:
+            temps[tokens[0]] = max(temp, temps.get(tokens[0], 0.0))
+    return temps
+
+def get_max_thermal_temp(zone_pattern=None):
+    """Return the highest temperature of thermal zones whose type matches zone_pattern."""
+    temps = get_thermal_zone_temps()
+    if zone_pattern:
+        temps = {k: v for k, v in temps.items() if re.search(zone_pattern, k)}
+    return max(temps.values()) if temps else None
+
+def wait_for_thermal_cooldown(max_temp, zone_pattern=None, timeout=600, interval=5):
+    """Wait until device temperature drops to max_temp.
+
+    Returns:
+        True if temperature drops in time, or the temperature is unavailable.
+    """
+    start_time = time.monotonic()
+    while True:
+        temp = get_max_thermal_temp(zone_pattern)
+        if temp is None:
+            log_warning('Can not read temperature of thermal zones, skip cooldown.')
+            return True
+        if temp <= max_temp:
+            return True
+        if time.monotonic() - start_time > timeout:
+            log_warning(f'Temperature {temp:.1f}C is still above {max_temp:.1f}C after {timeout} seconds.')
+            return False
+
+        click.echo(f'Cooling down: {temp:.1f}C > {max_temp:.1f}C')
+        time.sleep(interval)
+
 @adb_cmd()
 def install_apk(filepath):
     return f'install -t {filepath}'
@@ -199,6 +385,25 @@ def create_folder_if_not_exists(folder_path):
 def check_file_existence(filepath):
     return f'shell if [ -f {filepath} ]; then echo True; fi'
 
+def get_device_file_hash(filepath):
+    """Return SHA-256 hex digest of file on device, or None if sha256sum is unavailable."""
+    try:
+        result = adb_exec(f'shell sha256sum {filepath}')
+    except RuntimeError as e:
+        if _VERBOSE:
+            log_warning(e)
+        return None
+
+    match_obj = re.match(r'([0-9a-f]{64})\s', result)
+    return match_obj.group(1) if match_obj else None
+
+def get_file_size(filepath):
+    """Return size of file on device, or None if it does not exist."""
+    try:
+        return int(adb_exec(f'shell stat -c %s {filepath}'))
+    except (RuntimeError, ValueError):
+        return None
+
 def has_root_access():
     try:
         return adb_exec('shell su 0 echo true || exit 0') == 'true'
@@ -380,4 +585,13 @@ def acquire_valid_input(message: str, validate_set: set):
     while True:
         ret = input(message)
         if ret in validate_set:
-            return ret
\ No newline at end of file
+            return ret
+
+def format_size(num_bytes: int) -> str:
+    """Return human readable size string. Ex. 1536 => '1.50 KB'."""
+    size = float(num_bytes)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024.0:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.2f} {unit}'
+        size /= 1024.0
+    return f'{size:.2f} TB'
@@ -0,0 +1,249 @@
+"""Aggregation of validation layer messages streamed from logcat."""
+
+import click
+import html
+import json
+import os
+import re
+
+import vk.logcat as logcat
+import vk.utils as utils
+
+VALIDATION_TAG = 'VALIDATION'
+OTHER_TEMPLATE = '<other messages>'
+
+# Ex. "Validation Error: [ VUID-vkCmdDraw-None-02859 ] Object 0: handle = 0x7b2c..., type = ... | MessageID = 0x..."
+_MESSAGE_PATTERN = re.compile(r'^Validation (Error|Warning|Performance Warning|Information)\w*: \[ ?(\S+?) ?\] ?(.*)$')
+# Volatile parts of messages like handles, addresses and numbers are replaced to get message templates.
+_VOLATILE_PATTERN = re.compile(r'0x[0-9a-fA-F]+|\b\d+(?:\.\d+)?\b')
+_MAX_TEMPLATES_PER_VUID = 16
+
+
+def parse_message(message):
+    """Parse validation message.
+
+    Returns:
+        Tuple of (severity, VUID, message body), or None if it's not a validation message.
+    """
+    match_obj = _MESSAGE_PATTERN.match(message)
+    return match_obj.groups() if match_obj else None
+
+
+def get_message_template(body):
+    return _VOLATILE_PATTERN.sub('#', body)
+
+
+class Baseline:
+    """Known validation messages given by VUIDs and regex patterns of message.
+
+    The baseline file is a JSON file as below, patterns are searched in whole messages and should not
+    contain named groups.
+
+        {
+            "vuids": ["VUID-vkCmdDraw-None-02859"],
+            "patterns": ["BestPractices-vkCmdClearAttachments"]
+        }
+    """
+
+    def __init__(self, vuids=(), patterns=()):
+        self.vuids = frozenset(vuids)
+        self.patterns = list(patterns)
+        # One combined regex with a named group per pattern, so a single search tells the matched pattern.
+        self._regex = None
+        if self.patterns:
+            self._regex = re.compile('|'.join(f'(?P<p{idx}>{x})' for idx, x in enumerate(self.patterns)))
+        self.matched_vuids = set()
+        self.matched_patterns = set()
+
+    @classmethod
+    def load(cls, filepath):
+        """Load baseline file.
+
+        Raises:
+            BadParameter: If baseline file is invalid.
+        """
+        with open(filepath) as f:
+            data = json.load(f)
+
+        try:
+            return cls(data.get('vuids', []), data.get('patterns', []))
+        except re.error as e:
+            raise click.BadParameter(f'Invalid pattern in {filepath}: {e}')
+
+    def save(self, filepath, vuids=None):
+        """Save baseline to filepath, vuids replaces VUIDs of this baseline if it's given."""
+        data = {
+            'vuids': sorted(self.vuids if vuids is None else vuids),
+            'patterns': self.patterns,
+        }
+        with open(filepath, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def is_known(self, vuid, message):
+        if vuid in self.vuids:
+            self.matched_vuids.add(vuid)
+            return True
+
+        match_obj = self._regex.search(message) if self._regex else None
+        if match_obj:
+            self.matched_patterns.add(self.patterns[int(match_obj.lastgroup[1:])])
+            return True
+        return False
+
+    def get_fixed(self):
+        """Return VUIDs and patterns of baseline which are not matched by any message."""
+        return {
+            'vuids': sorted(self.vuids - self.matched_vuids),
+            'patterns': [x for x in self.patterns if x not in self.matched_patterns],
+        }
+
+
+class MessageEntry:
+
+    __slots__ = ('severity', 'vuid', 'template', 'count', 'first_time', 'last_time', 'example', 'status')
+
+    def __init__(self, severity, vuid, template, time, example):
+        self.severity = severity
+        self.vuid = vuid
+        self.template = template
+        self.count = 0
+        self.first_time = time
+        self.last_time = time
+        self.example = example
+        self.status = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MessageAggregator:
+    """Aggregate validation messages by VUID and message template.
+
+    Memory is bounded by unique messages: each VUID keeps at most 16 templates, further templates
+    of the same VUID are counted in one OTHER_TEMPLATE entry.
+
+    If baseline is given, each message is classified as 'new' or 'known'. An entry is 'new' if any
+    of its messages is new.
+    """
+
+    def __init__(self, baseline=None):
+        self.baseline = baseline
+        self.entries = {}
+        self.template_counts = {}
+        self.message_count = 0
+
+    def add_line(self, line):
+        """Add logcat line, lines of other tags are ignored. This could be a LogcatStream callback."""
+        log_line = logcat.parse_line(line)
+        if log_line and log_line.tag == VALIDATION_TAG:
+            self.add_message(log_line.message, log_line.time)
+
+    def add_message(self, message, time=None):
+        """Add validation message.
+
+        Returns:
+            MessageEntry which the message is counted in, or None if it's not a validation message.
+        """
+        result = parse_message(message)
+        if not result:
+            return None
+
+        severity, vuid, body = result
+        template = get_message_template(body)
+        key = (vuid, template)
+        entry = self.entries.get(key)
+
+        if entry is None:
+            if self.template_counts.get(vuid, 0) >= _MAX_TEMPLATES_PER_VUID:
+                key = (vuid, OTHER_TEMPLATE)
+                entry = self.entries.get(key)
+
+            if entry is None:
+                entry = MessageEntry(severity, vuid, key[1], time, message)
+                self.entries[key] = entry
+                self.template_counts[vuid] = self.template_counts.get(vuid, 0) + 1
+
+        if self.baseline and entry.status != 'new':
+            entry.status = 'known' if self.baseline.is_known(vuid, message) else 'new'
+
+        entry.count += 1
+        entry.last_time = time
+        self.message_count += 1
+        return entry
+
+    def get_new_entries(self, severity=None):
+        return [x for x in self.get_sorted_entries() if x.status == 'new' and (severity is None or x.severity == severity)]
+
+    def get_sorted_entries(self):
+        return sorted(self.entries.values(), key=lambda x: (-x.count, x.vuid))
+
+    def get_report(self):
+        severity_counts = {}
+        for entry in self.entries.values():
+            severity_counts[entry.severity] = severity_counts.get(entry.severity, 0) + entry.count
+
+        report = {
+            'message_count': self.message_count,
+            'unique_message_count': len(self.entries),
+            'vuid_count': len(self.template_counts),
+            'severity_counts': severity_counts,
+            'messages': [x.to_dict() for x in self.get_sorted_entries()],
+        }
+        if self.baseline:
+            report['baseline'] = {
+                'new_count': len(self.get_new_entries()),
+                'known_count': sum(1 for x in self.entries.values() if x.status == 'known'),
+                'fixed': self.baseline.get_fixed(),
+            }
+        return report
+
+    def write_report(self, filepath):
+        """Write report to HTML file if filepath ends with '.html', otherwise JSON."""
+        folder_path = os.path.dirname(filepath)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+
+        report = self.get_report()
+        if not filepath.lower().endswith(('.html', '.htm')):
+            with open(filepath, 'w') as f:
+                json.dump(report, f, indent=2)
+            return
+
+        headers = ['Severity', 'VUID', 'Count', 'First', 'Last', 'Example']
+        if self.baseline:
+            headers.insert(0, 'Status')
+
+        rows = []
+        for msg in report['messages']:
+            cells = [msg['severity'], msg['vuid'], msg['count'], msg['first_time'], msg['last_time'], msg['example']]
+            if self.baseline:
+                cells.insert(0, msg['status'])
+            rows.append('<tr>' + ''.join(f'<td>{html.escape(str(x))}</td>' for x in cells) + '</tr>')
+
+        severity_text = ', '.join(f'{k}: {v}' for k, v in report['severity_counts'].items())
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Validation report</title>\n'
+                    '<style>body{font-family:sans-serif} table{border-collapse:collapse} '
+                    'td,th{border:1px solid #ccc;padding:4px;vertical-align:top} '
+                    'td:last-child{font-family:monospace;white-space:pre-wrap}</style></head><body>\n'
+                    f'<h1>Validation report</h1>\n<p>{report["message_count"]} messages, '
+                    f'{report["unique_message_count"]} unique, {report["vuid_count"]} VUIDs ({severity_text})</p>\n'
+                    '<table><tr>' + ''.join(f'<th>{x}</th>' for x in headers) + '</tr>\n')
+            f.write('\n'.join(rows))
+            f.write('\n</table></body></html>\n')
+
+    def show_summary(self, top_n=10):
+        report = self.get_report()
+        click.echo(f'{report["message_count"]} validation messages, {report["unique_message_count"]} unique '
+                   f'in {report["vuid_count"]} VUIDs')
+        for entry in self.get_sorted_entries()[:top_n]:
+            status = f'[{entry.status}] ' if entry.status else ''
+            click.echo(f'  {entry.count:>8}  {entry.severity:<8} {status}{entry.vuid}')
+
+        if self.baseline:
+            baseline_report = report['baseline']
+            fixed = baseline_report['fixed']
+            click.echo(f'Baseline: {baseline_report["new_count"]} new, {baseline_report["known_count"]} known, '
+                       f'{len(fixed["vuids"]) + len(fixed["patterns"])} fixed')
+            for entry in self.get_new_entries():
+                utils.log_warning(f'New {entry.severity}: {entry.example}')